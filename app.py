@@ -1,7 +1,7 @@
 import streamlit as st
 from src.ui.sidebar import render_sidebar
 from src.ui.tab_recognition import render_recognition_tab
-from src.download_model import download_model_from_gdrive
+from src.ui.tab_history import render_history_tab
 
 
 
@@ -24,8 +24,8 @@ st.set_page_config(
 )
 
 
-# Загрузка модели с GD (если она не обнаружена локально)
-download_model_from_gdrive()
+# Загрузка модели с GD (если она не обнаружена локально) и прогрев выполняются
+# в фоне при первом открытии вкладки распознавания (src/background_loader.py)
 
 # Initialize session state
 if "canvas_result" not in st.session_state:
@@ -62,8 +62,9 @@ st.markdown("""
 # Main tabs
 if HAS_ADDITIONAL_TABS:
 #   tab1, tab2, tab3
-    tab1, tab3 = st.tabs([
+    tab1, tab_history, tab3 = st.tabs([
         "Распознавание",
+        "История",
         #"Метрики обучения",
         "О приложении"
     ])
@@ -71,11 +72,20 @@ if HAS_ADDITIONAL_TABS:
     with tab1:
         render_recognition_tab(selected_model)
 
+    with tab_history:
+        render_history_tab()
+
    # with tab2:
    #     render_metrics_tab()
 
     with tab3:
         render_about_tab()
 else:
-    # Если дополнительные табы не импортированы, то только распознавание
-    render_recognition_tab(selected_model)
+    # Если дополнительные табы не импортированы, то распознавание и история
+    tab1, tab_history = st.tabs(["Распознавание", "История"])
+
+    with tab1:
+        render_recognition_tab(selected_model)
+
+    with tab_history:
+        render_history_tab()
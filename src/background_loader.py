@@ -0,0 +1,199 @@
+"""
+Фоновая загрузка модели с прогревом.
+
+Загрузка с Google Drive, from_pretrained и прогревочный инференс выполняются
+в отдельном потоке, пока интерфейс уже отрисован. Первый model.generate
+оплачивает однократные затраты (выделение памяти, выбор ядер), поэтому после
+загрузки модель прогоняется на искусственном изображении. Длительность каждой
+фазы записывается и показывается в интерфейсе.
+
+Не использует Streamlit: в приложении экземпляр создается через
+src.model_loader.get_model_loader (st.cache_resource).
+"""
+import logging
+import threading
+import time
+
+from PIL import Image, ImageDraw
+
+from src.download_model import download_model_folder
+from src.runtime import load_local_model
+
+
+logger = logging.getLogger(__name__)
+
+# Фазы запуска в порядке выполнения
+PHASES = ("download", "load", "warmup")
+
+
+def warmup_image(height: int = 120, width: int = 480) -> Image.Image:
+    """
+    Искусственное изображение для прогрева: несколько черных штрихов на белом фоне.
+    """
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for i in range(4):
+        x = width * (i + 0.5) / 4
+        draw.line([(x - 20, height * 0.3), (x + 20, height * 0.7)], fill="black", width=4)
+        draw.line([(x - 20, height * 0.7), (x + 20, height * 0.3)], fill="black", width=4)
+    return image
+
+
+class BackgroundModelLoader:
+    """
+    Загружает и прогревает модель в фоновом потоке.
+
+    Состояния: "pending" -> "download" -> "load" -> "warmup" -> "ready" (или "error"),
+    после выгрузки из пула - "evicted".
+    """
+
+    def __init__(self, model_path: str, quantization: str = None, gdrive_folder_id: str = None,
+                 warmup: bool = True, warmup_runs: int = 1, warmup_num_beams: tuple = (1, 4),
+                 warmup_max_length: int = 32, processor_provider=None, on_ready=None):
+        """
+        Args:
+            model_path: Путь к папке с моделью
+            quantization: Режим квантования ("dynamic_int8") или None
+            gdrive_folder_id: ID папки на Google Drive (None - модель должна быть локально)
+            warmup: Выполнять прогревочный инференс
+            warmup_runs: Количество прогонов на каждое значение num_beams
+            warmup_num_beams: Значения num_beams для прогрева (greedy и beam search используют разные пути)
+            warmup_max_length: Максимальная длина генерации при прогреве
+            processor_provider: Функция model_path -> TrOCRProcessor (для общего процессора
+                                у чекпоинтов с одинаковым токенизатором); None - загрузить из model_path
+            on_ready: Функция loader -> None, вызывается в фоновом потоке после успешной загрузки
+        """
+        self.model_path = model_path
+        self.quantization = quantization
+        self.gdrive_folder_id = gdrive_folder_id
+        self.warmup = warmup
+        self.warmup_runs = warmup_runs
+        self.warmup_num_beams = tuple(warmup_num_beams)
+        self.warmup_max_length = warmup_max_length
+        self.processor_provider = processor_provider
+        self.on_ready = on_ready
+
+        self.state = "pending"
+        self.error = None
+        self.timings = {}
+        self.downloaded = False
+        self._started_at = None
+        self._phase_started_at = None
+        self._processor = None
+        self._model = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self) -> "BackgroundModelLoader":
+        """
+        Запускает фоновый поток (повторный вызов ничего не делает).
+        """
+        if self._thread is None:
+            self._started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+            self._thread.start()
+        return self
+
+    def _enter_phase(self, phase: str):
+        self.state = phase
+        self._phase_started_at = time.perf_counter()
+
+    def _finish_phase(self, phase: str):
+        self.timings[f"{phase}_ms"] = (time.perf_counter() - self._phase_started_at) * 1000
+
+    def _run(self):
+        try:
+            self._enter_phase("download")
+            self.downloaded = download_model_folder(self.model_path, self.gdrive_folder_id)
+            self._finish_phase("download")
+
+            self._enter_phase("load")
+            processor = self.processor_provider(self.model_path) if self.processor_provider else None
+            processor, model = load_local_model(self.model_path, self.quantization, processor)
+            self._finish_phase("load")
+
+            if self.warmup:
+                self._enter_phase("warmup")
+                self._warmup(processor, model)
+                self._finish_phase("warmup")
+
+            self._processor, self._model = processor, model
+            self.state = "ready"
+            if self.on_ready is not None:
+                self.on_ready(self)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = "error"
+        finally:
+            self.timings["total_ms"] = (time.perf_counter() - self._started_at) * 1000
+            self._ready.set()
+            logger.log(
+                logging.ERROR if self.error else logging.INFO,
+                "Запуск модели %s: %s%s, %s",
+                self.model_path,
+                self.state,
+                f" ({self.error})" if self.error else "",
+                ", ".join(f"{key}={value:.0f}" for key, value in self.timings.items())
+            )
+
+    def _warmup(self, processor, model):
+        """
+        Прогревочный инференс на искусственном изображении.
+        """
+        from src.inference import predict_latex
+
+        image = warmup_image()
+        for num_beams in self.warmup_num_beams:
+            for _ in range(self.warmup_runs):
+                predict_latex(image, processor, model, self.warmup_max_length, num_beams)
+
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def is_done(self) -> bool:
+        """
+        Загрузка завершена (успешно или с ошибкой).
+        """
+        return self._ready.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Ожидает завершения загрузки.
+
+        Returns:
+            bool: True, если загрузка завершилась за timeout
+        """
+        return self._ready.wait(timeout)
+
+    def release(self):
+        """
+        Освобождает ссылки на процессор и модель (при выгрузке из пула).
+        """
+        self._processor, self._model = None, None
+        self.state = "evicted"
+
+    def result(self) -> tuple:
+        """
+        Returns:
+            tuple: (processor, model) или (None, None), если модель еще не готова
+        """
+        return self._processor, self._model
+
+    def status(self) -> dict:
+        """
+        Снимок состояния для интерфейса.
+
+        Returns:
+            dict: {"state", "error", "timings", "phase_elapsed_ms", "elapsed_ms", "downloaded"}
+        """
+        now = time.perf_counter()
+        in_progress = not self.is_done() and self._phase_started_at is not None
+        return {
+            "state": self.state,
+            "error": self.error,
+            "timings": dict(self.timings),
+            "phase_elapsed_ms": (now - self._phase_started_at) * 1000 if in_progress else None,
+            "elapsed_ms": self.timings.get("total_ms") if self.is_done()
+            else ((now - self._started_at) * 1000 if self._started_at else None),
+            "downloaded": self.downloaded,
+        }
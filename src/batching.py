@@ -0,0 +1,244 @@
+"""
+Межсессионный микро-батчинг запросов к общей модели TrOCR.
+
+Все сессии Streamlit используют одну и ту же закешированную модель, поэтому
+одновременные вызовы model.generate конкурируют за ядра CPU. Планировщик
+собирает запросы из всех сессий в очередь и выполняет их одним батчем,
+когда набралось max_batch_size запросов или истекло max_wait_ms миллисекунд.
+Каждый вызывающий получает свой результат через Future.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING, List, Tuple
+
+from PIL import Image
+
+from src.inference import predict_latex_batch
+
+if TYPE_CHECKING:
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatchScheduler:
+    """
+    Процесс-глобальный планировщик, объединяющий запросы в батчи.
+
+    Запросы с разными параметрами генерации (max_length, num_beams, адаптивный режим)
+    не могут идти в один вызов generate, поэтому батч формируется из запросов
+    с теми же параметрами, что и у самого старого запроса в очереди.
+    """
+
+    def __init__(
+        self,
+        processor: "TrOCRProcessor",
+        model: "VisionEncoderDecoderModel",
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20.0,
+        request_timeout: float = 120.0
+    ):
+        """
+        Args:
+            processor: TrOCRProcessor
+            model: VisionEncoderDecoderModel
+            max_batch_size: Размер батча, при котором очередь сбрасывается немедленно
+            max_wait_ms: Максимальное время ожидания самого старого запроса (мс)
+            request_timeout: Сколько predict ждет результата (очередь и батч), прежде чем
+                             выбросить concurrent.futures.TimeoutError
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size должен быть >= 1, получено: {max_batch_size}")
+
+        self.processor = processor
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.request_timeout = request_timeout
+
+        # Очередь: (время постановки, параметры генерации, изображение, future)
+        self._pending: List[Tuple[float, tuple, Image.Image, Future]] = []
+        self._condition = threading.Condition()
+
+        # Статистика для подбора max_batch_size / max_wait_ms
+        self._queue_depth_hist = Counter()
+        self._batch_size_hist = Counter()
+        self._total_requests = 0
+        self._total_batches = 0
+        self._closed = False
+
+        self._worker = threading.Thread(
+            target=self._run, name="trocr-micro-batcher", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, image: Image.Image, max_length: int = 256, num_beams: int = 4,
+               adaptive: bool = False, confidence_threshold: float = 0.9) -> Future:
+        """
+        Ставит изображение в очередь на распознавание.
+
+        Args:
+            image: PIL Image в формате RGB
+            max_length: Максимальная длина последовательности
+            num_beams: Количество beams для beam search
+            adaptive: Адаптивный режим (greedy, beam search при низкой уверенности)
+            confidence_threshold: Порог уверенности для адаптивного режима
+
+        Returns:
+            Future, результатом которого будет словарь
+            {"latex": str, "confidence": float, "token_confidences": list, "num_beams": int}
+        """
+        return self.submit_many([image], max_length, num_beams, adaptive, confidence_threshold)[0]
+
+    def submit_many(self, images: list, max_length: int = 256, num_beams: int = 4,
+                    adaptive: bool = False, confidence_threshold: float = 0.9) -> list:
+        """
+        Ставит изображения в очередь целиком (тот же интерфейс, что у InferenceWorkerPool.submit_many).
+        Future можно отменить, пока запрос не попал в батч.
+
+        Returns:
+            list: Future в порядке изображений
+        """
+        params = (max_length, num_beams, adaptive, confidence_threshold)
+        futures = []
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Планировщик остановлен (модель выгружена)")
+            queued_at = time.monotonic()
+            for image in images:
+                future = Future()
+                self._queue_depth_hist[len(self._pending)] += 1
+                self._total_requests += 1
+                self._pending.append((queued_at, params, image, future))
+                futures.append(future)
+            self._condition.notify()
+        return futures
+
+    def predict(self, image: Image.Image, max_length: int = 256, num_beams: int = 4,
+                adaptive: bool = False, confidence_threshold: float = 0.9) -> dict:
+        """
+        Синхронная обёртка над submit: блокируется до получения результата, но не дольше request_timeout.
+
+        Raises:
+            concurrent.futures.TimeoutError: Результат не получен за request_timeout
+                                             (запрос, еще не попавший в батч, отменяется)
+        """
+        future = self.submit(image, max_length, num_beams, adaptive, confidence_threshold)
+        try:
+            return future.result(timeout=self.request_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def stats(self) -> dict:
+        """
+        Возвращает статистику планировщика.
+
+        Returns:
+            dict: {"queue_depth": int, "total_requests": int, "total_batches": int,
+                   "avg_batch_size": float, "queue_depth_hist": dict, "batch_size_hist": dict}
+        """
+        with self._condition:
+            avg_batch_size = (
+                self._total_requests_flushed() / self._total_batches
+                if self._total_batches else 0.0
+            )
+            return {
+                "queue_depth": len(self._pending),
+                "total_requests": self._total_requests,
+                "total_batches": self._total_batches,
+                "avg_batch_size": avg_batch_size,
+                "queue_depth_hist": dict(sorted(self._queue_depth_hist.items())),
+                "batch_size_hist": dict(sorted(self._batch_size_hist.items())),
+            }
+
+    def close(self):
+        """
+        Останавливает рабочий поток после обработки уже поставленных запросов
+        и освобождает ссылки на модель (вызывается при выгрузке модели из пула).
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def _total_requests_flushed(self) -> int:
+        return sum(size * count for size, count in self._batch_size_hist.items())
+
+    def _take_batch(self) -> list:
+        """
+        Ждёт условия сброса и забирает батч из очереди (вызывается в рабочем потоке).
+        """
+        with self._condition:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._condition.wait()
+
+            while True:
+                oldest_time, params, _, _ = self._pending[0]
+                same_params = sum(1 for item in self._pending if item[1] == params)
+                remaining = oldest_time + self.max_wait - time.monotonic()
+                if same_params >= self.max_batch_size or remaining <= 0:
+                    break
+                self._condition.wait(timeout=remaining)
+
+            batch, rest = [], []
+            for item in self._pending:
+                if item[1] == params and len(batch) < self.max_batch_size:
+                    batch.append(item)
+                else:
+                    rest.append(item)
+            self._pending = rest
+
+            self._batch_size_hist[len(batch)] += 1
+            self._total_batches += 1
+            return batch
+
+    def _run(self):
+        """
+        Основной цикл рабочего потока.
+        """
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                break
+
+            # Пропускаем запросы, отменённые до начала обработки
+            batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            max_length, num_beams, adaptive, confidence_threshold = batch[0][1]
+            images = [item[2] for item in batch]
+
+            start = time.perf_counter()
+            try:
+                results = predict_latex_batch(
+                    images,
+                    self.processor,
+                    self.model,
+                    max_length=max_length,
+                    num_beams=num_beams,
+                    max_batch_size=self.max_batch_size,
+                    adaptive=adaptive,
+                    confidence_threshold=confidence_threshold,
+                    return_details=True
+                )
+            except Exception as e:
+                logger.exception("Ошибка батчевого инференса")
+                for item in batch:
+                    item[3].set_exception(e)
+                continue
+
+            logger.debug(
+                "Батч из %d изображений обработан за %.1f мс",
+                len(batch), (time.perf_counter() - start) * 1000
+            )
+            for item, result in zip(batch, results):
+                item[3].set_result(result)
+
+        self.processor, self.model = None, None
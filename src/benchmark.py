@@ -0,0 +1,340 @@
+"""
+Бенчмарк латентности предобработки и инференса на синтетических изображениях.
+
+Перебирает num_beams, max_length, размер батча, число потоков torch и размер
+изображения; для каждой конфигурации записывает p50/p95/p99 латентности,
+пропускную способность и пиковый RSS в JSON. Пик RSS измеряется отдельно для
+каждой конфигурации: перед ней счетчик пика процесса (VmHWM) сбрасывается
+через /proc/self/clear_refs, в отчет попадают пик и его прирост относительно
+RSS перед конфигурацией (вне Linux - только пик за время жизни процесса). Команда compare сравнивает
+результаты с сохраненным baseline и завершается с кодом 1 при регрессии.
+
+Примеры:
+    python -m src.benchmark run --num-beams 1,4 --batch-size 1,8 --output bench.json
+    python -m src.benchmark compare baseline.json bench.json --threshold 10
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from itertools import product
+
+import torch
+
+from src.evaluate import percentiles
+from src.inference import predict_latex, predict_latex_batch
+from src.preprocessing import preprocess_image
+from src.runtime import add_model_arguments, load_local_model, resolve_model_args
+from src.synthetic import synthetic_formula_image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def process_peak_rss_mb() -> float:
+    """
+    Пиковый RSS процесса в МБ за все время жизни процесса (None, если недоступно).
+    Только растет, поэтому не подходит для сравнения конфигураций между собой.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает КБ, macOS - байты
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def read_proc_status_mb(field: str) -> float:
+    """
+    Значение поля /proc/self/status (VmRSS, VmHWM) в МБ (None вне Linux).
+    """
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss() -> bool:
+    """
+    Сбрасывает пиковый RSS процесса (VmHWM) до текущего RSS (Linux: запись "5" в /proc/self/clear_refs).
+
+    Returns:
+        bool: True, если сброс поддерживается
+    """
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure_memory(func) -> dict:
+    """
+    Выполняет func и измеряет пиковый RSS именно за время ее выполнения.
+
+    Returns:
+        dict: {"rss_before_mb", "peak_rss_mb", "peak_rss_delta_mb"} - пик за вызов и его прирост
+              относительно RSS перед вызовом; если сброс пика недоступен (не Linux) -
+              {"process_peak_rss_mb"} за время жизни процесса
+    """
+    if not reset_peak_rss():
+        func()
+        return {"process_peak_rss_mb": process_peak_rss_mb()}
+
+    rss_before = read_proc_status_mb("VmRSS")
+    func()
+    peak = read_proc_status_mb("VmHWM")
+    return {
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak,
+        "peak_rss_delta_mb": peak - rss_before if peak is not None and rss_before is not None else None,
+    }
+
+
+def measure(func, repeats: int, warmup: int) -> list:
+    """
+    Выполняет func warmup раз без замеров, затем repeats раз с замером времени.
+
+    Returns:
+        list: Латентности в мс
+    """
+    for _ in range(warmup):
+        func()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def measure_config(func, repeats: int, warmup: int) -> tuple:
+    """
+    Замеры латентности (см. measure) и пикового RSS одной конфигурации.
+
+    Returns:
+        tuple: (латентности в мс, память - см. measure_memory)
+    """
+    result = {}
+
+    def run():
+        result["latencies"] = measure(func, repeats, warmup)
+
+    memory = measure_memory(run)
+    return result["latencies"], memory
+
+
+def summarize(name: str, config: dict, latencies: list, items_per_call: int, memory: dict = None) -> dict:
+    """
+    Формирует запись результата для одной конфигурации.
+    """
+    stats = percentiles(latencies, points=(50, 95, 99))
+    total_seconds = sum(latencies) / 1000
+    return {
+        "name": name,
+        "key": name + "|" + "|".join(f"{key}={value}" for key, value in sorted(config.items())),
+        "config": config,
+        "p50_ms": stats["p50"],
+        "p95_ms": stats["p95"],
+        "p99_ms": stats["p99"],
+        "mean_ms": statistics.fmean(latencies),
+        "throughput_items_per_s": items_per_call * len(latencies) / total_seconds if total_seconds > 0 else 0.0,
+        **(memory or {}),
+    }
+
+
+def run_benchmarks(processor, model, image_sizes: list, num_beams_list: list, max_length_list: list,
+                   batch_sizes: list, threads_list: list, repeats: int = 5, warmup: int = 1,
+                   preprocess_repeats: int = 50) -> list:
+    """
+    Выполняет перебор конфигураций.
+
+    Args:
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        image_sizes: Список размеров (высота, ширина)
+        num_beams_list: Значения num_beams
+        max_length_list: Значения max_length
+        batch_sizes: Размеры батча (1 - predict_latex, больше - predict_latex_batch)
+        threads_list: Значения torch.set_num_threads
+        repeats: Замеров инференса на конфигурацию
+        warmup: Прогревочных прогонов на конфигурацию
+        preprocess_repeats: Замеров предобработки на конфигурацию
+
+    Returns:
+        list: Записи результатов (см. summarize)
+    """
+    results = []
+
+    # Предобработка: зависит только от размера изображения и флагов
+    for (height, width), inversion, binarization in product(image_sizes, (False, True), (False, True)):
+        image = synthetic_formula_image(height, width)
+        config = {"image_size": f"{height}x{width}", "inversion": inversion, "binarization": binarization}
+        latencies, memory = measure_config(
+            lambda: preprocess_image(image, apply_inversion=inversion, apply_binarization=binarization),
+            preprocess_repeats, warmup
+        )
+        results.append(summarize("preprocess_image", config, latencies, 1, memory))
+        print(f"preprocess_image {config}: p50={results[-1]['p50_ms']:.2f} мс")
+
+    # Инференс
+    for threads, (height, width), num_beams, max_length, batch_size in product(
+        threads_list, image_sizes, num_beams_list, max_length_list, batch_sizes
+    ):
+        torch.set_num_threads(threads)
+        images = [synthetic_formula_image(height, width, seed=i) for i in range(batch_size)]
+
+        if batch_size == 1:
+            name = "predict_latex"
+            func = lambda: predict_latex(images[0], processor, model, max_length, num_beams)
+        else:
+            name = "predict_latex_batch"
+            func = lambda: predict_latex_batch(
+                images, processor, model, max_length, num_beams, max_batch_size=batch_size
+            )
+
+        config = {
+            "threads": threads,
+            "image_size": f"{height}x{width}",
+            "num_beams": num_beams,
+            "max_length": max_length,
+            "batch_size": batch_size,
+        }
+        latencies, memory = measure_config(func, repeats, warmup)
+        results.append(summarize(name, config, latencies, batch_size, memory))
+        peak_delta = memory.get("peak_rss_delta_mb")
+        print(
+            f"{name} {config}: p50={results[-1]['p50_ms']:.0f} мс, "
+            f"{results[-1]['throughput_items_per_s']:.2f} img/s"
+            + (f", пик RSS +{peak_delta:.0f} МБ" if peak_delta is not None else "")
+        )
+
+    return results
+
+
+def compare_results(baseline: dict, current: dict, threshold_percent: float = 10.0) -> list:
+    """
+    Сравнивает результаты по совпадающим конфигурациям.
+    Регрессия - рост p50/p95 или падение пропускной способности больше чем на threshold_percent.
+
+    Args:
+        baseline: Содержимое baseline JSON
+        current: Содержимое текущего JSON
+        threshold_percent: Допустимое ухудшение в процентах
+
+    Returns:
+        list: Строки сравнения {"key", "metric", "baseline", "current", "change_percent", "regression"}
+    """
+    baseline_by_key = {item["key"]: item for item in baseline["results"]}
+    rows = []
+    for item in current["results"]:
+        reference = baseline_by_key.get(item["key"])
+        if reference is None:
+            continue
+        for metric, higher_is_better in (("p50_ms", False), ("p95_ms", False), ("throughput_items_per_s", True)):
+            if not reference[metric]:
+                continue
+            change = 100.0 * (item[metric] - reference[metric]) / reference[metric]
+            worse = -change if higher_is_better else change
+            rows.append({
+                "key": item["key"],
+                "metric": metric,
+                "baseline": reference[metric],
+                "current": item[metric],
+                "change_percent": change,
+                "regression": worse > threshold_percent,
+            })
+    return rows
+
+
+def command_run(args):
+    model_path, quantization = resolve_model_args(args)
+    processor, model = load_local_model(model_path, quantization)
+
+    image_sizes = [tuple(int(v) for v in size.split("x")) for size in args.image_size.split(",")]
+    results = run_benchmarks(
+        processor, model,
+        image_sizes=image_sizes,
+        num_beams_list=[int(v) for v in args.num_beams.split(",")],
+        max_length_list=[int(v) for v in args.max_length.split(",")],
+        batch_sizes=[int(v) for v in args.batch_size.split(",")],
+        threads_list=[int(v) for v in args.threads.split(",")],
+        repeats=args.repeats,
+        warmup=args.warmup,
+    )
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "model_path": model_path,
+            "quantization": quantization,
+            "torch": torch.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены: {args.output}")
+
+
+def command_compare(args):
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    rows = compare_results(baseline, current, args.threshold)
+    for row in rows:
+        marker = "РЕГРЕССИЯ" if row["regression"] else ""
+        print(
+            f"{row['key']:<80} {row['metric']:<24} {row['baseline']:>10.2f} -> {row['current']:>10.2f} "
+            f"({row['change_percent']:+.1f}%) {marker}"
+        )
+
+    regressions = [row for row in rows if row["regression"]]
+    print(f"Сравнено метрик: {len(rows)}, регрессий: {len(regressions)} (порог {args.threshold}%)")
+    if regressions:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк латентности предобработки и инференса TrOCR")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Запустить бенчмарк")
+    add_model_arguments(run_parser)
+    run_parser.add_argument("--num-beams", default="1,4", help="Список через запятую")
+    run_parser.add_argument("--max-length", default="256")
+    run_parser.add_argument("--batch-size", default="1,8")
+    run_parser.add_argument("--threads", default=str(torch.get_num_threads()))
+    run_parser.add_argument("--image-size", default="200x800,384x384", help="Размеры ВЫСОТАxШИРИНА")
+    run_parser.add_argument("--repeats", type=int, default=5)
+    run_parser.add_argument("--warmup", type=int, default=1)
+    run_parser.add_argument("--output", default="benchmark_results.json")
+    run_parser.set_defaults(func=command_run)
+
+    compare_parser = subparsers.add_parser("compare", help="Сравнить с baseline")
+    compare_parser.add_argument("baseline", help="JSON с baseline результатами")
+    compare_parser.add_argument("current", help="JSON с текущими результатами")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="Допустимое ухудшение, %")
+    compare_parser.set_defaults(func=command_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Кеш результатов распознавания с адресацией по содержимому.
+
+Ключ кеша - хеш предобработанных пикселей плюс параметры генерации
+(max_length, num_beams, ключ модели). Повторное нажатие "Распознать" на том же
+холсте или повторная загрузка того же файла отвечаются без инференса.
+В перцептивном режиме почти идентичные изображения (например, отличающиеся
+одним случайным пикселем) также попадают в кеш.
+
+Перцептивный режим допускает ложные попадания: формулы, отличающиеся одним
+штрихом ("x+1" и "x-1", "a_1" и "a^1"), могут получить близкие хеши, и тогда
+кеш вернет LaTeX другой формулы. Поэтому хеш считается по области чернил
+(а не по почти белому холсту целиком), а допустимое расстояние Хэмминга
+по умолчанию - 1 бит.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+from PIL import Image
+
+from src.ingestion import ink_bbox, otsu_threshold
+
+
+def image_hash(image) -> str:
+    """
+    Вычисляет SHA-256 хеш пикселей изображения (с учетом режима и размера).
+
+    Args:
+        image: PIL Image или uint8 массив numpy
+
+    Returns:
+        str: Хеш в hex-формате
+    """
+    hasher = hashlib.sha256()
+    if isinstance(image, Image.Image):
+        hasher.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode("utf-8"))
+        hasher.update(image.tobytes())
+    else:
+        array = np.ascontiguousarray(image)
+        hasher.update(f"array:{array.dtype}:{array.shape}".encode("utf-8"))
+        hasher.update(array.data)
+    return hasher.hexdigest()
+
+
+def perceptual_hash(image, hash_size: int = 16) -> int:
+    """
+    Вычисляет разностный перцептивный хеш (dHash) изображения.
+    Изображение обрезается до области чернил (иначе большинство бит описывают
+    пустой фон), сжимается до (hash_size + 1) x hash_size в градациях серого,
+    и каждый бит хеша - результат сравнения соседних пикселей по горизонтали.
+
+    Args:
+        image: PIL Image или uint8 массив numpy
+        hash_size: Размер хеша (итоговый хеш содержит hash_size^2 бит)
+
+    Returns:
+        int: Хеш в виде целого числа
+    """
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(np.asarray(image))
+    gray = image.convert("L")
+    array = np.asarray(gray)
+    bbox = ink_bbox(array, otsu_threshold(array), inverted=float(array.mean()) < 128)
+    if bbox is not None:
+        gray = gray.crop(bbox)
+    small = gray.resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small).ravel().tolist()
+
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+class RecognitionCache:
+    """
+    Потокобезопасный LRU-кеш результатов распознавания с ограниченным размером.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        perceptual: bool = False,
+        hash_size: int = 16,
+        max_hamming_distance: int = 1
+    ):
+        """
+        Args:
+            max_size: Максимальное количество записей
+            perceptual: Использовать перцептивный хеш вместо точного
+            hash_size: Размер перцептивного хеша
+            max_hamming_distance: Допустимое число отличающихся бит перцептивного хеша
+                (больше - больше ложных попаданий на похожие формулы)
+        """
+        if max_size < 1:
+            raise ValueError(f"max_size должен быть >= 1, получено: {max_size}")
+
+        self.max_size = max_size
+        self.perceptual = perceptual
+        self.hash_size = hash_size
+        self.max_hamming_distance = max_hamming_distance
+
+        self._entries = OrderedDict()
+        # Перцептивные хеши по параметрам генерации: нечеткий поиск идет только среди них
+        self._hashes_by_params = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _make_key(self, image, params: dict) -> tuple:
+        params_key = tuple(sorted(params.items()))
+        if self.perceptual:
+            return params_key, perceptual_hash(image, self.hash_size)
+        return params_key, image_hash(image)
+
+    def _find(self, key: tuple) -> Optional[tuple]:
+        if key in self._entries:
+            return key
+        if not self.perceptual or self.max_hamming_distance <= 0:
+            return None
+
+        # Перцептивный режим: ищем ближайший хеш с теми же параметрами генерации
+        params_key, phash = key
+        for entry_hash in self._hashes_by_params.get(params_key, ()):
+            if bin(entry_hash ^ phash).count("1") <= self.max_hamming_distance:
+                return params_key, entry_hash
+        return None
+
+    def _remove(self, key: tuple):
+        del self._entries[key]
+        if self.perceptual:
+            hashes = self._hashes_by_params[key[0]]
+            hashes.discard(key[1])
+            if not hashes:
+                del self._hashes_by_params[key[0]]
+
+    def get(self, image, params: dict) -> Optional[Any]:
+        """
+        Ищет результат для изображения и параметров генерации.
+
+        Args:
+            image: Предобработанное изображение (PIL Image или uint8 массив)
+            params: Параметры генерации (max_length, num_beams, model_key, ...)
+
+        Returns:
+            Закешированный результат или None
+        """
+        key = self._make_key(image, params)
+        with self._lock:
+            found = self._find(key)
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(found)
+            return self._entries[found]
+
+    def put(self, image, params: dict, value: Any):
+        """
+        Сохраняет результат, вытесняя наименее недавно использованные записи.
+
+        Args:
+            image: Предобработанное изображение (PIL Image или uint8 массив)
+            params: Параметры генерации
+            value: Результат распознавания
+        """
+        key = self._make_key(image, params)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if self.perceptual:
+                self._hashes_by_params.setdefault(key[0], set()).add(key[1])
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def get_or_compute(self, image, params: dict, compute: Callable[[], Any]) -> tuple:
+        """
+        Возвращает результат из кеша или вычисляет и сохраняет его.
+
+        Args:
+            image: Предобработанное изображение (PIL Image или uint8 массив)
+            params: Параметры генерации
+            compute: Функция без аргументов, выполняющая распознавание
+
+        Returns:
+            tuple: (результат, True если результат взят из кеша)
+        """
+        value = self.get(image, params)
+        if value is not None:
+            return value, True
+
+        value = compute()
+        self.put(image, params, value)
+        return value, False
+
+    def clear(self):
+        """
+        Очищает кеш и сбрасывает счетчики.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._hashes_by_params.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: {"size": int, "max_size": int, "hits": int, "misses": int, "hit_rate": float}
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
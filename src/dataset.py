@@ -0,0 +1,85 @@
+"""
+Чтение размеченных наборов данных в формате HME100K (папка изображений + файл разметки).
+Используется офлайн-инструментами оценки, не зависит от Streamlit.
+"""
+from pathlib import Path
+from typing import List, Tuple
+
+from PIL import Image
+
+
+def load_labels(labels_file: str) -> List[Tuple[str, str]]:
+    """
+    Читает файл разметки формата HME100K: одна строка на изображение,
+    имя файла и LaTeX разделены табуляцией (или первым пробельным символом).
+
+    Args:
+        labels_file: Путь к файлу разметки (например, caption.txt)
+
+    Returns:
+        list: Пары (имя файла, LaTeX) в порядке файла разметки
+    """
+    labels = []
+    with open(labels_file, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.rstrip("\n\r")
+            if not line.strip():
+                continue
+
+            if "\t" in line:
+                filename, latex = line.split("\t", 1)
+            else:
+                parts = line.split(maxsplit=1)
+                if len(parts) != 2:
+                    raise ValueError(f"{labels_file}:{line_number}: ожидается '<файл>\\t<LaTeX>'")
+                filename, latex = parts
+
+            labels.append((filename.strip(), latex.strip()))
+    return labels
+
+
+def load_samples(images_dir: str, labels_file: str, limit: int = None) -> List[Tuple[Path, str]]:
+    """
+    Сопоставляет строки разметки с файлами изображений.
+    Если в разметке имя указано без расширения, ищется файл .jpg/.jpeg/.png.
+
+    Args:
+        images_dir: Папка с изображениями
+        labels_file: Файл разметки
+        limit: Ограничение количества примеров (None - все)
+
+    Returns:
+        list: Пары (путь к изображению, LaTeX)
+    """
+    images_dir = Path(images_dir)
+    samples = []
+    for filename, latex in load_labels(labels_file):
+        path = images_dir / filename
+        if not path.exists():
+            for ext in (".jpg", ".jpeg", ".png"):
+                candidate = images_dir / f"{filename}{ext}"
+                if candidate.exists():
+                    path = candidate
+                    break
+            else:
+                raise FileNotFoundError(f"Изображение не найдено: {path}")
+
+        samples.append((path, latex))
+        if limit is not None and len(samples) >= limit:
+            break
+    return samples
+
+
+def load_image(path: Path) -> Image.Image:
+    """
+    Открывает изображение и полностью загружает его в память (файл закрывается).
+
+    Args:
+        path: Путь к изображению
+
+    Returns:
+        PIL Image
+    """
+    with Image.open(path) as image:
+        image.load()
+        return image.copy()
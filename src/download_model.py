@@ -1,58 +1,51 @@
 """
 Модуль для загрузки модели с Google Drive при первом запуске.
+В приложении загрузка выполняется фоновым загрузчиком (src/background_loader.py).
 """
-import os
-import streamlit as st
-import gdown
 from pathlib import Path
 
 
-def download_model_from_gdrive():
+def is_model_present(model_path: str) -> bool:
     """
-    Загружает модель с Google Drive, если её нет локально.
-    Пропускает загрузку, если используется HuggingFace Inference API.
-    Использует st.secrets для получения ссылки на модель.
+    Проверяет, что модель уже лежит локально (есть config.json).
     """
-    # Проверяем, используется ли HuggingFace API
-    try:
-        use_hf_api = "huggingface" in st.secrets and "model_name" in st.secrets["huggingface"]
-        if use_hf_api:
-            # Используем HF API - локальная модель не нужна
-            return
-    except:
-        pass
-
-    model_path = Path("models/trocr1-5ep")
-
-    # Существует ли модель локально
-    if model_path.exists() and (model_path / "config.json").exists():
-        return
-
-    # Получаем ссылку из secrets
-    try:
-        gdrive_folder_id = st.secrets["model"]["gdrive_folder_id"]
-    except KeyError:
-        st.error("Ссылка на модель не найдена!")
-        st.stop()
+    model_path = Path(model_path)
+    return model_path.exists() and (model_path / "config.json").exists()
+
+
+def download_model_folder(model_path: str, gdrive_folder_id: str, quiet: bool = True) -> bool:
+    """
+    Загружает папку модели с Google Drive, если её нет локально.
+    Не использует Streamlit: вызывается из фонового загрузчика и CLI.
+
+    Args:
+        model_path: Путь к папке с моделью
+        gdrive_folder_id: ID папки на Google Drive
+        quiet: Не выводить прогресс gdown
+
+    Returns:
+        bool: True, если модель была загружена, False, если уже была локально
+
+    Raises:
+        FileNotFoundError: Модели нет локально и не задан gdrive_folder_id
+    """
+    if is_model_present(model_path):
+        return False
+    if not gdrive_folder_id:
+        raise FileNotFoundError(
+            f"Модель не найдена в {model_path}, а ссылка на модель (model.gdrive_folder_id) не задана"
+        )
+
+    import gdown
 
     # Создаем директорию для модели
-    model_path.parent.mkdir(parents=True, exist_ok=True)
-
-    # Загружаем модель с показом прогресса
-    with st.spinner("Загрузка модели из внешнего хранилища... Пожалуйста подождите"):
-        try:
-            # URL для gdown
-            gdrive_url = f"https://drive.google.com/drive/folders/{gdrive_folder_id}"
-
-            # Загружаем папку
-            gdown.download_folder(
-                url=gdrive_url,
-                output=str(model_path),
-                quiet=False,
-                use_cookies=False
-            )
-
-            st.success("Модель успешно загружена!")
-        except Exception as e:
-            st.error(f"Ошибка при загрузке модели: {str(e)}")
-            st.stop()
+    Path(model_path).parent.mkdir(parents=True, exist_ok=True)
+
+    # Загружаем папку
+    gdown.download_folder(
+        url=f"https://drive.google.com/drive/folders/{gdrive_folder_id}",
+        output=str(model_path),
+        quiet=quiet,
+        use_cookies=False
+    )
+    return True
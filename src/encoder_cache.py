@@ -0,0 +1,133 @@
+"""
+Кеш выходов энкодера ViT с адресацией по содержимому изображения.
+
+Энкодер TrOCR не зависит от параметров генерации, поэтому при повторном
+декодировании того же изображения (другие num_beams, max_length, сэмплирование,
+n-best варианты, уточнение beam search в адаптивном режиме) его выход берется
+из кеша, и выполняется только авторегрессионный декодер.
+
+Ключ - хеш предобработанных пикселей (src.cache.image_hash). Кеш относится к одной
+модели: в приложении он привязан к записи пула моделей (src.model_loader.get_encoder_cache)
+и очищается при ее выгрузке.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from src.cache import image_hash
+
+
+def tensor_bytes(tensor) -> int:
+    """
+    Размер тензора в байтах.
+    """
+    return tensor.element_size() * tensor.nelement()
+
+
+class EncoderOutputCache:
+    """
+    Потокобезопасный LRU-кеш last_hidden_state энкодера с ограничением по числу записей и памяти.
+    """
+
+    def __init__(self, max_size: int = 64, max_memory_mb: float = 256.0):
+        """
+        Args:
+            max_size: Максимальное количество изображений
+            max_memory_mb: Максимальный суммарный объем тензоров в МБ (None - без ограничения)
+        """
+        if max_size < 1:
+            raise ValueError(f"max_size должен быть >= 1, получено: {max_size}")
+
+        self.max_size = max_size
+        self.max_memory = max_memory_mb * 2**20 if max_memory_mb else None
+
+        # hash -> тензор (1, seq_len, hidden)
+        self._entries = OrderedDict()
+        self._memory = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        """
+        Возвращает выход энкодера по хешу изображения (или None).
+        """
+        with self._lock:
+            tensor = self._entries.get(key)
+            if tensor is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return tensor
+
+    def put(self, key: str, tensor):
+        """
+        Сохраняет выход энкодера, вытесняя наименее недавно использованные записи.
+        """
+        tensor = tensor.detach()
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._memory -= tensor_bytes(previous)
+            self._entries[key] = tensor
+            self._memory += tensor_bytes(tensor)
+            while self._entries and (
+                len(self._entries) > self.max_size
+                or (self.max_memory is not None and self._memory > self.max_memory and len(self._entries) > 1)
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._memory -= tensor_bytes(evicted)
+
+    def get_or_compute(self, image, compute: Callable[[], object]) -> tuple:
+        """
+        Возвращает выход энкодера из кеша или вычисляет и сохраняет его.
+
+        Args:
+            image: Предобработанное изображение (PIL Image или uint8 массив)
+            compute: Функция без аргументов, возвращающая тензор (1, seq_len, hidden)
+
+        Returns:
+            tuple: (тензор, True если взят из кеша)
+        """
+        key = image_hash(image)
+        tensor = self.get(key)
+        if tensor is not None:
+            return tensor, True
+
+        tensor = compute()
+        self.put(key, tensor)
+        return tensor, False
+
+    def clear(self):
+        """
+        Очищает кеш и сбрасывает счетчики.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._memory = 0
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        """
+        Освобождает тензоры при выгрузке модели из пула.
+        """
+        self.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: {"size": int, "max_size": int, "memory_mb": float, "hits": int,
+                   "misses": int, "hit_rate": float}
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "memory_mb": self._memory / 2**20,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
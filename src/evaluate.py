@@ -0,0 +1,260 @@
+"""
+Офлайн-оценка модели на наборе данных в формате HME100K (без Streamlit и st.secrets).
+
+Предобработка изображений выполняется пулом процессов DataLoader, батчевая генерация -
+в основном процессе. Результаты: предсказания по каждому примеру (JSONL и CSV),
+агрегированные метрики (CER, Avg Edit Distance, ExpRate, ExpRate≤k), пропускная
+способность и перцентили латентности (metrics.json).
+
+Пример:
+    python -m src.evaluate --images data/test --labels data/test_caption.txt --output-dir eval_out
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from src.dataset import load_image, load_samples
+from src.fast_preprocessing import arrays_to_pixel_values, get_pixel_config
+from src.inference import generate_with_confidence, predict_adaptive
+from src.metrics import aggregate_metrics, compute_metrics
+from src.preprocessing import preprocess_image
+from src.runtime import add_model_arguments, load_local_model, resolve_model_args
+
+
+class LabeledImageDataset(Dataset):
+    """
+    Набор (изображение, LaTeX): чтение и предобработка выполняются в процессах-воркерах.
+    """
+
+    def __init__(self, samples: list, apply_inversion: bool = False, apply_binarization: bool = False):
+        self.samples = samples
+        self.apply_inversion = apply_inversion
+        self.apply_binarization = apply_binarization
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, index: int) -> dict:
+        path, reference = self.samples[index]
+        image = preprocess_image(
+            load_image(path),
+            apply_inversion=self.apply_inversion,
+            apply_binarization=self.apply_binarization
+        )
+        return {"file": path.name, "reference": reference, "array": np.asarray(image)}
+
+
+class PixelValuesCollator:
+    """
+    Собирает батч в тензор pixel_values (выполняется в процессе-воркере).
+    Хранит только параметры предобработки, а не весь процессор, чтобы дешево передаваться воркерам.
+    """
+
+    def __init__(self, pixel_config: dict):
+        self.pixel_config = pixel_config
+
+    def __call__(self, items: list) -> dict:
+        return {
+            "files": [item["file"] for item in items],
+            "references": [item["reference"] for item in items],
+            "pixel_values": arrays_to_pixel_values([item["array"] for item in items], config=self.pixel_config),
+        }
+
+
+def percentiles(values: list, points: tuple = (50, 90, 95, 99)) -> dict:
+    """
+    Вычисляет перцентили (метод ближайшего ранга).
+
+    Returns:
+        dict: {"p50": float, ...}
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        f"p{point}": ordered[min(len(ordered) - 1, max(0, int(np.ceil(point / 100 * len(ordered))) - 1))]
+        for point in points
+    }
+
+
+def evaluate(samples: list, processor, model, batch_size: int = 16, num_workers: int = 2,
+             max_length: int = 256, num_beams: int = 4, adaptive: bool = False,
+             confidence_threshold: float = 0.9, apply_inversion: bool = False,
+             apply_binarization: bool = False) -> tuple:
+    """
+    Прогоняет модель по набору данных.
+
+    Args:
+        samples: Пары (путь к изображению, LaTeX)
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        batch_size: Размер батча генерации
+        num_workers: Количество процессов предобработки (0 - в основном процессе)
+        max_length: Максимальная длина генерации
+        num_beams: Количество лучей для beam search
+        adaptive: Адаптивный beam search
+        confidence_threshold: Порог уверенности для адаптивного режима
+        apply_inversion: Применить автоинверсию
+        apply_binarization: Применить бинаризацию
+
+    Returns:
+        tuple: (список результатов по примерам, сводка с метриками и производительностью;
+                CER и ExpRate в процентах, как в config/models.json)
+
+    Raises:
+        ValueError: Пустой набор примеров
+    """
+    if not samples:
+        raise ValueError("Набор данных пуст: нет примеров для оценки")
+
+    loader = DataLoader(
+        LabeledImageDataset(samples, apply_inversion, apply_binarization),
+        batch_size=batch_size,
+        num_workers=num_workers,
+        collate_fn=PixelValuesCollator(get_pixel_config(processor)),
+        prefetch_factor=2 if num_workers > 0 else None,
+    )
+
+    rows, batch_latencies, per_image, wait_times = [], [], [], []
+    start = time.perf_counter()
+    wait_start = start
+
+    for batch in loader:
+        batch_start = time.perf_counter()
+        wait_times.append((batch_start - wait_start) * 1000)
+
+        if adaptive:
+            results = predict_adaptive(
+                batch["pixel_values"], processor, model, max_length, num_beams, confidence_threshold
+            )
+        else:
+            results = generate_with_confidence(batch["pixel_values"], processor, model, max_length, num_beams)
+
+        batch_ms = (time.perf_counter() - batch_start) * 1000
+        batch_latencies.append(batch_ms)
+        # Амортизированная латентность одного изображения в батче
+        per_image.extend([batch_ms / len(results)] * len(results))
+
+        for file, reference, result in zip(batch["files"], batch["references"], results):
+            metrics = compute_metrics(result["latex"], reference)
+            rows.append({
+                "file": file,
+                "reference": reference,
+                "prediction": result["latex"],
+                "confidence": result["confidence"],
+                "num_beams": result["num_beams"],
+                "cer": metrics["cer"],
+                "edit_distance": metrics["edit_distance"],
+                "exact_match": metrics["exact_match"],
+                "batch_latency_ms": batch_ms,
+            })
+
+        wait_start = time.perf_counter()
+        print(f"\r{len(rows)}/{len(samples)}", end="", flush=True)
+    print()
+
+    total_seconds = time.perf_counter() - start
+
+    summary = aggregate_metrics(rows)
+    summary.update({
+        "total_seconds": total_seconds,
+        "throughput_images_per_s": len(rows) / total_seconds if total_seconds > 0 else 0.0,
+        "batch_latency_ms": dict(percentiles(batch_latencies), mean=statistics.fmean(batch_latencies)),
+        "image_latency_ms": dict(percentiles(per_image), mean=statistics.fmean(per_image)),
+        "data_wait_ms": dict(percentiles(wait_times), total=sum(wait_times)),
+        "config": {
+            "batch_size": batch_size,
+            "num_workers": num_workers,
+            "max_length": max_length,
+            "num_beams": num_beams,
+            "adaptive": adaptive,
+            "confidence_threshold": confidence_threshold if adaptive else None,
+            "torch_threads": torch.get_num_threads(),
+        },
+    })
+    return rows, summary
+
+
+def write_outputs(rows: list, summary: dict, output_dir: Path):
+    """
+    Сохраняет predictions.jsonl, predictions.csv и metrics.json в output_dir.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(output_dir / "predictions.jsonl", "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    with open(output_dir / "predictions.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["file"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+    with open(output_dir / "metrics.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-оценка модели TrOCR на наборе данных HME100K")
+    add_model_arguments(parser)
+    parser.add_argument("--images", required=True, help="Папка с изображениями")
+    parser.add_argument("--labels", required=True, help="Файл разметки (имя файла \\t LaTeX)")
+    parser.add_argument("--output-dir", default="eval_output", help="Папка для результатов")
+    parser.add_argument("--limit", type=int, default=None, help="Ограничение количества примеров")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=min(4, max(1, (os.cpu_count() or 2) // 2)),
+                        help="Процессы предобработки (0 - без пула)")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads для генерации")
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--num-beams", type=int, default=4)
+    parser.add_argument("--adaptive", action="store_true", help="Адаптивный beam search")
+    parser.add_argument("--confidence-threshold", type=float, default=0.9)
+    parser.add_argument("--inversion", action="store_true", help="Автоинверсия")
+    parser.add_argument("--binarization", action="store_true", help="Бинаризация")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    samples = load_samples(args.images, args.labels, limit=args.limit)
+    if not samples:
+        parser.error(f"Нет примеров в {args.labels}")
+
+    model_path, quantization = resolve_model_args(args)
+    processor, model = load_local_model(model_path, quantization)
+
+    rows, summary = evaluate(
+        samples, processor, model,
+        batch_size=args.batch_size,
+        num_workers=args.workers,
+        max_length=args.max_length,
+        num_beams=args.num_beams,
+        adaptive=args.adaptive,
+        confidence_threshold=args.confidence_threshold,
+        apply_inversion=args.inversion,
+        apply_binarization=args.binarization,
+    )
+    summary["model_path"] = model_path
+    summary["quantization"] = quantization
+    write_outputs(rows, summary, Path(args.output_dir))
+
+    print(
+        f"ExpRate: {summary['exp_rate']:.2f}%  ExpRate≤2: {summary['exp_rate_2']:.2f}%  "
+        f"CER: {summary['cer']:.2f}%  Avg Edit Distance: {summary['avg_edit_distance']:.2f}"
+    )
+    print(
+        f"Throughput: {summary['throughput_images_per_s']:.2f} img/s  "
+        f"p50/p95 батча: {summary['batch_latency_ms']['p50']:.0f}/{summary['batch_latency_ms']['p95']:.0f} мс"
+    )
+
+
+if __name__ == "__main__":
+    main()
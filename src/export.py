@@ -1,4 +1,10 @@
+import csv
+import io
+import json
+import zipfile
 from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
 
 
 def export_to_txt(latex: str, filename: str = None) -> str:
@@ -38,3 +44,97 @@ def create_download_button_data(latex: str) -> bytes:
     content = export_to_txt(latex)
     return content.encode("utf-8")
 
+
+# Поля результатов пакетного распознавания (src/jobs.py)
+RESULT_FIELDS = ("file", "latex", "confidence", "num_beams", "latency_ms", "error")
+
+# Формат -> (MIME-тип, расширение файла)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "jsonl": ("application/x-ndjson", ".jsonl"),
+    "zip": ("application/zip", ".zip"),
+}
+
+
+def iter_csv(rows: Iterable[dict], fields: tuple = RESULT_FIELDS) -> Iterator[bytes]:
+    """
+    Построчно формирует CSV (UTF-8 с BOM, чтобы Excel правильно открыл кириллицу).
+
+    Args:
+        rows: Результаты распознавания
+        fields: Колонки CSV
+
+    Yields:
+        bytes: Заголовок, затем по одной строке на результат
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_jsonl(rows: Iterable[dict], fields: tuple = RESULT_FIELDS) -> Iterator[bytes]:
+    """
+    Построчно формирует JSONL.
+
+    Yields:
+        bytes: Одна JSON-строка на результат
+    """
+    for row in rows:
+        yield (json.dumps({field: row.get(field) for field in fields}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def write_zip(rows: list, fileobj, fields: tuple = RESULT_FIELDS):
+    """
+    Записывает ZIP-архив: results.csv, results.jsonl и по одному .tex файлу на распознанное изображение.
+    Записи архива пишутся потоково, без сборки содержимого в памяти.
+
+    Args:
+        rows: Результаты распознавания
+        fileobj: Бинарный файловый объект для записи
+        fields: Поля CSV и JSONL
+    """
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("results.csv", "w") as f:
+            for chunk in iter_csv(rows, fields):
+                f.write(chunk)
+        with archive.open("results.jsonl", "w") as f:
+            for chunk in iter_jsonl(rows, fields):
+                f.write(chunk)
+        for index, row in enumerate(rows, start=1):
+            if row.get("latex") is None:
+                continue
+            # Номер в имени: исходные имена файлов могут повторяться
+            name = f"latex/{index:04d}_{Path(row['file']).stem}.tex"
+            archive.writestr(name, row["latex"] + "\n")
+
+
+def export_results(rows: list, fmt: str, fileobj=None):
+    """
+    Экспортирует результаты пакетного распознавания в CSV, JSONL или ZIP.
+
+    Args:
+        rows: Результаты распознавания
+        fmt: "csv", "jsonl" или "zip"
+        fileobj: Бинарный файловый объект для записи (None - io.BytesIO)
+
+    Returns:
+        Файловый объект, перемотанный в начало (если он поддерживает seek)
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt} (ожидается один из {tuple(EXPORT_FORMATS)})")
+
+    fileobj = fileobj if fileobj is not None else io.BytesIO()
+    if fmt == "zip":
+        write_zip(rows, fileobj)
+    else:
+        for chunk in (iter_csv(rows) if fmt == "csv" else iter_jsonl(rows)):
+            fileobj.write(chunk)
+    if fileobj.seekable():
+        fileobj.seek(0)
+    return fileobj
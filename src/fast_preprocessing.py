@@ -0,0 +1,175 @@
+"""
+Векторизованное преобразование изображений в тензор pixel_values.
+
+TrOCRProcessor обрабатывает каждое изображение отдельно: ресайз через PIL
+и нормализация в Python. Здесь те же шаги (resize -> rescale -> normalize)
+выполняются для N изображений сразу на uint8 массивах numpy/torch,
+без промежуточных PIL-копий. Параметры берутся из image_processor,
+поэтому модель получает те же входы, что и через процессор.
+
+Проверка совпадения с процессором (без модели - tests/test_fast_preprocessing.py):
+    python -m src.fast_preprocessing --model-path models/trocr1-5ep --images data/test
+"""
+import argparse
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from transformers import TrOCRProcessor
+
+
+# Допустимое отклонение от TrOCRProcessor в нормализованном пространстве [-1, 1]
+# (соответствует ~2 уровням яркости uint8 при std = 0.5)
+DEFAULT_TOLERANCE = 2 * 2 / 255
+
+
+def get_pixel_config(processor: TrOCRProcessor) -> dict:
+    """
+    Извлекает параметры предобработки из image_processor процессора.
+
+    Args:
+        processor: TrOCRProcessor
+
+    Returns:
+        dict: {"size": (H, W), "do_resize", "do_rescale", "rescale_factor",
+               "do_normalize", "image_mean", "image_std"}
+    """
+    image_processor = processor.image_processor
+    size = image_processor.size
+    return {
+        "size": (size["height"], size["width"]),
+        "do_resize": image_processor.do_resize,
+        "do_rescale": image_processor.do_rescale,
+        "rescale_factor": image_processor.rescale_factor,
+        "do_normalize": image_processor.do_normalize,
+        "image_mean": list(image_processor.image_mean),
+        "image_std": list(image_processor.image_std),
+    }
+
+
+def _to_chw_tensor(array: Union[np.ndarray, torch.Tensor]) -> torch.Tensor:
+    """
+    Приводит uint8 массив (H, W), (H, W, 3) или (H, W, 4) к тензору (3, H, W) без копирования данных,
+    где это возможно.
+    """
+    tensor = torch.as_tensor(array)
+    if tensor.dtype != torch.uint8:
+        raise ValueError(f"Ожидается массив uint8, получено: {tensor.dtype}")
+
+    if tensor.ndim == 2:
+        return tensor.unsqueeze(0).expand(3, -1, -1)
+    if tensor.ndim == 3 and tensor.shape[2] in (3, 4):
+        return tensor[:, :, :3].permute(2, 0, 1)
+    raise ValueError(f"Неподдерживаемая форма массива: {tuple(tensor.shape)}")
+
+
+def arrays_to_pixel_values(arrays: List[Union[np.ndarray, torch.Tensor]], processor: TrOCRProcessor = None,
+                           config: dict = None) -> torch.Tensor:
+    """
+    Преобразует список uint8 массивов в тензор pixel_values (N, 3, H, W).
+    Изображения одинакового размера ресайзятся одним вызовом interpolate,
+    rescale и normalize выполняются одной операцией над всем батчем.
+
+    Args:
+        arrays: uint8 массивы формы (H, W), (H, W, 3) или (H, W, 4) (альфа-канал отбрасывается)
+        processor: TrOCRProcessor (источник параметров, если config не задан)
+        config: Параметры предобработки (см. get_pixel_config)
+
+    Returns:
+        torch.Tensor: pixel_values float32 формы (N, 3, H, W)
+    """
+    if config is None:
+        config = get_pixel_config(processor)
+    height, width = config["size"]
+
+    # Группировка по исходному размеру: одинаковые изображения ресайзятся вместе
+    tensors = [_to_chw_tensor(array) for array in arrays]
+    groups = {}
+    for index, tensor in enumerate(tensors):
+        groups.setdefault(tuple(tensor.shape[1:]), []).append(index)
+
+    pixel_values = torch.empty((len(tensors), 3, height, width), dtype=torch.float32)
+    for shape, indices in groups.items():
+        batch = torch.stack([tensors[i] for i in indices]).float()
+        if config["do_resize"] and shape != (height, width):
+            # antialias=True повторяет билинейный ресайз PIL, округление - его uint8 результат
+            batch = F.interpolate(
+                batch, size=(height, width), mode="bilinear", antialias=True, align_corners=False
+            ).round_().clamp_(0, 255)
+        pixel_values[indices] = batch
+
+    # rescale + normalize как одна аффинная операция по каналам: x * scale + shift
+    scale = torch.full((3,), config["rescale_factor"] if config["do_rescale"] else 1.0)
+    shift = torch.zeros(3)
+    if config["do_normalize"]:
+        mean = torch.tensor(config["image_mean"], dtype=torch.float32)
+        std = torch.tensor(config["image_std"], dtype=torch.float32)
+        scale = scale / std
+        shift = -mean / std
+    pixel_values.mul_(scale.view(1, 3, 1, 1)).add_(shift.view(1, 3, 1, 1))
+
+    return pixel_values
+
+
+def max_abs_difference(images: List[Image.Image], processor: TrOCRProcessor) -> float:
+    """
+    Сравнивает векторизованный путь с TrOCRProcessor на одних и тех же изображениях.
+
+    Args:
+        images: PIL Image в формате RGB
+        processor: TrOCRProcessor
+
+    Returns:
+        float: Максимальное абсолютное отклонение pixel_values
+    """
+    reference = processor(images=images, return_tensors="pt").pixel_values
+    fast = arrays_to_pixel_values([np.asarray(image.convert("RGB")) for image in images], processor)
+    return float((reference - fast).abs().max())
+
+
+def random_images(count: int, seed: int = 0) -> List[Image.Image]:
+    """
+    Синтетические RGB-изображения разных размеров (уменьшение, увеличение, совпадающий размер).
+
+    Args:
+        count: Количество изображений
+        seed: Seed генератора
+
+    Returns:
+        list: PIL Image в формате RGB
+    """
+    rng = np.random.default_rng(seed)
+    shapes = [(200, 800), (384, 384), (97, 513), (1200, 900)]
+    return [
+        Image.fromarray(rng.integers(0, 256, (*shapes[i % len(shapes)], 3), dtype=np.uint8))
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка совпадения векторизованной предобработки с TrOCRProcessor")
+    parser.add_argument("--model-path", default="models/trocr1-5ep", help="Путь к папке с моделью")
+    parser.add_argument("--images", default=None, help="Папка с изображениями (по умолчанию - синтетические)")
+    parser.add_argument("--limit", type=int, default=32)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    processor = TrOCRProcessor.from_pretrained(args.model_path)
+
+    if args.images:
+        paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in (".png", ".jpg", ".jpeg"))
+        images = [Image.open(p).convert("RGB") for p in paths[:args.limit]]
+    else:
+        images = random_images(args.limit)
+
+    difference = max_abs_difference(images, processor)
+    print(f"Изображений: {len(images)}, макс. отклонение: {difference:.6f} (допуск {args.tolerance:.6f})")
+    if difference > args.tolerance:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
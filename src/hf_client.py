@@ -0,0 +1,277 @@
+"""
+Клиент HuggingFace Inference API без зависимости от Streamlit и st.secrets.
+
+Один requests.Session с пулом keep-alive соединений на весь процесс,
+повторы с экспоненциальной задержкой (для 503 "модель загружается" учитывается
+estimated_time из ответа), параллельная отправка нескольких изображений
+с ограниченным числом одновременных запросов и компактное PNG-кодирование без потерь.
+
+Пример:
+    client = HFInferenceClient("your-username/trocr-hme-finetuned", api_token="hf_...")
+    latex = client.predict(image)
+    latex_list = client.predict_many(images, max_workers=4)
+"""
+import io
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_API_URL = "https://api-inference.huggingface.co/models"
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class HFInferenceError(Exception):
+    """
+    Ошибка обращения к HuggingFace Inference API.
+
+    Attributes:
+        status_code: HTTP статус ответа (None для сетевых ошибок и таймаутов)
+    """
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def encode_image(image: Image.Image) -> bytes:
+    """
+    Кодирует изображение в PNG без потерь с минимальным размером:
+    серые RGB-изображения сохраняются в режиме L, черно-белые (только 0 и 255) -
+    в режиме 1 (1 бит на пиксель), затем применяется максимальное сжатие.
+
+    Args:
+        image: PIL Image объект
+
+    Returns:
+        bytes: PNG данные
+    """
+    if image.mode not in ("1", "L", "RGB"):
+        image = image.convert("RGB")
+
+    if image.mode == "RGB":
+        array = np.asarray(image)
+        if np.array_equal(array[:, :, 0], array[:, :, 1]) and np.array_equal(array[:, :, 1], array[:, :, 2]):
+            image = Image.fromarray(array[:, :, 0], mode="L")
+
+    if image.mode == "L":
+        histogram = image.histogram()
+        if sum(histogram[1:255]) == 0:
+            image = image.convert("1", dither=Image.Dither.NONE)
+
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG", optimize=True)
+    return buffered.getvalue()
+
+
+def parse_generated_text(result) -> str:
+    """
+    Извлекает текст из ответа API.
+    HF Inference API возвращает разные форматы в зависимости от модели,
+    для image-to-text обычно: [{"generated_text": "..."}]
+    """
+    if isinstance(result, list) and len(result) > 0:
+        latex = result[0].get("generated_text", "")
+    elif isinstance(result, dict):
+        latex = result.get("generated_text", result.get("text", ""))
+    else:
+        latex = str(result)
+    return latex.strip()
+
+
+class HFInferenceClient:
+    """
+    Клиент HuggingFace Inference API с пулом соединений и повторами.
+    Потокобезопасен: один экземпляр можно использовать из нескольких потоков.
+    """
+
+    def __init__(self, model_name: str, api_token: str = None, api_url: str = DEFAULT_API_URL,
+                 pool_size: int = 8, timeout: float = 30.0, max_retries: int = 5,
+                 backoff_base: float = 1.0, max_backoff: float = 60.0):
+        """
+        Args:
+            model_name: Имя модели на HuggingFace Hub
+            api_token: API токен HuggingFace (None - без авторизации)
+            api_url: Базовый URL (для локального stub-сервера: "http://127.0.0.1:8765/models")
+            pool_size: Максимум keep-alive соединений в пуле
+            timeout: Таймаут одного запроса в секундах
+            max_retries: Максимум повторов одного запроса
+            backoff_base: Начальная задержка повтора в секундах (удваивается с каждой попыткой)
+            max_backoff: Максимальная задержка повтора в секундах
+        """
+        self.model_name = model_name
+        self.endpoint = f"{api_url.rstrip('/')}/{model_name}"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if api_token:
+            self.session.headers["Authorization"] = f"Bearer {api_token}"
+
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "errors": 0, "bytes_sent": 0}
+
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        """
+        Задержка перед повтором: экспоненциальная с джиттером, но не меньше
+        estimated_time (503) или Retry-After (429) из ответа сервера.
+        """
+        delay = self.backoff_base * (2 ** attempt) * (0.5 + random.random() / 2)
+
+        if response is not None:
+            hint = None
+            if response.status_code == 503:
+                try:
+                    hint = float(response.json().get("estimated_time"))
+                except (ValueError, TypeError, AttributeError):
+                    hint = None
+            retry_after = response.headers.get("Retry-After")
+            if hint is None and retry_after:
+                try:
+                    hint = float(retry_after)
+                except ValueError:
+                    hint = None
+            if hint is not None:
+                delay = max(delay, hint)
+
+        return min(delay, self.max_backoff)
+
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self._stats[key] += value
+
+    def predict_bytes(self, payload: bytes) -> str:
+        """
+        Отправляет закодированное изображение и возвращает распознанный LaTeX.
+
+        Args:
+            payload: PNG данные (см. encode_image)
+
+        Returns:
+            str: Распознанная LaTeX строка
+
+        Raises:
+            HFInferenceError: Ошибка API или исчерпаны повторы
+        """
+        for attempt in range(self.max_retries + 1):
+            self._count("requests")
+            self._count("bytes_sent", len(payload))
+            try:
+                response = self.session.post(self.endpoint, data=payload, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    self._count("errors")
+                    status = "Превышено время ожидания ответа" if isinstance(e, requests.exceptions.Timeout) \
+                        else "Ошибка соединения"
+                    raise HFInferenceError(f"{status} от HuggingFace: {e}") from e
+                self._count("retries")
+                time.sleep(self._retry_delay(attempt))
+                continue
+
+            if response.ok:
+                try:
+                    return parse_generated_text(response.json())
+                except (ValueError, AttributeError) as e:
+                    # 200 с HTML или пустым телом (прокси, холодный endpoint) или неожиданный JSON
+                    self._count("errors")
+                    raise HFInferenceError(
+                        f"Некорректный ответ HuggingFace API: {response.text[:200]!r}",
+                        status_code=response.status_code
+                    ) from e
+
+            if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                self._count("retries")
+                time.sleep(self._retry_delay(attempt, response))
+                continue
+
+            self._count("errors")
+            if response.status_code == 503:
+                message = "Модель загружается на HuggingFace, повторы исчерпаны."
+            elif response.status_code == 401:
+                message = "Неверный HuggingFace API токен."
+            else:
+                message = f"Ошибка HuggingFace API: {response.status_code} - {response.text}"
+            raise HFInferenceError(message, status_code=response.status_code)
+
+    def predict(self, image: Image.Image) -> str:
+        """
+        Распознает одно изображение.
+
+        Args:
+            image: PIL Image объект
+
+        Returns:
+            str: Распознанная LaTeX строка
+        """
+        return self.predict_bytes(encode_image(image))
+
+    def predict_many(self, images: list, max_workers: int = 4, return_exceptions: bool = False) -> list:
+        """
+        Распознает несколько изображений параллельно (не более max_workers запросов одновременно).
+
+        Args:
+            images: Список PIL Image объектов
+            max_workers: Максимум одновременных запросов
+            return_exceptions: Возвращать HFInferenceError на месте неудачных изображений
+                               вместо выброса первой ошибки
+
+        Returns:
+            list: LaTeX строки в порядке входных изображений
+        """
+        def task(image):
+            try:
+                return self.predict(image)
+            except HFInferenceError as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        if not images:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(images)))) as executor:
+            return list(executor.map(task, images))
+
+    def status(self) -> dict:
+        """
+        Проверяет статус модели на HuggingFace Hub.
+
+        Returns:
+            dict: Информация о статусе модели (или {"error": ...})
+        """
+        status_url = self.endpoint.replace("/models/", "/status/", 1)
+        try:
+            response = self.session.get(status_url, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            return {"error": str(e)}
+
+    def stats(self) -> dict:
+        """
+        Счетчики запросов: requests, retries, errors, bytes_sent.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
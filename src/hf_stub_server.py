@@ -0,0 +1,234 @@
+"""
+Локальный stub-сервер, имитирующий HuggingFace Inference API, для офлайн-проверки
+и бенчмарка клиента src/hf_client.py.
+
+Сервер отвечает [{"generated_text": ...}] на POST /models/<имя>, добавляет
+настраиваемую задержку, может первые N запросов отвечать 503 "модель загружается"
+(с estimated_time), следующие M - 429 с Retry-After, случайно возвращать 500
+или отвечать 200 с произвольным телом (HTML-страница прокси, пустой ответ). Считает принятые TCP соединения,
+чтобы было видно переиспользование keep-alive.
+
+Примеры:
+    python -m src.hf_stub_server serve --port 8765 --latency-ms 50
+    python -m src.hf_stub_server bench --images 32 --workers 8 --loading-requests 2
+"""
+import argparse
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.hf_client import HFInferenceClient
+
+
+class StubState:
+    """
+    Настройки и счетчики stub-сервера (общие для всех потоков обработчика).
+    """
+
+    def __init__(self, latency_ms: float = 50.0, loading_requests: int = 0, estimated_time: float = 0.5,
+                 rate_limited_requests: int = 0, retry_after: float = 1.0, error_rate: float = 0.0,
+                 response_text: str = "x^{2}+y^{2}=z^{2}", raw_response: str = None):
+        self.latency_ms = latency_ms
+        self.loading_requests = loading_requests
+        self.estimated_time = estimated_time
+        self.rate_limited_requests = rate_limited_requests
+        self.retry_after = retry_after
+        self.raw_response = raw_response
+        self.error_rate = error_rate
+        self.response_text = response_text
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.bytes_received = 0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "connections": self.connections, "bytes_received": self.bytes_received}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.state.lock:
+            self.server.state.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, data: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status: int, body, headers: dict = None):
+        self._send(status, json.dumps(body).encode("utf-8"), "application/json", headers)
+
+    def do_POST(self):
+        state = self.server.state
+        payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with state.lock:
+            state.requests += 1
+            state.bytes_received += len(payload)
+            number = state.requests
+
+        if not self.path.startswith("/models/"):
+            self._send_json(404, {"error": "Not Found"})
+            return
+        if number <= state.loading_requests:
+            self._send_json(503, {"error": "Model is currently loading", "estimated_time": state.estimated_time})
+            return
+        if number <= state.loading_requests + state.rate_limited_requests:
+            self._send_json(429, {"error": "Rate limit reached"}, headers={"Retry-After": str(state.retry_after)})
+            return
+
+        time.sleep(state.latency_ms / 1000)
+        if random.random() < state.error_rate:
+            self._send_json(500, {"error": "Internal Server Error"})
+            return
+        if state.raw_response is not None:
+            self._send(200, state.raw_response.encode("utf-8"), "text/html")
+            return
+        self._send_json(200, [{"generated_text": state.response_text}])
+
+    def do_GET(self):
+        if self.path.startswith("/status/"):
+            self._send_json(200, {"loaded": True, "state": "Loaded", "framework": "stub"})
+        else:
+            self._send_json(404, {"error": "Not Found"})
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, **state_options) -> ThreadingHTTPServer:
+    """
+    Запускает stub-сервер в фоновом потоке.
+
+    Args:
+        host: Адрес
+        port: Порт (0 - свободный порт)
+        **state_options: Параметры StubState (latency_ms, loading_requests, ...)
+
+    Returns:
+        ThreadingHTTPServer: Сервер (server.state - счетчики, server.api_url - базовый URL для клиента,
+                             остановка - server.shutdown())
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(**state_options)
+    server.api_url = f"http://{host}:{server.server_address[1]}/models"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def naive_predict(api_url: str, model_name: str, image) -> str:
+    """
+    Прежний способ: новое соединение и PNG без оптимизации на каждый запрос.
+    """
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    response = requests.post(f"{api_url}/{model_name}", data=buffered.getvalue(), timeout=30)
+    response.raise_for_status()
+    return response.json()[0]["generated_text"]
+
+
+def command_serve(args):
+    server = start_stub_server(
+        args.host, args.port, latency_ms=args.latency_ms, loading_requests=args.loading_requests,
+        estimated_time=args.estimated_time, error_rate=args.error_rate
+    )
+    print(f"Stub HF Inference API: {server.api_url}/<model_name> (Ctrl+C для остановки)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+def command_bench(args):
+    from src.synthetic import synthetic_formula_image
+    from src.preprocessing import preprocess_image
+
+    images = [
+        preprocess_image(synthetic_formula_image(200, 800, seed=i), apply_binarization=True)
+        for i in range(args.images)
+    ]
+    server = start_stub_server(
+        latency_ms=args.latency_ms, loading_requests=args.loading_requests,
+        estimated_time=args.estimated_time, error_rate=args.error_rate
+    )
+
+    try:
+        # Прежний клиент: последовательные запросы без keep-alive и повторов
+        # (503 в начале пропускаем, как и раньше пользователь бы нажал кнопку повторно)
+        before = server.state.snapshot()
+        start = time.perf_counter()
+        for image in images:
+            try:
+                naive_predict(server.api_url, "stub/model", image)
+            except requests.exceptions.HTTPError:
+                pass
+        naive_seconds = time.perf_counter() - start
+        naive = server.state.snapshot()
+        naive = {key: naive[key] - before[key] for key in naive}
+
+        server.state.loading_requests = naive["requests"] + args.loading_requests
+
+        before = server.state.snapshot()
+        with HFInferenceClient("stub/model", api_url=server.api_url, pool_size=args.workers,
+                               backoff_base=0.05) as client:
+            start = time.perf_counter()
+            client.predict_many(images, max_workers=args.workers)
+            pooled_seconds = time.perf_counter() - start
+            client_stats = client.stats()
+        pooled = server.state.snapshot()
+        pooled = {key: pooled[key] - before[key] for key in pooled}
+    finally:
+        server.shutdown()
+
+    print(f"{'':<28}{'naive':>12}{'pooled':>12}")
+    print(f"{'Время, с':<28}{naive_seconds:>12.2f}{pooled_seconds:>12.2f}")
+    print(f"{'Изображений/с':<28}{len(images) / naive_seconds:>12.1f}{len(images) / pooled_seconds:>12.1f}")
+    print(f"{'HTTP запросов':<28}{naive['requests']:>12}{pooled['requests']:>12}")
+    print(f"{'TCP соединений':<28}{naive['connections']:>12}{pooled['connections']:>12}")
+    print(f"{'Байт отправлено':<28}{naive['bytes_received']:>12}{pooled['bytes_received']:>12}")
+    print(f"Повторов клиента: {client_stats['retries']}, ошибок: {client_stats['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub-сервер HuggingFace Inference API")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_state_arguments(subparser):
+        subparser.add_argument("--latency-ms", type=float, default=50.0, help="Задержка ответа")
+        subparser.add_argument("--loading-requests", type=int, default=0,
+                               help="Сколько первых запросов отвечать 503 (модель загружается)")
+        subparser.add_argument("--estimated-time", type=float, default=0.5, help="estimated_time в ответе 503")
+        subparser.add_argument("--error-rate", type=float, default=0.0, help="Доля случайных ответов 500")
+
+    serve_parser = subparsers.add_parser("serve", help="Запустить сервер")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    add_state_arguments(serve_parser)
+    serve_parser.set_defaults(func=command_serve)
+
+    bench_parser = subparsers.add_parser("bench", help="Сравнить прежний и пуловый клиент")
+    bench_parser.add_argument("--images", type=int, default=32)
+    bench_parser.add_argument("--workers", type=int, default=8)
+    add_state_arguments(bench_parser)
+    bench_parser.set_defaults(func=command_bench)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Постоянная история распознаваний в SQLite.
+
+Каждое распознавание сохраняется с хешем предобработанного изображения,
+флагами предобработки, моделью, параметрами генерации, LaTeX, уверенностью,
+латентностью и (опционально) ground truth. История общая для всех сессий
+и переживает перезапуск приложения:
+- повторное изображение с теми же моделью и параметрами находится по индексу
+  (image_hash, params_key) без инференса;
+- база открывается в режиме WAL: читатели не блокируют писателя, а запись
+  из многих сессий (потоков и процессов) выполняется короткими транзакциями
+  с ожиданием блокировки (busy_timeout);
+- просмотр истории использует keyset-пагинацию (WHERE id < ? ORDER BY id DESC),
+  поэтому стоимость страницы не зависит от ее номера и размера таблицы.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recognitions (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    image_hash TEXT NOT NULL,
+    params_key TEXT NOT NULL,
+    model_key TEXT,
+    source TEXT,
+    inverted INTEGER,
+    binarized INTEGER,
+    latex TEXT NOT NULL,
+    confidence REAL,
+    num_beams INTEGER,
+    latency_ms REAL,
+    ground_truth TEXT
+);
+CREATE INDEX IF NOT EXISTS recognitions_hash ON recognitions (image_hash, params_key, id);
+CREATE INDEX IF NOT EXISTS recognitions_model ON recognitions (model_key, id);
+"""
+
+COLUMNS = (
+    "id", "created_at", "image_hash", "params_key", "model_key", "source", "inverted", "binarized",
+    "latex", "confidence", "num_beams", "latency_ms", "ground_truth",
+)
+
+
+def make_params_key(params: dict) -> str:
+    """
+    Канонический ключ параметров генерации (модель, max_length, num_beams, ...).
+    """
+    return json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def optional_flag(value) -> Optional[int]:
+    return None if value is None else int(bool(value))
+
+
+class RecognitionHistory:
+    """
+    Потокобезопасная история распознаваний (отдельное соединение на поток).
+    """
+
+    def __init__(self, db_path: str, busy_timeout_ms: int = 5000):
+        """
+        Args:
+            db_path: Путь к файлу базы (папка создается при необходимости)
+            busy_timeout_ms: Сколько ждать блокировку записи другой сессией
+        """
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        # WAL переключается один раз и сохраняется в файле базы
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # isolation_level=None: каждая запись - отдельная короткая транзакция
+            connection = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            # В режиме WAL NORMAL не теряет целостность, а fsync выполняется только на checkpoint
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def lookup(self, image_hash: str, params: dict) -> Optional[dict]:
+        """
+        Ищет последнее распознавание изображения с теми же параметрами.
+
+        Args:
+            image_hash: Хеш предобработанного изображения (src.cache.image_hash)
+            params: Параметры генерации вместе с model_key
+
+        Returns:
+            dict: Запись истории или None
+        """
+        row = self._connection().execute(
+            "SELECT * FROM recognitions WHERE image_hash = ? AND params_key = ? ORDER BY id DESC LIMIT 1",
+            (image_hash, make_params_key(params))
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(row)
+
+    def record(self, image_hash: str, params: dict, result: dict, source: str = None,
+               preprocessing: dict = None) -> int:
+        """
+        Сохраняет результат распознавания.
+
+        Args:
+            image_hash: Хеш предобработанного изображения
+            params: Параметры генерации вместе с model_key
+            result: Результат {"latex", "confidence", "num_beams", "latency_ms"}
+            source: Источник изображения ("canvas", "upload", ...)
+            preprocessing: Флаги предобработки {"apply_inversion", "apply_binarization"}
+
+        Returns:
+            int: Идентификатор записи
+        """
+        preprocessing = preprocessing or {}
+        cursor = self._connection().execute(
+            "INSERT INTO recognitions (created_at, image_hash, params_key, model_key, source, inverted, "
+            "binarized, latex, confidence, num_beams, latency_ms, ground_truth) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                time.time(),
+                image_hash,
+                make_params_key(params),
+                params.get("model_key"),
+                source,
+                optional_flag(preprocessing.get("apply_inversion")),
+                optional_flag(preprocessing.get("apply_binarization")),
+                result["latex"],
+                result.get("confidence"),
+                result.get("num_beams"),
+                result.get("latency_ms"),
+                result.get("ground_truth"),
+            )
+        )
+        return cursor.lastrowid
+
+    def set_ground_truth(self, record_id: int, ground_truth: Optional[str]):
+        """
+        Записывает (или удаляет при пустой строке) ground truth для записи.
+        """
+        self._connection().execute(
+            "UPDATE recognitions SET ground_truth = ? WHERE id = ?",
+            (ground_truth or None, record_id)
+        )
+
+    def page(self, before_id: int = None, limit: int = 50, model_key: str = None) -> list:
+        """
+        Страница истории от новых записей к старым (keyset-пагинация).
+
+        Args:
+            before_id: Вернуть записи с id меньше этого (None - с самых новых)
+            limit: Размер страницы
+            model_key: Только записи этой модели (None - все)
+
+        Returns:
+            list: Записи истории; id последней - курсор следующей страницы
+        """
+        conditions, args = [], []
+        if before_id is not None:
+            conditions.append("id < ?")
+            args.append(before_id)
+        if model_key is not None:
+            conditions.append("model_key = ?")
+            args.append(model_key)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connection().execute(
+            f"SELECT * FROM recognitions {where} ORDER BY id DESC LIMIT ?",
+            (*args, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def model_keys(self) -> list:
+        """
+        Модели, встречающиеся в истории (по индексу recognitions_model, без сканирования таблицы).
+        """
+        keys = []
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT model_key FROM recognitions WHERE model_key IS NOT NULL ORDER BY model_key LIMIT 1"
+        ).fetchone()
+        while row is not None:
+            keys.append(row["model_key"])
+            row = connection.execute(
+                "SELECT model_key FROM recognitions WHERE model_key > ? ORDER BY model_key LIMIT 1",
+                (row["model_key"],)
+            ).fetchone()
+        return keys
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: {"records": int (приблизительно, по максимальному id), "hits": int, "misses": int}
+        """
+        # COUNT(*) сканирует всю таблицу; записи не удаляются, поэтому max(id) - точная оценка
+        row = self._connection().execute("SELECT MAX(id) FROM recognitions").fetchone()
+        return {"records": row[0] or 0, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        """
+        Закрывает соединение текущего потока.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
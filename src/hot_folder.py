@@ -0,0 +1,535 @@
+"""
+Headless-сервис "горячей папки": распознает изображения, появляющиеся в каталоге
+(например, от станции сканирования), без Streamlit.
+
+- Новые файлы отслеживаются watchdog; при старте досканируется каталог,
+  поэтому файлы, появившиеся во время остановки сервиса, тоже обрабатываются.
+- Недописанные файлы пропускаются (debounce): файл считается готовым, когда
+  по нему нет событий settle_s секунд, размер не изменился между проверками
+  и mtime старше settle_s. Временные файлы (.part, .tmp, скрытые) игнорируются,
+  переименование во входное имя обрабатывается как новый файл.
+- Готовые файлы распознаются батчами (до batch_size или по истечении max_wait_s):
+  load_image_bounded + preprocess_image + predict_latex_batch.
+- Результат пишется атомарно (временный файл + os.replace) рядом с изображением
+  (<имя>.json) или дописывается в JSONL-файл с fsync после каждого батча.
+- Обработанные файлы (путь, размер, mtime) дописываются в checkpoint после
+  записи результатов батча: после перезапуска они не распознаются повторно
+  (гарантия "хотя бы один раз"), а замененный файл с тем же именем - распознается.
+  Ошибка чтения файла постоянна и записывается как результат; ошибка всего батча
+  (нехватка памяти, сбой модели) считается временной: файлы батча не попадают
+  в checkpoint и распознаются повторно с нарастающей задержкой (и после перезапуска).
+- Раз в report_interval_s в лог и в status.json пишутся пропускная способность и очередь.
+
+Служебные файлы хранятся в <папка>/.hot_folder/ (checkpoint.jsonl, results.jsonl, status.json).
+
+Пример:
+    python -m src.hot_folder --watch /srv/scans --model trocr1-5ep --output jsonl
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from src.ingestion import load_image_bounded
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg")
+TEMP_SUFFIXES = (".part", ".tmp", ".crdownload", ".partial")
+STATE_DIR_NAME = ".hot_folder"
+OUTPUT_MODES = ("sidecar", "jsonl")
+
+
+def atomic_write_text(path: Path, text: str):
+    """
+    Записывает файл атомарно: читатель видит либо старое, либо полное новое содержимое.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def is_candidate(path: Path) -> bool:
+    """
+    Входное изображение (не временный, не скрытый и не служебный файл).
+    """
+    name = path.name.lower()
+    return (
+        not name.startswith(".")
+        and name.endswith(IMAGE_SUFFIXES)
+        and not name.endswith(TEMP_SUFFIXES)
+        and STATE_DIR_NAME not in path.parts
+    )
+
+
+class Checkpoint:
+    """
+    Множество обработанных файлов в append-only JSONL (дозапись дешевле перезаписи
+    при большом числе файлов; оборванная при сбое последняя строка пропускается).
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._processed = {}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._processed[entry["file"]] = (entry["size"], entry["mtime_ns"])
+
+    def __len__(self) -> int:
+        return len(self._processed)
+
+    def contains(self, key: str, stat: os.stat_result) -> bool:
+        return self._processed.get(key) == (stat.st_size, stat.st_mtime_ns)
+
+    def add_many(self, entries: list):
+        """
+        Args:
+            entries: Пары (ключ файла, os.stat_result)
+        """
+        with open(self.path, "a", encoding="utf-8") as f:
+            for key, stat in entries:
+                f.write(json.dumps({"file": key, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}) + "\n")
+                self._processed[key] = (stat.st_size, stat.st_mtime_ns)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, service: "HotFolderService"):
+        self.service = service
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.service.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.service.notify(event.src_path)
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.service.notify(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.service.forget(event.src_path)
+            self.service.notify(event.dest_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.service.forget(event.src_path)
+
+
+class HotFolderService:
+    """
+    Отслеживание каталога, debounce, батчевое распознавание и запись результатов.
+    """
+
+    def __init__(
+        self,
+        watch_dir: str,
+        recognize_batch: Callable,
+        output: str = "jsonl",
+        sink_path: str = None,
+        batch_size: int = 8,
+        max_wait_s: float = 1.0,
+        settle_s: float = 1.0,
+        recursive: bool = False,
+        preprocessing: dict = None,
+        report_interval_s: float = 10.0,
+        retry_base_s: float = 1.0,
+        retry_max_s: float = 300.0
+    ):
+        """
+        Args:
+            watch_dir: Отслеживаемый каталог
+            recognize_batch: Функция (images) -> list[dict] с полями "latex", "confidence", "num_beams"
+            output: "sidecar" (<изображение>.json рядом с файлом) или "jsonl" (один файл результатов)
+            sink_path: Путь JSONL-файла результатов (по умолчанию .hot_folder/results.jsonl)
+            batch_size: Максимальный размер батча
+            max_wait_s: Сколько ждать добора батча, если готовых файлов меньше batch_size
+            settle_s: Время без изменений, после которого файл считается дописанным
+            recursive: Отслеживать подкаталоги
+            preprocessing: Параметры preprocess_image (apply_inversion, apply_binarization)
+            report_interval_s: Период отчета о пропускной способности и очереди
+            retry_base_s: Задержка первого повтора после ошибки батча (удваивается с каждой попыткой)
+            retry_max_s: Максимальная задержка повтора
+        """
+        if output not in OUTPUT_MODES:
+            raise ValueError(f"output должен быть одним из {OUTPUT_MODES}, получено: {output}")
+        if batch_size < 1:
+            raise ValueError(f"batch_size должен быть >= 1, получено: {batch_size}")
+
+        self.watch_dir = Path(watch_dir).resolve()
+        self.recognize_batch = recognize_batch
+        self.output = output
+        self.batch_size = batch_size
+        self.max_wait_s = max_wait_s
+        self.settle_s = settle_s
+        self.recursive = recursive
+        self.preprocessing = dict(preprocessing or {})
+        self.report_interval_s = report_interval_s
+        self.retry_base_s = retry_base_s
+        self.retry_max_s = retry_max_s
+
+        self.state_dir = self.watch_dir / STATE_DIR_NAME
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.sink_path = Path(sink_path) if sink_path else self.state_dir / "results.jsonl"
+        self.status_path = self.state_dir / "status.json"
+        self.checkpoint = Checkpoint(self.state_dir / "checkpoint.jsonl")
+
+        # Ожидающие файлы: путь -> [время последнего события (monotonic), размер при последней проверке]
+        self._pending = {}
+        # Файлы после ошибки батча: путь -> (число попыток, время следующей попытки (monotonic))
+        self._retry = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._observer = None
+
+        self.processed = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.started_at = None
+        self._last_report = (time.monotonic(), 0)
+
+    def key(self, path: Path) -> str:
+        return path.relative_to(self.watch_dir).as_posix()
+
+    def notify(self, path):
+        """
+        Событие файловой системы: файл (пере)запускает отсчет settle_s.
+        """
+        path = Path(path)
+        if not is_candidate(path):
+            return
+        with self._lock:
+            entry = self._pending.get(path)
+            if entry is None:
+                self._pending[path] = [time.monotonic(), -1]
+            else:
+                entry[0] = time.monotonic()
+
+    def forget(self, path):
+        with self._lock:
+            self._pending.pop(Path(path), None)
+            self._retry.pop(Path(path), None)
+
+    def scan(self) -> int:
+        """
+        Ставит в очередь необработанные файлы, уже лежащие в каталоге (досканирование после перезапуска).
+        """
+        paths = self.watch_dir.rglob("*") if self.recursive else self.watch_dir.iterdir()
+        found = []
+        for path in paths:
+            if not path.is_file() or not is_candidate(path):
+                continue
+            try:
+                found.append((path, path.stat()))
+            except OSError:
+                continue
+
+        queued = 0
+        # Старые файлы - первыми
+        for path, stat in sorted(found, key=lambda item: item[1].st_mtime_ns):
+            if self.checkpoint.contains(self.key(path), stat):
+                continue
+            with self._lock:
+                # Отсчет settle_s уже истек; готовность определяется размером и mtime
+                self._pending.setdefault(path, [time.monotonic() - self.settle_s, stat.st_size])
+            queued += 1
+        return queued
+
+    def ready_files(self) -> list:
+        """
+        Файлы, которые дописаны: нет событий settle_s секунд, размер не изменился
+        с прошлой проверки и mtime старше settle_s.
+
+        Returns:
+            list: Пары (путь, os.stat_result) в порядке появления
+        """
+        now, wall_now = time.monotonic(), time.time()
+        ready = []
+        with self._lock:
+            for path, entry in list(self._pending.items()):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    # Файл удален или переименован
+                    del self._pending[path]
+                    continue
+                if stat.st_size != entry[1]:
+                    # Файл еще пишется: отсчет settle_s начинается заново
+                    entry[0], entry[1] = now, stat.st_size
+                    continue
+                if now - entry[0] < self.settle_s or wall_now - stat.st_mtime < self.settle_s or stat.st_size == 0:
+                    continue
+                if path in self._retry and now < self._retry[path][1]:
+                    continue
+                if self.checkpoint.contains(self.key(path), stat):
+                    del self._pending[path]
+                    continue
+                ready.append((path, stat))
+        return ready
+
+    def backlog(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def process_batch(self, batch: list):
+        """
+        Распознает батч, записывает результаты и только затем отмечает файлы в checkpoint.
+
+        Args:
+            batch: Пары (путь, os.stat_result)
+        """
+        from src.preprocessing import preprocess_image
+
+        # (путь, stat, запись результата); decoded - файлы, переданные в recognize_batch
+        entries, decoded, images = [], [], []
+        for path, stat in batch:
+            record = {"file": self.key(path), "latex": None, "confidence": None, "num_beams": None,
+                      "latency_ms": None, "error": None}
+            try:
+                image, _ = load_image_bounded(path)
+                images.append(preprocess_image(image, **self.preprocessing))
+                decoded.append((path, stat, record))
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+                entries.append((path, stat, record))
+
+        if images:
+            start = time.perf_counter()
+            try:
+                results = self.recognize_batch(images)
+            except Exception as e:
+                self.schedule_retry([path for path, _, _ in decoded], e)
+            else:
+                latency_ms = (time.perf_counter() - start) * 1000 / len(images)
+                for (_, _, record), result in zip(decoded, results):
+                    record.update(
+                        latex=result["latex"],
+                        confidence=result.get("confidence"),
+                        num_beams=result.get("num_beams"),
+                        latency_ms=latency_ms,
+                    )
+                entries.extend(decoded)
+
+        self.batches += 1
+        if not entries:
+            return
+        processed_at = time.time()
+        for _, _, record in entries:
+            record["processed_at"] = processed_at
+        done = [(path, stat) for path, stat, _ in entries]
+        records = [record for _, _, record in entries]
+        self.write_results(done, records)
+        self.checkpoint.add_many([(self.key(path), stat) for path, stat in done])
+
+        with self._lock:
+            for path, _ in done:
+                self._pending.pop(path, None)
+                self._retry.pop(path, None)
+        self.processed += len(records)
+        self.failed += sum(record["error"] is not None for record in records)
+
+    def schedule_retry(self, paths: list, error: Exception):
+        """
+        Откладывает повтор файлов после ошибки батча (экспоненциальная задержка до retry_max_s).
+        Файлы остаются в очереди и не отмечаются в checkpoint.
+        """
+        now, delay = time.monotonic(), 0.0
+        with self._lock:
+            for path in paths:
+                attempts = self._retry.get(path, (0, 0.0))[0] + 1
+                delay = min(self.retry_max_s, self.retry_base_s * 2 ** (attempts - 1))
+                self._retry[path] = (attempts, now + delay)
+        self.retries += len(paths)
+        logger.warning("Ошибка распознавания батча (%s: %s), повтор %d файлов через %.1f с",
+                       type(error).__name__, error, len(paths), delay)
+
+    def write_results(self, batch: list, records: list):
+        if self.output == "sidecar":
+            for (path, _), record in zip(batch, records):
+                atomic_write_text(path.with_name(path.name + ".json"), json.dumps(record, ensure_ascii=False, indent=2))
+            return
+        with open(self.sink_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def status(self) -> dict:
+        """
+        Returns:
+            dict: {"processed", "failed", "retrying", "retries", "batches", "backlog", "uptime_s",
+                   "throughput_per_s" (за все время), "recent_throughput_per_s" (с прошлого отчета)}
+        """
+        now = time.monotonic()
+        uptime = now - self.started_at if self.started_at is not None else 0.0
+        last_time, last_processed = self._last_report
+        window = now - last_time
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "retrying": len(self._retry),
+            "retries": self.retries,
+            "batches": self.batches,
+            "backlog": self.backlog(),
+            "checkpointed": len(self.checkpoint),
+            "uptime_s": uptime,
+            "throughput_per_s": self.processed / uptime if uptime > 0 else 0.0,
+            "recent_throughput_per_s": (self.processed - last_processed) / window if window > 0 else 0.0,
+        }
+
+    def report(self):
+        status = self.status()
+        self._last_report = (time.monotonic(), self.processed)
+        logger.info(
+            "Обработано %d (ошибок %d), очередь %d, %.2f файл/с (последний период %.2f файл/с)",
+            status["processed"], status["failed"], status["backlog"],
+            status["throughput_per_s"], status["recent_throughput_per_s"]
+        )
+        atomic_write_text(self.status_path, json.dumps(dict(status, updated_at=time.time()), indent=2))
+
+    def start(self) -> "HotFolderService":
+        """
+        Запускает наблюдатель файловой системы и досканирует каталог.
+        """
+        self.started_at = time.monotonic()
+        self._last_report = (self.started_at, 0)
+        self._observer = Observer()
+        self._observer.schedule(_EventHandler(self), str(self.watch_dir), recursive=self.recursive)
+        self._observer.start()
+        queued = self.scan()
+        logger.info("Отслеживается %s: в очереди %d, ранее обработано %d", self.watch_dir, queued, len(self.checkpoint))
+        return self
+
+    def run(self, poll_interval_s: float = 0.2):
+        """
+        Основной цикл: набор батча из готовых файлов, распознавание, отчеты. Блокирует до stop().
+        """
+        if self._observer is None:
+            self.start()
+        batch_started = None
+        next_report = time.monotonic() + self.report_interval_s
+        try:
+            while not self._stop.is_set():
+                ready = self.ready_files()
+                if ready:
+                    batch_started = batch_started or time.monotonic()
+                    # Полный батч - сразу, неполный - после max_wait_s ожидания добора
+                    if len(ready) >= self.batch_size or time.monotonic() - batch_started >= self.max_wait_s:
+                        for start in range(0, len(ready), self.batch_size):
+                            self.process_batch(ready[start:start + self.batch_size])
+                        batch_started = None
+                        continue
+                else:
+                    batch_started = None
+
+                if time.monotonic() >= next_report:
+                    self.report()
+                    next_report = time.monotonic() + self.report_interval_s
+                self._stop.wait(poll_interval_s)
+        finally:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self.report()
+
+    def stop(self):
+        self._stop.set()
+
+
+def make_local_recognizer(processor, model, generation: dict) -> Callable:
+    """
+    Функция распознавания батча локальной моделью для HotFolderService.
+    """
+    from src.inference import predict_latex_batch
+
+    def recognize(images: list) -> list:
+        return predict_latex_batch(
+            images, processor, model, max_batch_size=len(images), return_details=True, **generation
+        )
+
+    return recognize
+
+
+def main():
+    from src.runtime import add_model_arguments, load_local_model, resolve_model_args
+
+    parser = argparse.ArgumentParser(description="Распознавание изображений из отслеживаемой папки")
+    add_model_arguments(parser)
+    parser.add_argument("--watch", required=True, help="Отслеживаемая папка")
+    parser.add_argument("--output", choices=OUTPUT_MODES, default="jsonl",
+                        help="sidecar - <изображение>.json рядом с файлом, jsonl - один файл результатов")
+    parser.add_argument("--sink", default=None, help="Путь JSONL-файла (по умолчанию <папка>/.hot_folder/results.jsonl)")
+    parser.add_argument("--recursive", action="store_true", help="Отслеживать подпапки")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-wait", type=float, default=1.0, help="Ожидание добора батча, с")
+    parser.add_argument("--settle", type=float, default=1.0, help="Время без изменений файла, с")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Период отчета, с")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--num-beams", type=int, default=4)
+    parser.add_argument("--adaptive", action="store_true", help="Адаптивный beam search")
+    parser.add_argument("--confidence-threshold", type=float, default=0.9)
+    parser.add_argument("--inversion", action="store_true", help="Автоинверсия (темный фон)")
+    parser.add_argument("--binarization", action="store_true", help="Бинаризация")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    model_path, quantization = resolve_model_args(args)
+    processor, model = load_local_model(model_path, quantization)
+    generation = {
+        "max_length": args.max_length,
+        "num_beams": args.num_beams,
+        "adaptive": args.adaptive,
+        "confidence_threshold": args.confidence_threshold,
+    }
+
+    service = HotFolderService(
+        args.watch,
+        make_local_recognizer(processor, model, generation),
+        output=args.output,
+        sink_path=args.sink,
+        batch_size=args.batch_size,
+        max_wait_s=args.max_wait,
+        settle_s=args.settle,
+        recursive=args.recursive,
+        preprocessing={"apply_inversion": args.inversion, "apply_binarization": args.binarization},
+        report_interval_s=args.report_interval
+    )
+    try:
+        service.run()
+    except KeyboardInterrupt:
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
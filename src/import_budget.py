@@ -0,0 +1,166 @@
+"""
+Проверка времени импорта модулей приложения.
+
+Запускает отдельный интерпретатор с python -X importtime, импортирует модули,
+которые загружает app.py (без выполнения Streamlit-скрипта), и проверяет:
+- суммарное время импорта не превышает бюджет;
+- тяжелые зависимости (torch, transformers, cv2, streamlit_drawable_canvas, gdown)
+  не импортируются при старте, а загружаются при первом использовании.
+
+Завершается с кодом 1 при нарушении.
+
+Пример:
+    python -m src.import_budget --budget-ms 1500 --output importtime.json
+"""
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+
+APP_PATH = Path(__file__).parent.parent / "app.py"
+
+# Загружаются при первом распознавании через HF API и тоже должны быть легкими
+EXTRA_MODULES = ("src.inference_hf",)
+
+# Зависимости, которые должны загружаться только при первом использовании
+DEFERRED_MODULES = ("torch", "transformers", "cv2", "streamlit_drawable_canvas", "gdown")
+
+
+def app_modules(path: Path = APP_PATH, extra: tuple = EXTRA_MODULES) -> tuple:
+    """
+    Модули src.*, которые app.py импортирует при старте: импорты верхнего уровня,
+    в том числе внутри try (необязательные вкладки), плюс extra.
+
+    Args:
+        path: Путь к app.py
+        extra: Дополнительные модули
+
+    Returns:
+        tuple: Имена модулей без повторов в порядке появления
+    """
+    tree = ast.parse(Path(path).read_text(encoding="utf-8"))
+    statements = []
+    for node in tree.body:
+        statements.append(node)
+        if isinstance(node, ast.Try):
+            statements.extend(node.body)
+
+    modules = []
+    for node in statements:
+        if isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+        elif isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+    modules = [module for module in modules if module.startswith("src.")] + list(extra)
+    return tuple(dict.fromkeys(modules))
+
+
+# Модули, которые импортирует app.py при старте
+APP_MODULES = app_modules()
+
+
+def measure_import_time(modules: tuple = APP_MODULES) -> list:
+    """
+    Импортирует модули в отдельном процессе с -X importtime.
+
+    Args:
+        modules: Имена модулей
+
+    Returns:
+        list: Записи {"module", "self_us", "cumulative_us", "depth"} в порядке вывода importtime
+    """
+    code = "; ".join(f"import {module}" for module in modules) or "pass"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Не удалось импортировать модули приложения:\n{completed.stderr[-2000:]}")
+
+    records = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        stripped = name.lstrip()
+        records.append({
+            "module": stripped.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "depth": (len(name) - len(stripped) - 1) // 2,
+        })
+    return records
+
+
+def check_budget(records: list, budget_ms: float, deferred: tuple = DEFERRED_MODULES,
+                 startup_records: list = ()) -> dict:
+    """
+    Проверяет бюджет времени импорта и отсутствие отложенных зависимостей.
+
+    Args:
+        records: Результат measure_import_time
+        budget_ms: Допустимое суммарное время импорта, мс
+        deferred: Модули, которые не должны импортироваться при старте
+        startup_records: Импорты пустого интерпретатора (исключаются из суммы)
+
+    Returns:
+        dict: {"total_ms", "budget_ms", "over_budget", "eager_deferred", "top"}
+    """
+    startup = {record["module"] for record in startup_records}
+    records = [record for record in records if record["module"] not in startup]
+    total_ms = sum(record["cumulative_us"] for record in records if record["depth"] == 0) / 1000
+    imported = {record["module"].split(".")[0] for record in records}
+    top = sorted(records, key=lambda record: record["cumulative_us"], reverse=True)[:20]
+    return {
+        "total_ms": total_ms,
+        "budget_ms": budget_ms,
+        "over_budget": total_ms > budget_ms,
+        "eager_deferred": sorted(module for module in deferred if module in imported),
+        "top": [
+            {"module": record["module"], "cumulative_ms": record["cumulative_us"] / 1000}
+            for record in top
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка времени импорта модулей приложения")
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="Бюджет суммарного времени импорта")
+    parser.add_argument("--repeats", type=int, default=3, help="Замеров (берется минимальный)")
+    parser.add_argument("--output", default=None, help="Путь для сохранения отчета в JSON")
+    args = parser.parse_args()
+
+    # Минимум по нескольким запускам сглаживает влияние холодного дискового кеша
+    startup_records = measure_import_time(())
+    reports = [
+        check_budget(measure_import_time(), args.budget_ms, startup_records=startup_records)
+        for _ in range(max(1, args.repeats))
+    ]
+    report = min(reports, key=lambda item: item["total_ms"])
+
+    print(f"Время импорта: {report['total_ms']:.0f} мс (бюджет {args.budget_ms:.0f} мс)")
+    for item in report["top"][:10]:
+        print(f"  {item['cumulative_ms']:>8.1f} мс  {item['module']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failed = False
+    if report["eager_deferred"]:
+        print(f"Импортированы при старте: {', '.join(report['eager_deferred'])}")
+        failed = True
+    if report["over_budget"]:
+        print("Бюджет времени импорта превышен")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,34 @@
-import torch
-import streamlit as st
+import math
+import numpy as np
+import time
+import contextvars
+import logging
+from threading import Thread
 from PIL import Image
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+from typing import TYPE_CHECKING, Iterator, List
+
+from src.tracing import current_trace, span, time_module, trace
+
+logger = logging.getLogger(__name__)
+
+# torch и transformers импортируются при первом локальном инференсе:
+# режим HuggingFace API и вкладки без модели их не загружают
+if TYPE_CHECKING:
+    import torch
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel
 
 
 def predict_latex_unified(
     image: Image.Image,
-    processor: TrOCRProcessor = None,
-    model: VisionEncoderDecoderModel = None,
+    processor: "TrOCRProcessor" = None,
+    model: "VisionEncoderDecoderModel" = None,
     max_length: int = 256,
-    num_beams: int = 4
-) -> str:
+    num_beams: int = 4,
+    scheduler=None,
+    adaptive: bool = False,
+    confidence_threshold: float = 0.9,
+    return_details: bool = False
+):
     """
     Универсальная функция распознавания.
     Автоматически выбирает между HF API и локальным инференсом.
@@ -20,37 +38,156 @@ def predict_latex_unified(
     2. Локальная модель (если загружена)
 
     Args:
-        image: PIL Image
+        image: PIL Image или uint8 массив (H, W[, C])
         processor: TrOCRProcessor (опционально, для локального режима)
         model: VisionEncoderDecoderModel (опционально, для локального режима)
         max_length: Максимальная длина генерации
         num_beams: Количество лучей для beam search
+        scheduler: MicroBatchScheduler (опционально, объединяет запросы сессий в батчи)
+                   или InferenceWorkerPool (инференс в отдельных процессах)
+        adaptive: Адаптивный режим: сначала greedy, beam search только при низкой уверенности
+        confidence_threshold: Порог уверенности для адаптивного режима
+        return_details: Вернуть словарь с уверенностью вместо строки
 
     Returns:
-        str: Распознанная LaTeX строка
+        str: Распознанная LaTeX строка, или при return_details=True
+        dict: {"latex": str, "confidence": float | None, "token_confidences": list, "num_beams": int | None}
     """
+    # Streamlit нужен только здесь: остальной модуль используется и в headless-инструментах
+    import streamlit as st
+
     # Проверяем наличие HF API в secrets
     try:
         use_hf_api = "huggingface" in st.secrets and "model_name" in st.secrets["huggingface"]
     except:
         use_hf_api = False
 
-    if use_hf_api:
-        # Режим 1: Используем HuggingFace API
-        from src.inference_hf import predict_latex_hf
-        return predict_latex_hf(image)
-    else:
-        # Режим 2: Используем локальный инференс
-        if processor is None or model is None:
-            st.error("Модель не загружена для локального инференса!")
-            st.stop()
-        return predict_latex(image, processor, model, max_length, num_beams)
+    with trace("predict_latex_unified", mode="hf_api" if use_hf_api else "local"):
+        if use_hf_api:
+            # Режим 1: Используем HuggingFace API (уверенность не возвращается)
+            from src.inference_hf import predict_latex_hf
+            if not isinstance(image, Image.Image):
+                image = Image.fromarray(np.asarray(image))
+            with span("hf_api", image_size=list(image.size)):
+                latex = predict_latex_hf(image)
+            if return_details:
+                return {"latex": latex, "confidence": None, "token_confidences": [], "num_beams": None}
+            return latex
+        else:
+            # Режим 2: Используем локальный инференс
+            if processor is None or model is None:
+                st.error("Модель не загружена для локального инференса!")
+                st.stop()
+
+            result = None
+            if scheduler is not None:
+                # Генерация идет в потоке планировщика или в процессе-воркере:
+                # спан покрывает ожидание в очереди и сам инференс
+                from concurrent.futures import TimeoutError as FutureTimeoutError
+                from src.worker_pool import WorkerPoolBusy, WorkerPoolError
+                with span("scheduler", num_beams=num_beams, adaptive=adaptive):
+                    try:
+                        result = scheduler.predict(image, max_length, num_beams, adaptive, confidence_threshold)
+                    except WorkerPoolBusy:
+                        st.error("Сервер перегружен: очередь распознавания заполнена. Повторите попытку позже.")
+                        st.stop()
+                    except (WorkerPoolError, FutureTimeoutError, RuntimeError) as e:
+                        # Воркер упал или не ответил вовремя, либо планировщик остановлен
+                        # выгрузкой модели из пула: запрос выполняется в текущем процессе
+                        logger.warning("Планировщик недоступен (%s: %s), инференс в текущем процессе",
+                                       type(e).__name__, e)
+
+            if result is None:
+                if not (adaptive or return_details):
+                    return predict_latex(image, processor, model, max_length, num_beams)
+                result = predict_latex_batch(
+                    [image], processor, model, max_length, num_beams,
+                    adaptive=adaptive, confidence_threshold=confidence_threshold, return_details=True
+                )[0]
+
+            return result if return_details else result["latex"]
+
+
+def images_to_pixel_values(images: list, processor: "TrOCRProcessor") -> "torch.Tensor":
+    """
+    Преобразует изображения в тензор pixel_values.
+    Если среди входов есть uint8 массивы numpy/torch, весь батч идет через
+    векторизованный путь src.fast_preprocessing (PIL-изображения при этом
+    передаются как массивы); иначе используется TrOCRProcessor.
+
+    Args:
+        images: PIL Image в формате RGB и/или uint8 массивы (H, W[, C])
+        processor: TrOCRProcessor
+
+    Returns:
+        torch.Tensor: pixel_values (N, 3, H, W)
+    """
+    with span("pixel_values", images=len(images)) as pixel_span:
+        if all(isinstance(image, Image.Image) for image in images):
+            pixel_values = processor(images=images, return_tensors="pt").pixel_values
+            pixel_span.set(path="processor")
+        else:
+            from src.fast_preprocessing import arrays_to_pixel_values
+            arrays = [
+                np.asarray(image.convert("RGB")) if isinstance(image, Image.Image) else image
+                for image in images
+            ]
+            pixel_values = arrays_to_pixel_values(arrays, processor)
+            pixel_span.set(path="vectorized")
+        pixel_span.set(shape=list(pixel_values.shape))
+    return pixel_values
+
+
+def run_generate(model: "VisionEncoderDecoderModel", pixel_values: "torch.Tensor" = None, **generate_kwargs):
+    """
+    Вызывает model.generate под torch.no_grad и записывает спаны трассировки:
+    generate (с числом сгенерированных токенов), encoder (через forward-хуки)
+    и decoder_loop (время generate за вычетом энкодера).
+
+    Args:
+        model: VisionEncoderDecoderModel
+        pixel_values: Тензор изображений (batch, 3, H, W) или None,
+                      если в generate_kwargs передан encoder_outputs
+        **generate_kwargs: Аргументы model.generate
+
+    Returns:
+        Результат model.generate
+    """
+    import torch
+
+    inputs = pixel_values if pixel_values is not None else generate_kwargs["encoder_outputs"].last_hidden_state
+    with span("generate", batch_size=int(inputs.shape[0]),
+              num_beams=generate_kwargs.get("num_beams", 1)) as generate_span:
+        encoder_timer = time_module(model.encoder, "encoder")
+        start = time.perf_counter()
+        with encoder_timer, torch.no_grad():
+            outputs = model.generate(pixel_values, **generate_kwargs)
+
+        owner = current_trace()
+        if owner is not None:
+            sequences = getattr(outputs, "sequences", outputs)
+            generate_span.set(generated_tokens=int(sequences.shape[1]) - 1, output_shape=list(sequences.shape))
+            decoder_ms = (time.perf_counter() - start) * 1000 - getattr(encoder_timer, "wall_ms", 0.0)
+            owner.add_span("decoder_loop", decoder_ms)
+    return outputs
+
+
+def decode_sequences(processor: "TrOCRProcessor", sequences: "torch.Tensor") -> List[str]:
+    """
+    processor.batch_decode со спаном трассировки.
+    Для модели с сокращенным словарем (src/vocab_pruning.py) id сначала переводятся в исходные.
+    """
+    with span("batch_decode", sequences=int(sequences.shape[0])):
+        vocab_map = getattr(processor, "vocab_map", None)
+        if vocab_map is not None:
+            sequences = vocab_map[sequences]
+        return [latex.strip() for latex in processor.batch_decode(sequences, skip_special_tokens=True)]
 
 
 def predict_latex(
     image: Image.Image,
-    processor: TrOCRProcessor,
-    model: VisionEncoderDecoderModel,
+    processor: "TrOCRProcessor",
+    model: "VisionEncoderDecoderModel",
     max_length: int = 256,
     num_beams: int = 4
 ) -> str:
@@ -58,7 +195,7 @@ def predict_latex(
     Выполняет инференс на изображении и возвращает LaTeX строку.
 
     Args:
-        image: PIL Image в формате RGB
+        image: PIL Image в формате RGB или uint8 массив (см. images_to_pixel_values)
         processor: TrOCRProcessor
         model: VisionEncoderDecoderModel
         max_length: Максимальная длина последовательности
@@ -68,18 +205,467 @@ def predict_latex(
         str: Предсказанная LaTeX строка
     """
     # Предобработка
-    pixel_values = processor(images=image, return_tensors="pt").pixel_values
+    pixel_values = images_to_pixel_values([image], processor)
 
     # Генерация
-    with torch.no_grad():
-        generated_ids = model.generate(
+    generated_ids = run_generate(
+        model,
+        pixel_values,
+        max_length=max_length,
+        num_beams=num_beams,
+        early_stopping=True
+    )
+
+    # Декодирование
+    latex = decode_sequences(processor, generated_ids)[0]
+
+    return latex
+
+
+def predict_latex_batch(
+    images: List[Image.Image],
+    processor: "TrOCRProcessor",
+    model: "VisionEncoderDecoderModel",
+    max_length: int = 256,
+    num_beams: int = 4,
+    max_batch_size: int = 16,
+    adaptive: bool = False,
+    confidence_threshold: float = 0.9,
+    return_details: bool = False
+) -> list:
+    """
+    Выполняет батчевый инференс на списке изображений.
+    Изображения объединяются в один тензор pixel_values, и на каждый батч
+    выполняется один вызов model.generate вместо отдельного вызова на изображение.
+
+    Args:
+        images: Список PIL Image в формате RGB и/или uint8 массивов
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        max_length: Максимальная длина последовательности
+        num_beams: Количество beams для beam search
+        max_batch_size: Максимальный размер батча (большие списки разбиваются на части)
+        adaptive: Адаптивный режим: сначала greedy, beam search только для
+                  изображений с уверенностью ниже confidence_threshold
+        confidence_threshold: Порог уверенности для адаптивного режима
+        return_details: Возвращать словари с уверенностью вместо строк
+
+    Returns:
+        list[str]: Предсказанные LaTeX строки в порядке входных изображений,
+        или list[dict] при return_details=True (см. generate_with_confidence)
+    """
+    if max_batch_size < 1:
+        raise ValueError(f"max_batch_size должен быть >= 1, получено: {max_batch_size}")
+
+    results = []
+    for start in range(0, len(images), max_batch_size):
+        chunk = images[start:start + max_batch_size]
+
+        # Предобработка всего батча одним вызовом
+        pixel_values = images_to_pixel_values(chunk, processor)
+
+        if adaptive or return_details:
+            if adaptive:
+                details = predict_adaptive(
+                    pixel_values, processor, model, max_length, num_beams, confidence_threshold
+                )
+            else:
+                details = generate_with_confidence(pixel_values, processor, model, max_length, num_beams)
+            results.extend(details if return_details else [item["latex"] for item in details])
+            continue
+
+        # Генерация
+        generated_ids = run_generate(
+            model,
             pixel_values,
             max_length=max_length,
             num_beams=num_beams,
             early_stopping=True
         )
 
-    # Декодирование
-    latex = processor.batch_decode(generated_ids, skip_special_tokens=True)[0].strip()
+        # Декодирование (batch_decode сохраняет порядок входов)
+        results.extend(decode_sequences(processor, generated_ids))
 
-    return latex
+    return results
+
+
+def generate_with_confidence(
+    pixel_values: "torch.Tensor",
+    processor: "TrOCRProcessor",
+    model: "VisionEncoderDecoderModel",
+    max_length: int = 256,
+    num_beams: int = 4,
+    encoder_hidden_states: "torch.Tensor" = None
+) -> List[dict]:
+    """
+    Выполняет генерацию и вычисляет уверенность модели по скорам генерации.
+    Уверенность токена - вероятность выбранного токена, уверенность последовательности -
+    среднее геометрическое вероятностей токенов (до EOS включительно).
+
+    Args:
+        pixel_values: Тензор изображений (batch, 3, H, W) или None при encoder_hidden_states
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        max_length: Максимальная длина последовательности
+        num_beams: Количество beams (1 - greedy)
+        encoder_hidden_states: Готовый выход энкодера (см. encode_images): энкодер не запускается
+
+    Returns:
+        list[dict]: {"latex": str, "confidence": float, "token_confidences": list[float], "num_beams": int}
+    """
+    outputs = run_generate(
+        model,
+        **generation_inputs(pixel_values, encoder_hidden_states),
+        max_length=max_length,
+        num_beams=num_beams,
+        early_stopping=num_beams > 1,
+        output_scores=True,
+        return_dict_in_generate=True
+    )
+
+    return results_with_confidence(outputs, processor, model, num_beams)
+
+
+def results_with_confidence(outputs, processor: "TrOCRProcessor", model: "VisionEncoderDecoderModel",
+                            num_beams: int) -> List[dict]:
+    """
+    Декодирует результат model.generate(output_scores=True, return_dict_in_generate=True)
+    и вычисляет уверенность для каждой последовательности.
+
+    Args:
+        outputs: Результат model.generate со скорами
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        num_beams: Количество beams, с которым выполнялась генерация
+
+    Returns:
+        list[dict]: {"latex": str, "confidence": float, "token_confidences": list[float], "num_beams": int}
+    """
+    if num_beams > 1:
+        # В beam search скоры уже являются log-вероятностями
+        token_log_probs = model.compute_transition_scores(
+            outputs.sequences, outputs.scores, outputs.beam_indices, normalize_logits=False
+        )
+    else:
+        token_log_probs = model.compute_transition_scores(
+            outputs.sequences, outputs.scores, normalize_logits=True
+        )
+
+    # Маска сгенерированных токенов: всё после первого EOS - паддинг
+    generated = outputs.sequences[:, -token_log_probs.shape[1]:]
+    eos_token_id = model.generation_config.eos_token_id
+    import torch
+
+    if eos_token_id is None:
+        valid = torch.ones_like(generated, dtype=torch.bool)
+    else:
+        eos_ids = torch.tensor(eos_token_id if isinstance(eos_token_id, list) else [eos_token_id])
+        is_eos = torch.isin(generated, eos_ids).long()
+        valid = (is_eos.cumsum(dim=1) - is_eos) == 0
+
+    latexes = decode_sequences(processor, outputs.sequences)
+
+    results = []
+    for i, latex in enumerate(latexes):
+        log_probs = token_log_probs[i][valid[i]]
+        confidence = float(log_probs.mean().exp()) if log_probs.numel() else 0.0
+        results.append({
+            "latex": latex,
+            "confidence": confidence,
+            "token_confidences": log_probs.exp().tolist(),
+            "num_beams": num_beams
+        })
+    return results
+
+
+def predict_adaptive(
+    pixel_values: "torch.Tensor",
+    processor: "TrOCRProcessor",
+    model: "VisionEncoderDecoderModel",
+    max_length: int = 256,
+    num_beams: int = 4,
+    confidence_threshold: float = 0.9,
+    encoder_hidden_states: "torch.Tensor" = None
+) -> List[dict]:
+    """
+    Адаптивный beam search: сначала greedy-декодирование всего батча,
+    затем повторная генерация с num_beams только для изображений,
+    уверенность которых ниже порога.
+
+    Args:
+        pixel_values: Тензор изображений (batch, 3, H, W) или None при encoder_hidden_states
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        max_length: Максимальная длина последовательности
+        num_beams: Количество beams для повторной генерации
+        confidence_threshold: Порог уверенности (0..1)
+        encoder_hidden_states: Готовый выход энкодера: оба прохода используют его
+                               вместо повторного запуска энкодера
+
+    Returns:
+        list[dict]: Результаты в формате generate_with_confidence
+    """
+    results = generate_with_confidence(
+        pixel_values, processor, model, max_length, num_beams=1, encoder_hidden_states=encoder_hidden_states
+    )
+
+    low_confidence = [i for i, item in enumerate(results) if item["confidence"] < confidence_threshold]
+    if low_confidence and num_beams > 1:
+        rerun = generate_with_confidence(
+            pixel_values[low_confidence] if pixel_values is not None else None,
+            processor, model, max_length, num_beams,
+            encoder_hidden_states=encoder_hidden_states[low_confidence]
+            if encoder_hidden_states is not None else None
+        )
+        for i, item in zip(low_confidence, rerun):
+            results[i] = item
+
+    return results
+
+
+def encode_images(images: list, processor: "TrOCRProcessor", model: "VisionEncoderDecoderModel") -> "torch.Tensor":
+    """
+    Выполняет только энкодер ViT (без декодирования).
+
+    Args:
+        images: PIL Image в формате RGB и/или uint8 массивы
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+
+    Returns:
+        torch.Tensor: last_hidden_state энкодера (N, seq_len, hidden)
+    """
+    import torch
+
+    pixel_values = images_to_pixel_values(images, processor)
+    with span("encoder", batch_size=len(images)), torch.no_grad():
+        return model.encoder(pixel_values=pixel_values).last_hidden_state
+
+
+def get_encoder_states(image, processor: "TrOCRProcessor", model: "VisionEncoderDecoderModel",
+                       encoder_cache=None) -> tuple:
+    """
+    Возвращает выход энкодера для изображения, по возможности из кеша.
+
+    Args:
+        image: Предобработанное изображение (PIL Image или uint8 массив)
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        encoder_cache: EncoderOutputCache модели (опционально)
+
+    Returns:
+        tuple: (тензор (1, seq_len, hidden), True если взят из кеша)
+    """
+    if encoder_cache is None:
+        return encode_images([image], processor, model), False
+    with span("encoder_cache") as cache_span:
+        states, from_cache = encoder_cache.get_or_compute(image, lambda: encode_images([image], processor, model))
+        cache_span.set(hit=from_cache)
+    return states, from_cache
+
+
+def generation_inputs(pixel_values: "torch.Tensor" = None, encoder_hidden_states: "torch.Tensor" = None) -> dict:
+    """
+    Входы model.generate: изображения или готовый выход энкодера.
+    """
+    if encoder_hidden_states is None:
+        return {"pixel_values": pixel_values}
+
+    from transformers.modeling_outputs import BaseModelOutput
+
+    # generate расширяет encoder_outputs под число лучей, поэтому каждый вызов
+    # получает новую обертку, а закешированный тензор не изменяется
+    return {"encoder_outputs": BaseModelOutput(last_hidden_state=encoder_hidden_states)}
+
+
+def predict_latex_cached(
+    image,
+    processor: "TrOCRProcessor",
+    model: "VisionEncoderDecoderModel",
+    encoder_cache=None,
+    max_length: int = 256,
+    num_beams: int = 4,
+    adaptive: bool = False,
+    confidence_threshold: float = 0.9
+) -> dict:
+    """
+    Распознает изображение, повторно используя выход энкодера из кеша:
+    при смене параметров генерации для того же изображения выполняется только декодер.
+
+    Args:
+        image: Предобработанное изображение (PIL Image или uint8 массив)
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        encoder_cache: EncoderOutputCache модели (None - энкодер выполняется всегда)
+        max_length: Максимальная длина последовательности
+        num_beams: Количество beams для beam search
+        adaptive: Адаптивный режим (greedy, beam search при низкой уверенности)
+        confidence_threshold: Порог уверенности для адаптивного режима
+
+    Returns:
+        dict: Результат в формате generate_with_confidence + "encoder_cached": bool
+    """
+    states, from_cache = get_encoder_states(image, processor, model, encoder_cache)
+    if adaptive:
+        result = predict_adaptive(
+            None, processor, model, max_length, num_beams, confidence_threshold, encoder_hidden_states=states
+        )[0]
+    else:
+        result = generate_with_confidence(
+            None, processor, model, max_length, num_beams, encoder_hidden_states=states
+        )[0]
+    result["encoder_cached"] = from_cache
+    return result
+
+
+NBEST_STRATEGIES = ("beam", "sampling")
+
+
+def predict_nbest(
+    image,
+    processor: "TrOCRProcessor",
+    model: "VisionEncoderDecoderModel",
+    num_hypotheses: int = 5,
+    max_length: int = 256,
+    num_beams: int = None,
+    strategy: str = "beam",
+    temperature: float = 1.0,
+    top_p: float = 0.95,
+    encoder_cache=None
+) -> List[dict]:
+    """
+    Возвращает несколько лучших гипотез по одному проходу энкодера.
+
+    Args:
+        image: Предобработанное изображение (PIL Image или uint8 массив)
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        num_hypotheses: Количество гипотез (k)
+        max_length: Максимальная длина последовательности
+        num_beams: Количество лучей для strategy="beam" (не меньше num_hypotheses; None - num_hypotheses)
+        strategy: "beam" - k лучших лучей beam search, "sampling" - k сэмплов (top-p)
+        temperature: Температура сэмплирования
+        top_p: Порог nucleus sampling
+        encoder_cache: EncoderOutputCache модели (опционально)
+
+    Returns:
+        list[dict]: Уникальные гипотезы по убыванию score:
+        {"rank", "latex", "score", "confidence", "token_confidences", "num_beams", "strategy"}
+        (score - средняя log-вероятность токена)
+    """
+    if strategy not in NBEST_STRATEGIES:
+        raise ValueError(f"Неизвестная стратегия: {strategy} (ожидается одна из {NBEST_STRATEGIES})")
+    if num_hypotheses < 1:
+        raise ValueError(f"num_hypotheses должен быть >= 1, получено: {num_hypotheses}")
+
+    if strategy == "beam":
+        search = {"num_beams": max(num_beams or num_hypotheses, num_hypotheses), "early_stopping": True}
+    else:
+        search = {"num_beams": 1, "do_sample": True, "temperature": temperature, "top_p": top_p}
+
+    states, _ = get_encoder_states(image, processor, model, encoder_cache)
+    with span("nbest", strategy=strategy, num_hypotheses=num_hypotheses):
+        outputs = run_generate(
+            model,
+            **generation_inputs(encoder_hidden_states=states),
+            max_length=max_length,
+            num_return_sequences=num_hypotheses,
+            output_scores=True,
+            return_dict_in_generate=True,
+            **search
+        )
+        hypotheses = results_with_confidence(outputs, processor, model, search["num_beams"])
+
+    sequences_scores = getattr(outputs, "sequences_scores", None)
+    unique = {}
+    for i, item in enumerate(hypotheses):
+        if sequences_scores is not None:
+            score = float(sequences_scores[i])
+        else:
+            score = math.log(item["confidence"]) if item["confidence"] > 0 else float("-inf")
+        item.update(score=score, strategy=strategy)
+        # Сэмплирование может дать одинаковые строки: остается лучшая
+        if item["latex"] not in unique or unique[item["latex"]]["score"] < score:
+            unique[item["latex"]] = item
+
+    ranked = sorted(unique.values(), key=lambda item: item["score"], reverse=True)
+    for rank, item in enumerate(ranked, start=1):
+        item["rank"] = rank
+    return ranked
+
+
+def predict_latex_stream(
+    image: Image.Image,
+    processor: "TrOCRProcessor",
+    model: "VisionEncoderDecoderModel",
+    max_length: int = 256,
+    details: dict = None,
+    encoder_hidden_states: "torch.Tensor" = None
+) -> Iterator[str]:
+    """
+    Потоковый вариант predict_latex: генерация идет в фоновом потоке,
+    а функция выдает накопленную LaTeX строку по мере декодирования токенов.
+    Стримеры transformers не поддерживают beam search, поэтому декодирование жадное.
+
+    Args:
+        image: PIL Image в формате RGB
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        max_length: Максимальная длина последовательности
+        details: Словарь (опционально), в который после завершения генерации
+                 записываются результат и уверенность (как в generate_with_confidence),
+                 а также "ttft_ms" (время до первого токена) и "total_ms"
+        encoder_hidden_states: Готовый выход энкодера (опционально, см. get_encoder_states)
+
+    Yields:
+        str: Распознанная к текущему моменту LaTeX строка
+    """
+    from src.vocab_pruning import make_text_streamer
+
+    start = time.perf_counter()
+    if encoder_hidden_states is None:
+        inputs = generation_inputs(images_to_pixel_values([image], processor))
+    else:
+        inputs = generation_inputs(encoder_hidden_states=encoder_hidden_states)
+    streamer = make_text_streamer(processor)
+    holder = {}
+
+    def generate():
+        # torch.no_grad внутри run_generate действует только в текущем потоке
+        try:
+            holder["outputs"] = run_generate(
+                model,
+                **inputs,
+                max_length=max_length,
+                num_beams=1,
+                streamer=streamer,
+                output_scores=True,
+                return_dict_in_generate=True
+            )
+        except Exception as e:
+            holder["error"] = e
+            streamer.end()
+
+    # Контекст копируется, чтобы спаны фонового потока попали в текущую трассу
+    context = contextvars.copy_context()
+    thread = Thread(target=context.run, args=(generate,), name="trocr-streaming-generate", daemon=True)
+    thread.start()
+
+    ttft_ms = None
+    latex = ""
+    for chunk in streamer:
+        if not chunk:
+            continue
+        if ttft_ms is None:
+            ttft_ms = (time.perf_counter() - start) * 1000
+        latex += chunk
+        yield latex.strip()
+
+    thread.join()
+    if "error" in holder:
+        raise holder["error"]
+
+    if details is not None:
+        details.update(results_with_confidence(holder["outputs"], processor, model, num_beams=1)[0])
+        details["ttft_ms"] = ttft_ms
+        details["total_ms"] = (time.perf_counter() - start) * 1000
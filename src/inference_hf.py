@@ -1,12 +1,43 @@
 """
 Модуль инференса через HuggingFace Inference API.
 Используется для экономии памяти - модель запускается на серверах HF.
+
+Сам клиент (пул соединений, повторы, параллельные запросы) находится в src/hf_client.py
+и не зависит от Streamlit; здесь - чтение st.secrets и вывод ошибок в интерфейс.
 """
 import streamlit as st
-import requests
 from PIL import Image
-import io
-import base64
+
+from src.hf_client import DEFAULT_API_URL, HFInferenceClient, HFInferenceError
+
+
+@st.cache_resource
+def get_hf_client(model_name: str, api_token: str = None, api_url: str = DEFAULT_API_URL) -> HFInferenceClient:
+    """
+    Создает клиент HF Inference API один раз на процесс
+    (пул keep-alive соединений переиспользуется между запросами и сессиями).
+    """
+    return HFInferenceClient(model_name, api_token=api_token, api_url=api_url)
+
+
+def get_configured_client(model_name: str = None) -> HFInferenceClient:
+    """
+    Возвращает клиент по конфигурации из st.secrets (секция [huggingface]).
+
+    Args:
+        model_name: Имя модели на HuggingFace Hub. Если None, берется из st.secrets
+    """
+    try:
+        config = st.secrets["huggingface"]
+        if model_name is None:
+            model_name = config["model_name"]
+        hf_token = config.get("api_token", None)
+        api_url = config.get("api_url", DEFAULT_API_URL)
+    except KeyError:
+        st.error("HuggingFace конфигурация не найдена в secrets!")
+        st.stop()
+
+    return get_hf_client(model_name, hf_token, api_url)
 
 
 def predict_latex_hf(image: Image.Image, model_name: str = None) -> str:
@@ -21,67 +52,31 @@ def predict_latex_hf(image: Image.Image, model_name: str = None) -> str:
     Returns:
         str: Распознанная LaTeX строка
     """
-    # Получаем конфигурацию из secrets
+    client = get_configured_client(model_name)
     try:
-        if model_name is None:
-            model_name = st.secrets["huggingface"]["model_name"]
-        hf_token = st.secrets["huggingface"].get("api_token", None)
-    except KeyError:
-        st.error("HuggingFace конфигурация не найдена в secrets!")
+        return client.predict(image)
+    except HFInferenceError as e:
+        st.error(str(e))
         st.stop()
 
-    # Конвертируем изображение в base64
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    img_bytes = buffered.getvalue()
 
-    # API endpoint
-    api_url = f"https://api-inference.huggingface.co/models/{model_name}"
+def predict_latex_hf_many(images: list, model_name: str = None, max_workers: int = 4) -> list:
+    """
+    Распознает несколько изображений параллельно через HuggingFace Inference API.
 
-    # Headers
-    headers = {}
-    if hf_token:
-        headers["Authorization"] = f"Bearer {hf_token}"
+    Args:
+        images: Список PIL Image объектов
+        model_name: Имя модели на HuggingFace Hub (None - из st.secrets)
+        max_workers: Максимум одновременных запросов
 
-    # Отправляем запрос
+    Returns:
+        list: LaTeX строки в порядке входных изображений
+    """
+    client = get_configured_client(model_name)
     try:
-        response = requests.post(
-            api_url,
-            headers=headers,
-            data=img_bytes,
-            timeout=30
-        )
-        response.raise_for_status()
-
-        # Парсим ответ
-        result = response.json()
-
-        # HF Inference API возвращает разные форматы в зависимости от модели
-        # Для image-to-text обычно: [{"generated_text": "..."}]
-        if isinstance(result, list) and len(result) > 0:
-            latex = result[0].get("generated_text", "")
-        elif isinstance(result, dict):
-            latex = result.get("generated_text", result.get("text", ""))
-        else:
-            latex = str(result)
-
-        return latex.strip()
-
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 503:
-            st.error("Модель загружается на HuggingFace. Попробуйте через 20 секунд.")
-        elif e.response.status_code == 401:
-            st.error("Неверный HuggingFace API токен.")
-        else:
-            st.error(f"Ошибка HuggingFace API: {e.response.status_code} - {e.response.text}")
-        st.stop()
-
-    except requests.exceptions.Timeout:
-        st.error("Превышено время ожидания ответа от HuggingFace.")
-        st.stop()
-
-    except Exception as e:
-        st.error(f"Ошибка при обращении к HuggingFace API: {str(e)}")
+        return client.predict_many(images, max_workers=max_workers)
+    except HFInferenceError as e:
+        st.error(str(e))
         st.stop()
 
 
@@ -92,15 +87,4 @@ def check_hf_model_status(model_name: str, hf_token: str = None) -> dict:
     Returns:
         dict: Информация о статусе модели
     """
-    api_url = f"https://api-inference.huggingface.co/status/{model_name}"
-
-    headers = {}
-    if hf_token:
-        headers["Authorization"] = f"Bearer {hf_token}"
-
-    try:
-        response = requests.get(api_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+    return get_hf_client(model_name, hf_token).status()
@@ -0,0 +1,233 @@
+"""
+Загрузка больших изображений с ограниченным потреблением памяти.
+
+Модель видит только 384x384, а фотографии с телефона имеют 12-48 Мп: полная
+RGB-копия, серая копия и numpy-массив такой фотографии занимают сотни мегабайт.
+Путь загрузки ограничивает память на запрос независимо от размера файла:
+1. Размер проверяется по заголовку до декодирования (защита от decompression bomb).
+2. JPEG декодируется сразу в уменьшенном разрешении (draft mode, масштаб 1/2..1/8),
+   остальные форматы уменьшаются после декодирования; итог не превышает max_pixels.
+3. Средняя яркость (автоинверсия), порог Otsu и область чернил вычисляются
+   по маленькой серой копии (analysis_max_side), а применяются к рабочему
+   изображению таблицей преобразования (Image.point) без копий в numpy.
+4. Изображение обрезается до области чернил с полями в разрешении рабочей копии.
+"""
+import math
+
+import numpy as np
+from PIL import Image, ImageOps
+
+
+# Рабочее разрешение: с запасом для сегментации страницы, при этом 4 Мп RGB = 12 МБ
+DEFAULT_MAX_PIXELS = 4_000_000
+# Максимальный размер исходного изображения, которое можно уменьшить при декодировании (JPEG).
+# Больше 2 * Image.MAX_IMAGE_PIXELS (~179 Мп) Image.open отказывается открывать файл сам
+DEFAULT_MAX_SOURCE_PIXELS = 150_000_000
+# Максимальный размер для форматов, которые декодируются целиком (PNG и т.п.)
+DEFAULT_MAX_FULL_DECODE_PIXELS = 64_000_000
+
+
+# Режимы, которые поддерживает Image.reduce; остальные (P, 1, I;16, ...) переводятся в L или RGB
+REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA")
+GRAY_MODES = ("1", "I", "I;16", "I;16L", "I;16B", "I;16N", "F")
+
+
+class ImageTooLarge(ValueError):
+    """
+    Размер изображения превышает допустимый.
+    """
+
+
+def load_image_bounded(
+    source,
+    max_pixels: int = DEFAULT_MAX_PIXELS,
+    max_source_pixels: int = DEFAULT_MAX_SOURCE_PIXELS,
+    max_full_decode_pixels: int = DEFAULT_MAX_FULL_DECODE_PIXELS
+) -> tuple:
+    """
+    Открывает изображение в разрешении не выше max_pixels.
+
+    Args:
+        source: Путь, файловый объект или UploadedFile
+        max_pixels: Максимальное число пикселей результата
+        max_source_pixels: Максимальное число пикселей исходного изображения
+        max_full_decode_pixels: Максимум для форматов без уменьшения при декодировании
+
+    Returns:
+        tuple: (PIL Image в формате RGB, {"format", "original_size", "decoded_size", "size"})
+
+    Raises:
+        ImageTooLarge: Изображение больше допустимого размера
+    """
+    try:
+        image = Image.open(source)
+    except Image.DecompressionBombError as e:
+        # Защита Pillow срабатывает по заголовку раньше проверки max_source_pixels
+        raise ImageTooLarge(f"Изображение больше допустимого размера: {e}") from e
+    image_format = image.format
+    original_size = image.size
+    source_pixels = original_size[0] * original_size[1]
+    if source_pixels > max_source_pixels:
+        raise ImageTooLarge(
+            f"Изображение {original_size[0]}x{original_size[1]} больше допустимого "
+            f"({max_source_pixels / 1e6:.0f} Мп)"
+        )
+
+    scale = min(1.0, math.sqrt(max_pixels / source_pixels))
+    target = (max(1, math.floor(original_size[0] * scale)), max(1, math.floor(original_size[1] * scale)))
+
+    # JPEG: декодер сразу уменьшает изображение в 2, 4 или 8 раз (не меньше target)
+    if scale < 1.0 and image_format == "JPEG":
+        image.draft("RGB", target)
+    elif image.size[0] * image.size[1] > max_full_decode_pixels:
+        raise ImageTooLarge(
+            f"Изображение {original_size[0]}x{original_size[1]} в формате {image_format} "
+            f"больше допустимого ({max_full_decode_pixels / 1e6:.0f} Мп)"
+        )
+
+    image.load()
+    decoded_size = image.size
+
+    if image.size[0] * image.size[1] > max_pixels:
+        # reduce - целочисленное уменьшение без промежуточных копий, затем точный resize
+        factor = int(min(image.size[0] / target[0], image.size[1] / target[1]))
+        if image.mode not in REDUCIBLE_MODES:
+            image = image.convert("L" if image.mode in GRAY_MODES else "RGB")
+        if factor > 1:
+            image = image.reduce(factor)
+        if image.size[0] * image.size[1] > max_pixels:
+            image = image.resize(target, Image.BILINEAR)
+
+    # Ориентация фотографий с телефона (EXIF) применяется к уже уменьшенному изображению
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    return image, {
+        "format": image_format,
+        "original_size": list(original_size),
+        "decoded_size": list(decoded_size),
+        "size": list(image.size),
+    }
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """
+    Порог Otsu по гистограмме (как cv2.THRESH_OTSU: пиксели > порога - фон).
+
+    Args:
+        gray: uint8 массив в градациях серого
+
+    Returns:
+        int: Порог 0..255
+    """
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = histogram.sum()
+    if total == 0:
+        return 0
+    levels = np.arange(256)
+    weight_background = np.cumsum(histogram)
+    weight_foreground = total - weight_background
+    cumulative_mean = np.cumsum(histogram * levels)
+    mean_background = cumulative_mean / np.maximum(weight_background, 1)
+    mean_foreground = (cumulative_mean[-1] - cumulative_mean) / np.maximum(weight_foreground, 1)
+    between = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+    return int(np.argmax(between))
+
+
+def analysis_copy(image: Image.Image, max_side: int = 1024) -> tuple:
+    """
+    Маленькая серая копия для вычисления статистик.
+
+    Returns:
+        tuple: (uint8 массив (h, w), масштаб относительно image)
+    """
+    scale = min(1.0, max_side / max(image.size))
+    if scale < 1.0:
+        # resize с reducing_gap сначала уменьшает целочисленно, без полноразмерных копий
+        size = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+        image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    gray = image.convert("L")
+    return np.asarray(gray), scale
+
+
+def ink_bbox(gray: np.ndarray, threshold: int, inverted: bool, min_component_pixels: int = 2) -> tuple:
+    """
+    Ограничивающая рамка чернил на маленькой копии.
+
+    Args:
+        gray: uint8 массив маленькой копии
+        threshold: Порог Otsu (чернила - пиксели <= порога, при inverted - пиксели > порога)
+        inverted: Светлые чернила на темном фоне
+        min_component_pixels: Строки и столбцы с меньшим числом пикселей чернил считаются шумом
+
+    Returns:
+        tuple: (x0, y0, x1, y1) или None, если чернил нет
+    """
+    ink = gray > threshold if inverted else gray <= threshold
+    rows = np.flatnonzero(ink.sum(axis=1) >= min_component_pixels)
+    columns = np.flatnonzero(ink.sum(axis=0) >= min_component_pixels)
+    if not rows.size or not columns.size:
+        return None
+    return int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1
+
+
+def preprocess_bounded(
+    image: Image.Image,
+    apply_inversion: bool = False,
+    apply_binarization: bool = False,
+    binarization_threshold: int = 0,
+    crop_to_ink: bool = True,
+    margin: float = 0.05,
+    analysis_max_side: int = 1024
+) -> tuple:
+    """
+    Аналог preprocess_image для рабочей копии из load_image_bounded:
+    статистики считаются по маленькой копии, преобразования - таблицей пикселей.
+
+    Args:
+        image: PIL Image (результат load_image_bounded)
+        apply_inversion: Применить автоинверсию (средняя яркость < 128)
+        apply_binarization: Применить бинаризацию
+        binarization_threshold: Порог бинаризации (0 для Otsu)
+        crop_to_ink: Обрезать до области чернил
+        margin: Поля вокруг области чернил в долях ее большей стороны
+        analysis_max_side: Большая сторона копии для статистик
+
+    Returns:
+        tuple: (PIL Image RGB, {"inverted", "threshold", "ink_bbox", "size"})
+    """
+    gray, scale = analysis_copy(image, analysis_max_side)
+    inverted = apply_inversion and float(gray.mean()) < 128
+    threshold = binarization_threshold or otsu_threshold(255 - gray if inverted else gray)
+
+    bbox = None
+    if crop_to_ink:
+        # Область чернил ищется независимо от автоинверсии: фон определяется по средней яркости
+        dark_background = float(gray.mean()) < 128
+        small_threshold = otsu_threshold(gray)
+        small_bbox = ink_bbox(gray, small_threshold, inverted=dark_background)
+        if small_bbox is not None:
+            x0, y0, x1, y1 = (value / scale for value in small_bbox)
+            pad = margin * max(x1 - x0, y1 - y0)
+            bbox = [
+                max(0, int(x0 - pad)), max(0, int(y0 - pad)),
+                min(image.size[0], math.ceil(x1 + pad)), min(image.size[1], math.ceil(y1 + pad)),
+            ]
+            image = image.crop(bbox)
+
+    if inverted or apply_binarization:
+        # Как auto_invert и binarize: результат в градациях серого, затем RGB
+        processed = image.convert("L")
+        if inverted:
+            processed = ImageOps.invert(processed)
+        if apply_binarization:
+            processed = processed.point(lambda value: 255 if value > threshold else 0)
+        image = processed.convert("RGB")
+
+    return image, {
+        "inverted": inverted,
+        "threshold": threshold if apply_binarization else None,
+        "ink_bbox": bbox,
+        "size": list(image.size),
+    }
@@ -0,0 +1,346 @@
+"""
+Фоновая очередь пакетных заданий распознавания (много файлов за раз).
+
+Файлы задания сохраняются во временную папку (в памяти остаются только пути),
+а поток-исполнитель читает их с ограниченным разрешением (src/ingestion.py),
+предобрабатывает и распознает батчами. Задание выполняется независимо от
+перезапусков Streamlit-скрипта: сессия хранит только идентификатор задания
+и может уйти на другую вкладку, не прерывая обработку.
+
+Способ распознавания батча передается при постановке задания функцией
+recognize_batch(images, generation) -> list[dict] (локальная модель, HF API и т.п.),
+поэтому очередь не зависит от Streamlit и модели. На месте результата отдельного
+файла функция может вернуть исключение - оно записывается как ошибка этого файла.
+"""
+import itertools
+import logging
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from src.ingestion import load_image_bounded, preprocess_bounded
+from src.pipeline import batched
+
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "done", "cancelled", "error")
+
+
+def error_row(name: str, error: Exception) -> dict:
+    """
+    Результат файла, который не удалось прочитать или распознать.
+    """
+    return {"file": name, "latex": None, "confidence": None, "num_beams": None, "latency_ms": None,
+            "error": f"{type(error).__name__}: {error}"}
+
+
+class RecognitionJob:
+    """
+    Пакетное задание: список файлов, параметры и накопленные результаты.
+    """
+
+    def __init__(self, job_id: str, files: list, spool_dir: Path, recognize_batch: Callable,
+                 generation: dict, preprocessing: dict, batch_size: int):
+        """
+        Args:
+            job_id: Идентификатор задания
+            files: Пары (исходное имя файла, путь к сохраненной копии)
+            spool_dir: Временная папка задания (удаляется после обработки)
+            recognize_batch: Функция (images, generation) -> list[dict] с полями "latex", "confidence", ...
+                             (или Exception на месте результата файла, который не удалось распознать)
+            generation: Параметры генерации
+            preprocessing: Параметры preprocess_bounded (apply_inversion, apply_binarization, ...)
+            batch_size: Размер батча распознавания
+        """
+        self.id = job_id
+        self.files = files
+        self.spool_dir = spool_dir
+        self.recognize_batch = recognize_batch
+        self.generation = generation
+        self.preprocessing = preprocessing
+        self.batch_size = batch_size
+
+        self.state = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        # Результаты в порядке файлов (None - еще не обработан)
+        self.results: List[dict] = [None] * len(files)
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        Отменяет задание: текущий батч дорабатывается, остальные файлы пропускаются.
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def is_finished(self) -> bool:
+        return self.state in ("done", "cancelled", "error")
+
+    def _store(self, index: int, result: dict):
+        with self._lock:
+            self.results[index] = result
+            self.completed += 1
+            if result.get("error"):
+                self.failed += 1
+
+    def rows(self, offset: int = 0, limit: int = None) -> list:
+        """
+        Обработанные результаты в порядке файлов.
+
+        Args:
+            offset: Сколько результатов пропустить
+            limit: Максимум результатов (None - все)
+
+        Returns:
+            list: {"file", "latex", "confidence", "num_beams", "latency_ms", "error"}
+        """
+        with self._lock:
+            done = [result for result in self.results if result is not None]
+        end = None if limit is None else offset + limit
+        return done[offset:end]
+
+    def status(self) -> dict:
+        """
+        Returns:
+            dict: {"id", "state", "total", "completed", "failed", "elapsed_s",
+                   "throughput_per_s", "eta_s", "error"}
+        """
+        with self._lock:
+            completed, failed = self.completed, self.failed
+        total = len(self.files)
+        if self.started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        throughput = completed / elapsed if elapsed > 0 else 0.0
+        remaining = total - completed
+        return {
+            "id": self.id,
+            "state": self.state,
+            "total": total,
+            "completed": completed,
+            "failed": failed,
+            "elapsed_s": elapsed,
+            "throughput_per_s": throughput,
+            "eta_s": remaining / throughput if throughput > 0 and not self.is_finished() else None,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Процесс-глобальная очередь пакетных заданий с фоновыми потоками-исполнителями.
+    """
+
+    def __init__(self, workers: int = 1, batch_size: int = 8, spool_dir: str = None,
+                 max_finished_jobs: int = 20):
+        """
+        Args:
+            workers: Количество потоков, обрабатывающих задания параллельно
+            batch_size: Размер батча распознавания
+            spool_dir: Папка для временных копий файлов (None - системная временная папка)
+            max_finished_jobs: Сколько завершенных заданий хранить для просмотра и скачивания
+        """
+        if workers < 1:
+            raise ValueError(f"workers должен быть >= 1, получено: {workers}")
+        if batch_size < 1:
+            raise ValueError(f"batch_size должен быть >= 1, получено: {batch_size}")
+
+        self.batch_size = batch_size
+        self.spool_dir = spool_dir
+        self.max_finished_jobs = max_finished_jobs
+
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"recognition-job-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, files: list, recognize_batch: Callable, generation: dict,
+               preprocessing: dict = None) -> RecognitionJob:
+        """
+        Сохраняет файлы во временную папку и ставит задание в очередь.
+
+        Args:
+            files: Пары (имя файла, байты или бинарный файловый объект)
+            recognize_batch: Функция (images, generation) -> list[dict]
+            generation: Параметры генерации
+            preprocessing: Параметры preprocess_bounded
+
+        Returns:
+            RecognitionJob
+        """
+        if self._closed:
+            raise RuntimeError("Очередь заданий остановлена")
+
+        job_id = f"job-{next(self._ids)}-{int(time.time())}"
+        spool_dir = Path(tempfile.mkdtemp(prefix=f"{job_id}-", dir=self.spool_dir))
+        spooled = []
+        for index, (name, data) in enumerate(files):
+            path = spool_dir / f"{index:05d}{Path(name).suffix.lower()}"
+            with open(path, "wb") as f:
+                if isinstance(data, (bytes, bytearray)):
+                    f.write(data)
+                else:
+                    shutil.copyfileobj(data, f)
+            spooled.append((name, path))
+
+        job = RecognitionJob(
+            job_id, spooled, spool_dir, recognize_batch, dict(generation), dict(preprocessing or {}),
+            self.batch_size
+        )
+        with self._lock:
+            self._jobs[job_id] = job
+            self._prune()
+        self._queue.put(job)
+        return job
+
+    def _prune(self):
+        """
+        Удаляет самые старые завершенные задания сверх max_finished_jobs. Вызывается под self._lock.
+        """
+        finished = [job for job in self._jobs.values() if job.is_finished()]
+        for job in sorted(finished, key=lambda item: item.created_at)[:-self.max_finished_jobs or None]:
+            self._jobs.pop(job.id, None)
+
+    def get(self, job_id: str):
+        """
+        Возвращает задание по идентификатору (None, если задание удалено или не существует).
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list:
+        """
+        Задания от новых к старым.
+        """
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def _run(self):
+        while not self._closed:
+            try:
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self._process(job)
+            except Exception as e:
+                logger.exception("Задание %s завершилось с ошибкой", job.id)
+                job.error = f"{type(e).__name__}: {e}"
+                job.state = "error"
+            finally:
+                job.finished_at = time.time()
+                shutil.rmtree(job.spool_dir, ignore_errors=True)
+
+    def _process(self, job: RecognitionJob):
+        """
+        Обрабатывает задание батчами: чтение и предобработка файлов, затем один вызов recognize_batch.
+        Ошибка отдельного файла или батча записывается в результат и не прерывает задание.
+        """
+        job.started_at = time.time()
+        job.state = "running"
+
+        for batch in batched(list(enumerate(job.files)), job.batch_size):
+            if job.cancelled or self._closed:
+                job.state = "cancelled"
+                return
+
+            indices, images = [], []
+            for index, (name, path) in batch:
+                try:
+                    image, _ = load_image_bounded(path)
+                    processed, _ = preprocess_bounded(image, **job.preprocessing)
+                except Exception as e:
+                    job._store(index, error_row(name, e))
+                    continue
+                indices.append(index)
+                images.append(processed)
+
+            if not images:
+                continue
+
+            start = time.perf_counter()
+            try:
+                results = job.recognize_batch(images, job.generation)
+            except Exception as e:
+                logger.warning("Задание %s: ошибка батча: %s", job.id, e)
+                for index in indices:
+                    job._store(index, error_row(job.files[index][0], e))
+                continue
+            # Амортизированная латентность одного файла в батче
+            latency_ms = (time.perf_counter() - start) * 1000 / len(images)
+
+            for position, index in enumerate(indices):
+                name = job.files[index][0]
+                if position >= len(results):
+                    job._store(index, error_row(name, RuntimeError("распознаватель не вернул результат")))
+                    continue
+                result = results[position]
+                if isinstance(result, Exception):
+                    job._store(index, error_row(name, result))
+                    continue
+                job._store(index, {
+                    "file": name,
+                    "latex": result["latex"],
+                    "confidence": result.get("confidence"),
+                    "num_beams": result.get("num_beams"),
+                    "latency_ms": latency_ms,
+                    "error": None,
+                })
+
+        job.state = "done"
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: {"jobs": int, "active": int, "queued": int}
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "jobs": len(jobs),
+            "active": sum(job.state == "running" for job in jobs),
+            "queued": sum(job.state == "queued" for job in jobs),
+        }
+
+    def close(self):
+        """
+        Останавливает исполнителей: выполняемые задания прерываются после текущего батча,
+        задания из очереди отменяются, их временные папки удаляются.
+        """
+        self._closed = True
+        for job in self.jobs():
+            job.cancel()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            job.state = "cancelled"
+            job.finished_at = time.time()
+            shutil.rmtree(job.spool_dir, ignore_errors=True)
@@ -1,9 +1,29 @@
+def _strip_common_affixes(s1: str, s2: str) -> tuple:
+    """
+    Отбрасывает общий префикс и суффикс строк (не влияет на расстояние Левенштейна).
+    """
+    start = 0
+    limit = min(len(s1), len(s2))
+    while start < limit and s1[start] == s2[start]:
+        start += 1
+
+    end1, end2 = len(s1), len(s2)
+    while end1 > start and end2 > start and s1[end1 - 1] == s2[end2 - 1]:
+        end1 -= 1
+        end2 -= 1
+
+    return s1[start:end1], s2[start:end2]
+
 
 def levenshtein_distance(s1: str, s2: str) -> int:
     """
     Вычисляет расстояние Левенштейна между двумя строками.
     Даёт edit distance метрику для вывода в приложении.
 
+    Используется бит-параллельный алгоритм Майерса (в варианте Хиррё): столбец
+    матрицы DP хранится как битовые векторы длины min(n, m) (целые числа Python),
+    поэтому время O(max(n, m)) операций над битовыми векторами, память O(min(n, m)).
+
     Args:
         s1: Первая строка
         s2: Вторая строка
@@ -11,22 +31,96 @@ def levenshtein_distance(s1: str, s2: str) -> int:
     Returns:
         Расстояние Левенштейна (количество операций редактирования: удалений, вставок и замен)
     """
-    len1, len2 = len(s1), len(s2)
-    dp = [[0] * (len2 + 1) for _ in range(len1 + 1)]
+    s1, s2 = _strip_common_affixes(s1, s2)
+
+    # Битовые векторы строятся по более короткой строке
+    pattern, text = (s1, s2) if len(s1) <= len(s2) else (s2, s1)
+    m = len(pattern)
+    if m == 0:
+        return len(text)
+
+    # Маски позиций каждого символа в pattern
+    peq = {}
+    for i, char in enumerate(pattern):
+        peq[char] = peq.get(char, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    last_bit = 1 << (m - 1)
+    pv, mv = mask, 0
+    score = m
+
+    for char in text:
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+
+        if ph & last_bit:
+            score += 1
+        elif mh & last_bit:
+            score -= 1
+
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
 
-    for i in range(len1 + 1):
-        dp[i][0] = i
-    for j in range(len2 + 1):
-        dp[0][j] = j
+    return score
 
-    for i in range(1, len1 + 1):
-        for j in range(1, len2 + 1):
-            if s1[i-1] == s2[j-1]:
-                dp[i][j] = dp[i-1][j-1]
-            else:
-                dp[i][j] = 1 + min(dp[i-1][j], dp[i][j-1], dp[i-1][j-1])
 
-    return dp[len1][len2]
+def levenshtein_within(s1: str, s2: str, k: int) -> bool:
+    """
+    Проверяет, что расстояние Левенштейна не превышает k (для ExpRate≤k).
+    Вычисляется только полоса шириной 2k+1 вокруг диагонали матрицы DP,
+    и проверка завершается досрочно, как только вся полоса строки превысила k.
+
+    Args:
+        s1: Первая строка
+        s2: Вторая строка
+        k: Допустимое количество ошибок
+
+    Returns:
+        bool: True, если расстояние <= k
+    """
+    s1, s2 = _strip_common_affixes(s1, s2)
+    n, m = len(s1), len(s2)
+    if abs(n - m) > k:
+        return False
+    if n == 0 or m == 0:
+        return max(n, m) <= k
+
+    # Значения больше k не различаются: храним их как k + 1
+    overflow = k + 1
+    prev = [j if j <= k else overflow for j in range(m + 1)]
+    cur = [overflow] * (m + 1)
+
+    for i in range(1, n + 1):
+        low, high = max(1, i - k), min(m, i + k)
+        cur[low - 1] = (i if i <= k else overflow) if low == 1 else overflow
+
+        char = s1[i - 1]
+        row_min = cur[low - 1]
+        for j in range(low, high + 1):
+            value = prev[j - 1] + (char != s2[j - 1])
+            if prev[j] + 1 < value:
+                value = prev[j] + 1
+            if cur[j - 1] + 1 < value:
+                value = cur[j - 1] + 1
+            if value > overflow:
+                value = overflow
+            cur[j] = value
+            if value < row_min:
+                row_min = value
+
+        if high < m:
+            cur[high + 1] = overflow
+        if row_min > k:
+            return False
+
+        prev, cur = cur, prev
+
+    return prev[m] <= k
 
 
 def compute_cer(prediction: str, reference: str) -> float:
@@ -53,6 +147,7 @@ def compute_metrics(prediction: str, ground_truth: str) -> dict:
     """
     Вычисляет все метрики для пары предсказание-ground truth:
     CER, Edit Distance и полное совпадение (есть или нет, булево значение).
+    Расстояние Левенштейна вычисляется один раз.
 
     Args:
         prediction: Предсказанная LaTeX строка
@@ -61,8 +156,11 @@ def compute_metrics(prediction: str, ground_truth: str) -> dict:
     Returns:
         dict с метриками: {"cer": float, "edit_distance": int, "exact_match": bool}
     """
-    cer = compute_cer(prediction, ground_truth)
     edit_distance = levenshtein_distance(prediction, ground_truth)
+    if len(ground_truth) == 0:
+        cer = 0.0 if len(prediction) == 0 else 1.0
+    else:
+        cer = edit_distance / len(ground_truth)
     exact_match = (prediction == ground_truth)
 
     return {
@@ -70,3 +168,77 @@ def compute_metrics(prediction: str, ground_truth: str) -> dict:
         "edit_distance": edit_distance,
         "exact_match": exact_match
     }
+
+
+def aggregate_metrics(per_sample: list, k_values: tuple = (1, 2, 3)) -> dict:
+    """
+    Агрегирует метрики отдельных примеров (результаты compute_metrics) по набору данных.
+    Единицы совпадают с config/models.json: CER и ExpRate - проценты
+    (в compute_metrics CER отдельного примера - доля).
+
+    Args:
+        per_sample: Список словарей compute_metrics
+        k_values: Значения k для ExpRate≤k
+
+    Returns:
+        dict: {"samples": int, "cer": float, "avg_edit_distance": float,
+               "exp_rate": float, "exp_rate_1": float, "exp_rate_2": float, "exp_rate_3": float}
+
+    Raises:
+        ValueError: Пустой набор примеров
+    """
+    count = len(per_sample)
+    if count == 0:
+        raise ValueError("Нет примеров для агрегации метрик")
+
+    distances = [item["edit_distance"] for item in per_sample]
+    result = {
+        "samples": count,
+        "cer": 100.0 * sum(item["cer"] for item in per_sample) / count,
+        "avg_edit_distance": sum(distances) / count,
+        "exp_rate": 100.0 * sum(item["exact_match"] for item in per_sample) / count,
+    }
+    for k in k_values:
+        result[f"exp_rate_{k}"] = 100.0 * sum(distance <= k for distance in distances) / count
+    return result
+
+
+def compute_metrics_batch(predictions: list, references: list, k_values: tuple = (1, 2, 3)) -> dict:
+    """
+    Вычисляет агрегированные метрики по всему набору (CER, Avg Edit Distance,
+    ExpRate и ExpRate≤k) за один проход: одно расстояние на пару.
+
+    Args:
+        predictions: Предсказанные LaTeX строки
+        references: Ground truth LaTeX строки (в том же порядке)
+        k_values: Значения k для ExpRate≤k
+
+    Returns:
+        dict: См. aggregate_metrics
+    """
+    if len(predictions) != len(references):
+        raise ValueError(
+            f"Количество предсказаний ({len(predictions)}) не совпадает с количеством референсов ({len(references)})"
+        )
+
+    per_sample = [compute_metrics(prediction, reference) for prediction, reference in zip(predictions, references)]
+    return aggregate_metrics(per_sample, k_values)
+
+
+def exp_rate_within(predictions: list, references: list, k: int) -> float:
+    """
+    Вычисляет только ExpRate≤k (в процентах) с досрочным выходом по полосе DP,
+    без вычисления полного расстояния.
+
+    Args:
+        predictions: Предсказанные LaTeX строки
+        references: Ground truth LaTeX строки
+        k: Допустимое количество ошибок
+
+    Returns:
+        float: ExpRate≤k в процентах
+    """
+    if not predictions:
+        return 0.0
+    hits = sum(levenshtein_within(p, r, k) for p, r in zip(predictions, references))
+    return 100.0 * hits / len(predictions)
@@ -1,7 +1,11 @@
 import streamlit as st
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
 import json
-from pathlib import Path
+from typing import TYPE_CHECKING
+
+from src.runtime import MODELS_CONFIG_PATH, read_models_config
+
+if TYPE_CHECKING:
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel
 
 
 def check_use_hf_api() -> bool:
@@ -17,31 +21,228 @@ def check_use_hf_api() -> bool:
         return False
 
 
+def get_secrets_section(section: str) -> dict:
+    """
+    Возвращает секцию из st.secrets в виде словаря.
+
+    Args:
+        section: Имя секции (например, "batching")
+
+    Returns:
+        dict: Содержимое секции или пустой словарь, если секция не задана
+    """
+    try:
+        if section in st.secrets:
+            return dict(st.secrets[section])
+    except:
+        pass
+    return {}
+
+
 @st.cache_resource
-def load_model_and_processor(model_path: str):
+def get_model_pool():
+    """
+    Возвращает процесс-глобальный пул моделей.
+    Бюджет памяти задается секцией [model_pool] в secrets (memory_budget_mb, по умолчанию без ограничения),
+    ссылка на модель - секцией [model] (gdrive_folder_id),
+    прогрев - секцией [warmup] (enabled, runs, num_beams, max_length).
+
+    Returns:
+        ModelPool
+    """
+    from src.model_pool import ModelPool
+
+    warmup = get_secrets_section("warmup")
+    num_beams = warmup.get("num_beams", [1, 4])
+    budget = get_secrets_section("model_pool").get("memory_budget_mb")
+    return ModelPool(
+        memory_budget_mb=float(budget) if budget else None,
+        gdrive_folder_id=get_secrets_section("model").get("gdrive_folder_id"),
+        warmup=bool(warmup.get("enabled", True)),
+        warmup_runs=int(warmup.get("runs", 1)),
+        warmup_num_beams=[num_beams] if isinstance(num_beams, int) else num_beams,
+        warmup_max_length=int(warmup.get("max_length", 32))
+    )
+
+
+def get_model_loader(model_key: str, model_path: str, quantization: str = None):
     """
-    Загружает модель TrOCR и процессор с кешированием.
-    Возвращает (None, None) если используется HuggingFace API.
+    Возвращает фоновый загрузчик модели из пула (загрузка и прогрев начинаются при первом обращении).
+    Каждый вызов отмечает модель как недавно использованную.
 
     Args:
+        model_key: Ключ модели в config/models.json
         model_path: Путь к папке с моделью
+        quantization: Режим квантования из config/models.json ("dynamic_int8") или None
 
     Returns:
-        tuple: (processor, model) или (None, None) при использовании HF API
+        BackgroundModelLoader или None при использовании HF API
     """
-    # Проверяем, используется ли HF API
     if check_use_hf_api():
-        # HF API режим - модель не нужна
-        return None, None
+        return None
+    return get_model_pool().acquire(model_key, model_path, quantization)
 
-    try:
-        processor = TrOCRProcessor.from_pretrained(model_path)
-        model = VisionEncoderDecoderModel.from_pretrained(model_path)
-        return processor, model
-    except Exception as e:
-        st.error(f"Ошибка загрузки модели: {e}")
-        st.info(f"Проверьте, что модель находится в папке: {model_path}")
-        raise
+
+def get_batch_scheduler(model_key: str, processor: "TrOCRProcessor", model: "VisionEncoderDecoderModel"):
+    """
+    Возвращает планировщик микро-батчинга для модели (один на модель в пуле,
+    останавливается при выгрузке модели). Включается секцией [batching] в secrets (enabled = true;
+    max_batch_size, max_wait_ms, request_timeout).
+
+    Args:
+        model_key: Ключ модели в конфигурации
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+
+    Returns:
+        MicroBatchScheduler или None, если батчинг выключен или модель не загружена
+    """
+    config = get_secrets_section("batching")
+    if not config.get("enabled", False) or processor is None or model is None:
+        return None
+
+    from src.batching import MicroBatchScheduler
+    return get_model_pool().get_attachment(
+        model_key,
+        "scheduler",
+        lambda: MicroBatchScheduler(
+            processor,
+            model,
+            max_batch_size=int(config.get("max_batch_size", 8)),
+            max_wait_ms=float(config.get("max_wait_ms", 20.0)),
+            request_timeout=float(config.get("request_timeout", 120.0))
+        )
+    )
+
+
+def get_worker_pool(model_key: str, model_path: str, quantization: str,
+                    processor: "TrOCRProcessor", model: "VisionEncoderDecoderModel"):
+    """
+    Возвращает пул процессов инференса для модели (один на модель в пуле моделей,
+    останавливается при выгрузке модели). Включается секцией [worker_pool] в secrets
+    (enabled, num_workers, threads_per_worker, pin_cpus, max_queue_size, request_timeout, start_method).
+
+    Args:
+        model_key: Ключ модели в конфигурации
+        model_path: Путь к папке с моделью
+        quantization: Режим квантования или None
+        processor: TrOCRProcessor (наследуется воркерами при start_method="fork")
+        model: VisionEncoderDecoderModel (наследуется воркерами при start_method="fork")
+
+    Returns:
+        InferenceWorkerPool или None, если режим выключен или модель не загружена
+    """
+    config = get_secrets_section("worker_pool")
+    if not config.get("enabled", False) or processor is None or model is None:
+        return None
+
+    from src.worker_pool import InferenceWorkerPool
+    threads = config.get("threads_per_worker")
+    return get_model_pool().get_attachment(
+        model_key,
+        "worker_pool",
+        lambda: InferenceWorkerPool(
+            model_path,
+            quantization,
+            num_workers=int(config.get("num_workers", 2)),
+            threads_per_worker=int(threads) if threads else None,
+            pin_cpus=bool(config.get("pin_cpus", True)),
+            max_queue_size=int(config.get("max_queue_size", 32)),
+            request_timeout=float(config.get("request_timeout", 120.0)),
+            start_method=config.get("start_method", "fork"),
+            shared_model=(processor, model)
+        )
+    )
+
+
+def get_encoder_cache(model_key: str):
+    """
+    Возвращает кеш выходов энкодера для модели (один на модель в пуле, очищается при выгрузке модели).
+    Настраивается секцией [encoder_cache] в secrets (enabled, max_size, max_memory_mb).
+
+    Args:
+        model_key: Ключ модели в конфигурации
+
+    Returns:
+        EncoderOutputCache или None, если кеш выключен или модель не в пуле (режим HF API)
+    """
+    config = get_secrets_section("encoder_cache")
+    if not config.get("enabled", True) or check_use_hf_api():
+        return None
+
+    from src.encoder_cache import EncoderOutputCache
+    return get_model_pool().get_attachment(
+        model_key,
+        "encoder_cache",
+        lambda: EncoderOutputCache(
+            max_size=int(config.get("max_size", 32)),
+            max_memory_mb=float(config.get("max_memory_mb", 128.0))
+        )
+    )
+
+
+@st.cache_resource
+def get_job_queue():
+    """
+    Возвращает процесс-глобальную очередь пакетных заданий распознавания.
+    Настраивается секцией [jobs] в secrets (workers, batch_size, spool_dir, max_finished_jobs).
+
+    Returns:
+        JobQueue
+    """
+    from src.jobs import JobQueue
+
+    config = get_secrets_section("jobs")
+    return JobQueue(
+        workers=int(config.get("workers", 1)),
+        batch_size=int(config.get("batch_size", 8)),
+        spool_dir=config.get("spool_dir"),
+        max_finished_jobs=int(config.get("max_finished_jobs", 20))
+    )
+
+
+@st.cache_resource
+def get_history():
+    """
+    Возвращает процесс-глобальную постоянную историю распознаваний (SQLite).
+    Настраивается секцией [history] в secrets (enabled, path, busy_timeout_ms).
+
+    Returns:
+        RecognitionHistory или None, если история выключена
+    """
+    config = get_secrets_section("history")
+    if not config.get("enabled", True):
+        return None
+
+    from src.history import RecognitionHistory
+    return RecognitionHistory(
+        config.get("path", "logs/history.sqlite3"),
+        busy_timeout_ms=int(config.get("busy_timeout_ms", 5000))
+    )
+
+
+@st.cache_resource
+def get_recognition_cache():
+    """
+    Возвращает процесс-глобальный кеш результатов распознавания.
+    Настраивается секцией [cache] в secrets (enabled, max_size, perceptual, max_hamming_distance).
+    perceptual = true допускает ложные попадания: формулы, отличающиеся одним штрихом
+    ("x+1" и "x-1"), могут получить результат друг друга; max_hamming_distance (по умолчанию 1)
+    лучше не увеличивать.
+
+    Returns:
+        RecognitionCache или None, если кеш выключен
+    """
+    config = get_secrets_section("cache")
+    if not config.get("enabled", True):
+        return None
+
+    from src.cache import RecognitionCache
+    return RecognitionCache(
+        max_size=int(config.get("max_size", 256)),
+        perceptual=bool(config.get("perceptual", False)),
+        max_hamming_distance=int(config.get("max_hamming_distance", 1))
+    )
 
 
 def load_models_config() -> dict:
@@ -51,10 +252,9 @@ def load_models_config() -> dict:
     Returns:
         dict: Конфигурация моделей
     """
-    config_path = Path(__file__).parent.parent / "config" / "models.json"
+    config_path = MODELS_CONFIG_PATH
     try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return read_models_config(config_path)
     except FileNotFoundError:
         st.error(f"Файл конфигурации моделей не найден: {config_path}")
         return {}
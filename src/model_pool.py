@@ -0,0 +1,305 @@
+"""
+Пул загруженных моделей с бюджетом памяти и вытеснением LRU.
+
+Каждая выбранная пользователем модель загружается фоновым загрузчиком
+(src/background_loader.py) и остается в пуле, пока суммарный объем весов
+не превышает бюджет. При превышении выгружается модель, которая дольше всех
+не использовалась. TrOCRProcessor разделяется между чекпоинтами с одинаковыми
+файлами токенизатора и препроцессора.
+
+Не использует Streamlit: в приложении пул создается через
+src.model_loader.get_model_pool (st.cache_resource).
+"""
+import gc
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from src.background_loader import BackgroundModelLoader
+
+
+# Файлы, определяющие поведение TrOCRProcessor (токенизатор и препроцессор изображений)
+PROCESSOR_FILES = (
+    "preprocessor_config.json",
+    "tokenizer.json",
+    "tokenizer_config.json",
+    "special_tokens_map.json",
+    "vocab.json",
+    "merges.txt",
+    "added_tokens.json",
+    # Сокращенный словарь: процессор с vocab_map нельзя делить с полной моделью
+    "vocab_map.json",
+)
+
+# Файлы весов для оценки размера модели до загрузки
+WEIGHT_PATTERNS = ("*.safetensors", "*.bin")
+
+
+def processor_fingerprint(model_path: str) -> str:
+    """
+    Хеш файлов токенизатора и препроцессора: одинаковый хеш - один и тот же процессор.
+
+    Args:
+        model_path: Путь к папке с моделью
+
+    Returns:
+        str: sha256 (или путь к папке, если файлов процессора нет)
+    """
+    digest = hashlib.sha256()
+    found = False
+    for name in PROCESSOR_FILES:
+        path = Path(model_path) / name
+        if path.exists():
+            digest.update(name.encode("utf-8"))
+            digest.update(path.read_bytes())
+            found = True
+    return digest.hexdigest() if found else str(Path(model_path).resolve())
+
+
+def estimate_weights_bytes(model_path: str) -> int:
+    """
+    Оценка объема модели в памяти по размеру файлов весов (0, если модели еще нет на диске).
+    """
+    model_path = Path(model_path)
+    if not model_path.exists():
+        return 0
+    return sum(path.stat().st_size for pattern in WEIGHT_PATTERNS for path in model_path.glob(pattern))
+
+
+def _tensor_bytes(value) -> int:
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(item) for item in value)
+    if hasattr(value, "element_size") and hasattr(value, "nelement"):
+        return value.element_size() * value.nelement()
+    return 0
+
+
+def model_memory_bytes(model) -> int:
+    """
+    Объем весов и буферов модели в памяти.
+    Учитывает упакованные int8-веса динамически квантованных Linear-слоев
+    (они хранятся в state_dict, а не в parameters()).
+
+    Args:
+        model: torch.nn.Module
+
+    Returns:
+        int: Размер в байтах
+    """
+    return sum(_tensor_bytes(value) for value in model.state_dict().values())
+
+
+class ModelPool:
+    """
+    Потокобезопасный пул моделей с бюджетом памяти и вытеснением LRU.
+    """
+
+    def __init__(self, memory_budget_mb: float = None, **loader_options):
+        """
+        Args:
+            memory_budget_mb: Бюджет памяти на веса моделей в МБ (None - без ограничения)
+            **loader_options: Параметры BackgroundModelLoader (gdrive_folder_id, warmup, ...)
+        """
+        self.memory_budget = memory_budget_mb * 2**20 if memory_budget_mb else None
+        self.loader_options = loader_options
+
+        # model_key -> запись; порядок - от давно использованных к недавно использованным
+        self._entries = OrderedDict()
+        # fingerprint -> TrOCRProcessor
+        self._processors = {}
+        self._lock = threading.RLock()
+        self._evictions = 0
+
+    def acquire(self, model_key: str, model_path: str, quantization: str = None) -> BackgroundModelLoader:
+        """
+        Возвращает загрузчик модели, запуская загрузку при первом обращении.
+        Перед загрузкой новой модели вытесняет давно не использованные модели,
+        если оценка ее размера не помещается в бюджет.
+
+        Args:
+            model_key: Ключ модели в config/models.json
+            model_path: Путь к папке с моделью
+            quantization: Режим квантования или None
+
+        Returns:
+            BackgroundModelLoader
+        """
+        with self._lock:
+            entry = self._entries.get(model_key)
+            if entry is not None and entry["loader"].state not in ("error", "evicted"):
+                entry["last_used"] = time.time()
+                self._entries.move_to_end(model_key)
+                return entry["loader"]
+
+            estimate = estimate_weights_bytes(model_path)
+            self._entries.pop(model_key, None)
+            self._evict_to_fit(estimate, keep=model_key)
+
+            loader = BackgroundModelLoader(
+                model_path,
+                quantization,
+                processor_provider=self._get_processor,
+                on_ready=lambda ready_loader: self._on_ready(model_key, ready_loader),
+                **self.loader_options
+            )
+            self._entries[model_key] = {
+                "loader": loader,
+                "model_path": model_path,
+                "quantization": quantization,
+                "size_bytes": estimate,
+                "measured": False,
+                "fingerprint": None,
+                "attachments": {},
+                "last_used": time.time(),
+            }
+            return loader.start()
+
+    def _get_processor(self, model_path: str):
+        """
+        Возвращает общий TrOCRProcessor для чекпоинтов с одинаковым токенизатором
+        (вызывается из фонового потока загрузчика).
+        """
+        fingerprint = processor_fingerprint(model_path)
+        with self._lock:
+            for entry in self._entries.values():
+                if entry["model_path"] == model_path:
+                    entry["fingerprint"] = fingerprint
+            processor = self._processors.get(fingerprint)
+        if processor is not None:
+            return processor
+
+        from transformers import TrOCRProcessor
+        from src.vocab_pruning import attach_vocab_map
+
+        processor = TrOCRProcessor.from_pretrained(model_path)
+        attach_vocab_map(processor, model_path)
+        with self._lock:
+            return self._processors.setdefault(fingerprint, processor)
+
+    def _on_ready(self, model_key: str, loader: BackgroundModelLoader):
+        """
+        Замеряет фактический размер загруженной модели и при необходимости вытесняет другие.
+        """
+        _, model = loader.result()
+        size = model_memory_bytes(model)
+        with self._lock:
+            entry = self._entries.get(model_key)
+            if entry is None or entry["loader"] is not loader:
+                return
+            entry["size_bytes"] = size
+            entry["measured"] = True
+            self._evict_to_fit(0, keep=model_key)
+
+    def _used_bytes(self) -> int:
+        return sum(
+            entry["size_bytes"] for entry in self._entries.values() if entry["loader"].state != "error"
+        )
+
+    def _evict_to_fit(self, incoming_bytes: int, keep: str):
+        """
+        Выгружает модели в порядке LRU, пока занятая память + incoming_bytes превышает бюджет.
+        Загружающиеся модели и модель keep не выгружаются. Вызывается под self._lock.
+        """
+        if self.memory_budget is None:
+            return
+        for key in list(self._entries):
+            if self._used_bytes() + incoming_bytes <= self.memory_budget:
+                break
+            if key == keep or not self._entries[key]["loader"].is_done():
+                continue
+            self._evict(key)
+
+    def _evict(self, model_key: str):
+        """
+        Удаляет модель из пула: останавливает связанные объекты (планировщик) и освобождает ссылки.
+        Вызывается под self._lock.
+        """
+        entry = self._entries.pop(model_key)
+        for attachment in entry["attachments"].values():
+            close = getattr(attachment, "close", None)
+            if close is not None:
+                close()
+        entry["loader"].release()
+
+        # Процессор удаляется, если его больше не использует ни одна модель
+        fingerprint = entry["fingerprint"]
+        if fingerprint and all(other["fingerprint"] != fingerprint for other in self._entries.values()):
+            self._processors.pop(fingerprint, None)
+
+        self._evictions += 1
+        gc.collect()
+
+    def evict(self, model_key: str) -> bool:
+        """
+        Принудительно выгружает модель.
+
+        Returns:
+            bool: True, если модель была в пуле
+        """
+        with self._lock:
+            if model_key not in self._entries:
+                return False
+            self._evict(model_key)
+            return True
+
+    def get_attachment(self, model_key: str, name: str, factory):
+        """
+        Возвращает объект, привязанный к модели (например, планировщик микро-батчинга),
+        создавая его при первом обращении. При выгрузке модели у объекта вызывается close().
+
+        Args:
+            model_key: Ключ модели
+            name: Имя объекта
+            factory: Функция без аргументов, создающая объект
+
+        Returns:
+            Объект или None, если модели нет в пуле
+        """
+        with self._lock:
+            entry = self._entries.get(model_key)
+            if entry is None:
+                return None
+            if name not in entry["attachments"]:
+                entry["attachments"][name] = factory()
+            return entry["attachments"][name]
+
+    def resident(self) -> list:
+        """
+        Список моделей в пуле (от недавно использованных к давно использованным).
+
+        Returns:
+            list: {"model_key", "model_path", "quantization", "state", "size_mb",
+                   "size_measured", "shared_processor", "last_used"}
+        """
+        with self._lock:
+            fingerprints = [entry["fingerprint"] for entry in self._entries.values() if entry["fingerprint"]]
+            return [
+                {
+                    "model_key": key,
+                    "model_path": entry["model_path"],
+                    "quantization": entry["quantization"],
+                    "state": entry["loader"].state,
+                    "size_mb": entry["size_bytes"] / 2**20,
+                    "size_measured": entry["measured"],
+                    "shared_processor": bool(entry["fingerprint"]) and fingerprints.count(entry["fingerprint"]) > 1,
+                    "last_used": entry["last_used"],
+                }
+                for key, entry in reversed(self._entries.items())
+            ]
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: {"models": int, "used_mb": float, "budget_mb": float | None,
+                   "processors": int, "evictions": int}
+        """
+        with self._lock:
+            return {
+                "models": len(self._entries),
+                "used_mb": self._used_bytes() / 2**20,
+                "budget_mb": self.memory_budget / 2**20 if self.memory_budget else None,
+                "processors": len(self._processors),
+                "evictions": self._evictions,
+            }
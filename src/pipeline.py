@@ -0,0 +1,340 @@
+"""
+Конвейерный (pipeline-parallel) батчевый инференс: энкодер и декодер в разных потоках.
+
+В model.generate энкодер ViT (один плотный проход по патчам) и авторегрессионный
+декодер (сотни маленьких шагов) выполняются друг за другом, и во время шагов
+декодера ядра, хорошо загруженные энкодером, простаивают. Здесь поток энкодера
+готовит pixel_values и вычисляет выход энкодера для батча k+1, пока основной поток
+декодирует батч k. Выходы энкодера передаются через ограниченную очередь
+(queue_size батчей), поэтому энкодер не уходит вперед декодера больше чем на
+queue_size батчей. Операции torch освобождают GIL, поэтому стадии выполняются
+параллельно и делят общий пул intra-op потоков.
+
+Для каждой стадии считается занятость (доля времени работы от общего времени),
+время блокировки энкодера на полной очереди и время простоя декодера на пустой.
+
+Пример:
+    python -m src.pipeline --images data/test --labels data/test_caption.txt --limit 200 \\
+        --batch-size 8 --queue-size 2 --compare --output pipeline.json
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Iterable, Iterator, List
+
+from src.inference import encode_images, generate_with_confidence, predict_adaptive
+
+if TYPE_CHECKING:
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+
+
+# Маркер конца потока изображений в очереди между стадиями
+_END = object()
+
+
+def batched(items: Iterable, batch_size: int) -> Iterator[list]:
+    """
+    Разбивает итерируемый объект на списки длины batch_size (последний может быть короче).
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class PipelinedRecognizer:
+    """
+    Двухстадийный конвейер: поток энкодера -> ограниченная очередь -> декодер в вызывающем потоке.
+    Результаты выдаются в порядке входных изображений.
+    """
+
+    def __init__(
+        self,
+        processor: "TrOCRProcessor",
+        model: "VisionEncoderDecoderModel",
+        batch_size: int = 8,
+        queue_size: int = 2,
+        max_length: int = 256,
+        num_beams: int = 4,
+        adaptive: bool = False,
+        confidence_threshold: float = 0.9
+    ):
+        """
+        Args:
+            processor: TrOCRProcessor
+            model: VisionEncoderDecoderModel (например, из src.runtime.load_local_model)
+            batch_size: Размер батча обеих стадий
+            queue_size: Максимум батчей с готовым выходом энкодера, ожидающих декодера
+            max_length: Максимальная длина последовательности
+            num_beams: Количество beams для beam search
+            adaptive: Адаптивный режим (greedy, beam search при низкой уверенности)
+            confidence_threshold: Порог уверенности для адаптивного режима
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size должен быть >= 1, получено: {batch_size}")
+        if queue_size < 1:
+            raise ValueError(f"queue_size должен быть >= 1, получено: {queue_size}")
+
+        self.processor = processor
+        self.model = model
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.max_length = max_length
+        self.num_beams = num_beams
+        self.adaptive = adaptive
+        self.confidence_threshold = confidence_threshold
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {
+            "images": 0,
+            "batches": 0,
+            "wall_s": 0.0,
+            "encoder_busy_s": 0.0,
+            "encoder_blocked_s": 0.0,
+            "decoder_busy_s": 0.0,
+            "decoder_starved_s": 0.0,
+        }
+        self._queue_depth_hist = Counter()
+
+    @staticmethod
+    def _put(handoff: queue.Queue, item, stop: threading.Event) -> bool:
+        """
+        Кладет элемент в очередь, пока декодер не остановлен (False - остановлен).
+        """
+        while not stop.is_set():
+            try:
+                handoff.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _encode_stage(self, images: Iterable, handoff: queue.Queue, stop: threading.Event):
+        """
+        Поток энкодера: pixel_values и выход энкодера для каждого батча.
+        Исключение передается декодеру через очередь.
+        """
+        try:
+            for batch in batched(images, self.batch_size):
+                start = time.perf_counter()
+                states = encode_images(batch, self.processor, self.model)
+                self._stats["encoder_busy_s"] += time.perf_counter() - start
+
+                blocked_start = time.perf_counter()
+                delivered = self._put(handoff, states, stop)
+                self._stats["encoder_blocked_s"] += time.perf_counter() - blocked_start
+                if not delivered:
+                    return
+            self._put(handoff, _END, stop)
+        except Exception as e:
+            self._put(handoff, e, stop)
+
+    def _decode(self, states) -> List[dict]:
+        if self.adaptive:
+            return predict_adaptive(
+                None, self.processor, self.model, self.max_length, self.num_beams,
+                self.confidence_threshold, encoder_hidden_states=states
+            )
+        return generate_with_confidence(
+            None, self.processor, self.model, self.max_length, self.num_beams, encoder_hidden_states=states
+        )
+
+    def run(self, images: Iterable) -> Iterator[dict]:
+        """
+        Распознает изображения конвейером. Статистика предыдущего запуска сбрасывается.
+
+        Args:
+            images: Итерируемый объект предобработанных изображений (PIL Image или uint8 массивы);
+                    читается потоком энкодера
+
+        Yields:
+            dict: Результаты в формате generate_with_confidence в порядке входных изображений
+        """
+        self._reset_stats()
+        handoff = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        encoder = threading.Thread(
+            target=self._encode_stage, args=(images, handoff, stop), name="pipeline-encoder", daemon=True
+        )
+
+        start = time.perf_counter()
+        encoder.start()
+        try:
+            while True:
+                self._queue_depth_hist[handoff.qsize()] += 1
+                wait_start = time.perf_counter()
+                item = handoff.get()
+                self._stats["decoder_starved_s"] += time.perf_counter() - wait_start
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                decode_start = time.perf_counter()
+                results = self._decode(item)
+                self._stats["decoder_busy_s"] += time.perf_counter() - decode_start
+                self._stats["batches"] += 1
+                self._stats["images"] += len(results)
+                yield from results
+        finally:
+            # Потребитель мог прервать итерацию: поток энкодера останавливается
+            stop.set()
+            encoder.join()
+            self._stats["wall_s"] = time.perf_counter() - start
+
+    def stats(self) -> dict:
+        """
+        Пропускная способность и занятость стадий последнего запуска.
+
+        Returns:
+            dict: {"images", "batches", "wall_s", "throughput_images_per_s",
+                   "encoder": {"busy_s", "blocked_s", "utilization"},
+                   "decoder": {"busy_s", "starved_s", "utilization"},
+                   "overlap": float, "queue_depth_hist": dict}
+            overlap - доля времени, в которую стадии работали одновременно
+        """
+        stats = self._stats
+        wall = stats["wall_s"]
+        encoder_busy, decoder_busy = stats["encoder_busy_s"], stats["decoder_busy_s"]
+        return {
+            "images": stats["images"],
+            "batches": stats["batches"],
+            "wall_s": wall,
+            "throughput_images_per_s": stats["images"] / wall if wall > 0 else 0.0,
+            "encoder": {
+                "busy_s": encoder_busy,
+                "blocked_s": stats["encoder_blocked_s"],
+                "utilization": encoder_busy / wall if wall > 0 else 0.0,
+            },
+            "decoder": {
+                "busy_s": decoder_busy,
+                "starved_s": stats["decoder_starved_s"],
+                "utilization": decoder_busy / wall if wall > 0 else 0.0,
+            },
+            # Сумма занятости стадий сверх общего времени - время их параллельной работы
+            "overlap": max(0.0, encoder_busy + decoder_busy - wall) / wall if wall > 0 else 0.0,
+            "queue_depth_hist": dict(sorted(self._queue_depth_hist.items())),
+        }
+
+
+def run_sequential(images: list, processor, model, batch_size: int = 8, max_length: int = 256,
+                   num_beams: int = 4, adaptive: bool = False, confidence_threshold: float = 0.9) -> dict:
+    """
+    Базовый вариант для сравнения: энкодер и декодер каждого батча друг за другом.
+
+    Returns:
+        dict: {"images", "wall_s", "throughput_images_per_s", "results"}
+    """
+    from src.inference import predict_latex_batch
+
+    start = time.perf_counter()
+    results = predict_latex_batch(
+        images, processor, model, max_length, num_beams, max_batch_size=batch_size,
+        adaptive=adaptive, confidence_threshold=confidence_threshold, return_details=True
+    )
+    wall = time.perf_counter() - start
+    return {
+        "images": len(images),
+        "wall_s": wall,
+        "throughput_images_per_s": len(images) / wall if wall > 0 else 0.0,
+        "results": results,
+    }
+
+
+def main():
+    from src.dataset import load_image, load_samples
+    from src.preprocessing import preprocess_image
+    from src.runtime import add_model_arguments, load_local_model, resolve_model_args
+
+    parser = argparse.ArgumentParser(description="Конвейерный батчевый инференс (энкодер || декодер)")
+    add_model_arguments(parser)
+    parser.add_argument("--images", default=None, help="Папка с изображениями (без нее - синтетические)")
+    parser.add_argument("--labels", default=None, help="Файл разметки (имя файла \\t LaTeX)")
+    parser.add_argument("--limit", type=int, default=None, help="Ограничение количества примеров")
+    parser.add_argument("--synthetic", type=int, default=64, help="Число синтетических изображений")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=2, help="Батчей в очереди между стадиями")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--num-beams", type=int, default=4)
+    parser.add_argument("--adaptive", action="store_true", help="Адаптивный beam search")
+    parser.add_argument("--confidence-threshold", type=float, default=0.9)
+    parser.add_argument("--compare", action="store_true", help="Сравнить с последовательным выполнением")
+    parser.add_argument("--output", default=None, help="Путь для сохранения отчета в JSON")
+    args = parser.parse_args()
+
+    import torch
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    if args.images and not args.labels:
+        parser.error("--images требует --labels")
+
+    model_path, quantization = resolve_model_args(args)
+    processor, model = load_local_model(model_path, quantization)
+
+    if args.images:
+        samples = load_samples(args.images, args.labels, limit=args.limit)
+        images = [preprocess_image(load_image(path)) for path, _ in samples]
+    else:
+        from src.synthetic import synthetic_formula_image
+        images = [preprocess_image(synthetic_formula_image(200, 800, seed=i)) for i in range(args.synthetic)]
+
+    generation = {
+        "max_length": args.max_length,
+        "num_beams": args.num_beams,
+        "adaptive": args.adaptive,
+        "confidence_threshold": args.confidence_threshold,
+    }
+    recognizer = PipelinedRecognizer(
+        processor, model, batch_size=args.batch_size, queue_size=args.queue_size, **generation
+    )
+    results = list(recognizer.run(images))
+    report = {"model_path": model_path, "torch_threads": torch.get_num_threads(),
+              "config": dict(generation, batch_size=args.batch_size, queue_size=args.queue_size),
+              "pipeline": recognizer.stats()}
+
+    stats = report["pipeline"]
+    print(
+        f"Конвейер: {stats['images']} изображений за {stats['wall_s']:.1f} с "
+        f"({stats['throughput_images_per_s']:.2f} img/s)"
+    )
+    print(
+        f"  энкодер: занят {stats['encoder']['utilization'] * 100:.0f}%, "
+        f"ждал очередь {stats['encoder']['blocked_s']:.1f} с"
+    )
+    print(
+        f"  декодер: занят {stats['decoder']['utilization'] * 100:.0f}%, "
+        f"ждал энкодер {stats['decoder']['starved_s']:.1f} с"
+    )
+    print(f"  стадии работали одновременно {stats['overlap'] * 100:.0f}% времени")
+
+    if args.compare:
+        sequential = run_sequential(images, processor, model, batch_size=args.batch_size, **generation)
+        mismatches = sum(a["latex"] != b["latex"] for a, b in zip(results, sequential.pop("results")))
+        sequential["mismatches"] = mismatches
+        report["sequential"] = sequential
+        speedup = stats["throughput_images_per_s"] / sequential["throughput_images_per_s"] \
+            if sequential["throughput_images_per_s"] else 0.0
+        report["speedup"] = speedup
+        print(
+            f"Последовательно: {sequential['throughput_images_per_s']:.2f} img/s, "
+            f"ускорение x{speedup:.2f}, расхождений {mismatches}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-import cv2
 import numpy as np
 from PIL import Image
 
@@ -50,6 +49,8 @@ def binarize(image: Image.Image, threshold: int = 0) -> Image.Image:
     Returns:
         Бинаризованное изображение
     """
+    import cv2  # загружается только при включенной бинаризации
+
     gray = np.array(image.convert("L"))
 
     if threshold == 0:
@@ -91,3 +92,55 @@ def preprocess_image(image: Image.Image, apply_inversion: bool = False, apply_bi
     return processed
 
 
+def rgb_to_gray(array: np.ndarray) -> np.ndarray:
+    """
+    Переводит RGB массив в градации серого по той же формуле, что и PIL convert("L")
+    (ITU-R 601-2 в целочисленной арифметике), поэтому результат совпадает побитово.
+
+    Args:
+        array: uint8 массив (H, W, 3), (H, W, 4) или уже серый (H, W)
+
+    Returns:
+        uint8 массив (H, W)
+    """
+    if array.ndim == 2:
+        return array
+    rgb = array[:, :, :3].astype(np.uint32)
+    gray = (rgb[:, :, 0] * 19595 + rgb[:, :, 1] * 38470 + rgb[:, :, 2] * 7471 + 0x8000) >> 16
+    return gray.astype(np.uint8)
+
+
+def preprocess_array(array: np.ndarray, apply_inversion: bool = False, apply_binarization: bool = False,
+                     binarization_threshold: int = 0) -> np.ndarray:
+    """
+    Аналог preprocess_image для uint8 массивов (например, данных Canvas) без конвертации в PIL.
+    Результат передается в векторизованный путь src.fast_preprocessing.
+
+    Args:
+        array: uint8 массив (H, W, 3) или (H, W, 4) (альфа-канал отбрасывается)
+        apply_inversion: Применить автоинверсию
+        apply_binarization: Применить бинаризацию
+        binarization_threshold: Порог бинаризации (0 для Otsu)
+
+    Returns:
+        uint8 массив (H, W, 3) или (H, W) в градациях серого после инверсии/бинаризации
+    """
+    processed = array[:, :, :3] if array.ndim == 3 else array
+
+    # Опциональная инверсия (как auto_invert: результат в градациях серого)
+    if apply_inversion:
+        gray = rgb_to_gray(processed)
+        if np.mean(gray) < 128:
+            processed = 255 - gray
+
+    # Опциональная бинаризация
+    if apply_binarization:
+        import cv2
+
+        gray = np.ascontiguousarray(rgb_to_gray(processed))
+        if binarization_threshold == 0:
+            _, processed = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        else:
+            _, processed = cv2.threshold(gray, binarization_threshold, 255, cv2.THRESH_BINARY)
+
+    return np.ascontiguousarray(processed)
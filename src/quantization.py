@@ -0,0 +1,167 @@
+"""
+Динамическое int8-квантование модели для CPU-инференса.
+
+Включается для конкретной модели опцией "quantization": "dynamic_int8"
+в config/models.json. Linear-слои ViT-энкодера и декодера переводятся в int8
+(веса хранятся в int8, активации квантуются на лету).
+
+Сравнение с fp32-моделью (латентность, размер, CER/ExpRate):
+    python -m src.quantization --model-path models/trocr1-5ep --images data/test --labels data/test_caption.txt
+"""
+import argparse
+import io
+import json
+import statistics
+import time
+
+import torch
+from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+
+from src.dataset import load_image, load_samples
+from src.inference import predict_latex
+from src.metrics import compute_metrics_batch
+from src.preprocessing import preprocess_image
+
+
+SUPPORTED_QUANTIZATION = ("dynamic_int8",)
+
+
+def apply_quantization(model: VisionEncoderDecoderModel, quantization: str = None) -> VisionEncoderDecoderModel:
+    """
+    Применяет квантование к модели.
+
+    Args:
+        model: VisionEncoderDecoderModel в fp32
+        quantization: Режим квантования ("dynamic_int8") или None
+
+    Returns:
+        VisionEncoderDecoderModel: Квантованная модель (или исходная, если quantization=None)
+    """
+    if quantization is None:
+        return model
+    if quantization not in SUPPORTED_QUANTIZATION:
+        raise ValueError(
+            f"Неизвестный режим квантования: {quantization}. Поддерживаются: {', '.join(SUPPORTED_QUANTIZATION)}"
+        )
+
+    model.eval()
+    model.encoder = torch.ao.quantization.quantize_dynamic(
+        model.encoder, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    model.decoder = torch.ao.quantization.quantize_dynamic(
+        model.decoder, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return model
+
+
+def model_size_bytes(model: torch.nn.Module) -> int:
+    """
+    Вычисляет размер сериализованных весов модели (учитывает упакованные int8-веса).
+
+    Args:
+        model: torch модель
+
+    Returns:
+        int: Размер state_dict в байтах
+    """
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def evaluate_model(processor: TrOCRProcessor, model: VisionEncoderDecoderModel, samples: list,
+                   max_length: int = 256, num_beams: int = 4) -> dict:
+    """
+    Прогоняет модель по размеченным примерам, измеряя латентность и качество.
+
+    Args:
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        samples: Пары (путь к изображению, LaTeX)
+        max_length: Максимальная длина генерации
+        num_beams: Количество лучей для beam search
+
+    Returns:
+        dict: Латентность (мс), CER, ExpRate и ExpRate≤k (%), Avg Edit Distance
+    """
+    latencies, predictions = [], []
+    for path, _ in samples:
+        image = preprocess_image(load_image(path))
+
+        start = time.perf_counter()
+        prediction = predict_latex(image, processor, model, max_length, num_beams)
+        latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append(prediction)
+
+    count = len(samples)
+    result = {
+        "latency_mean_ms": statistics.fmean(latencies),
+        "latency_p50_ms": statistics.median(latencies),
+        "latency_p95_ms": sorted(latencies)[min(count - 1, int(count * 0.95))],
+    }
+    result.update(compute_metrics_batch(predictions, [reference for _, reference in samples]))
+    return result
+
+
+def compare_quantization(model_path: str, samples: list, quantization: str = "dynamic_int8",
+                         max_length: int = 256, num_beams: int = 4) -> dict:
+    """
+    Строит отчет "fp32 против квантованной модели" на одних и тех же примерах.
+
+    Args:
+        model_path: Путь к папке с моделью
+        samples: Пары (путь к изображению, LaTeX)
+        quantization: Режим квантования
+        max_length: Максимальная длина генерации
+        num_beams: Количество лучей для beam search
+
+    Returns:
+        dict: {"fp32": {...}, quantization: {...}}
+    """
+    processor = TrOCRProcessor.from_pretrained(model_path)
+    report = {}
+    for mode in (None, quantization):
+        model = apply_quantization(VisionEncoderDecoderModel.from_pretrained(model_path), mode)
+        result = evaluate_model(processor, model, samples, max_length, num_beams)
+        result["model_size_mb"] = model_size_bytes(model) / 2**20
+        report[mode or "fp32"] = result
+        del model
+    return report
+
+
+def print_report(report: dict):
+    """
+    Печатает отчет в виде таблицы (строки - метрики, столбцы - режимы).
+    """
+    modes = list(report)
+    metrics = list(report[modes[0]])
+    print(f"{'Метрика':<20}" + "".join(f"{mode:>16}" for mode in modes))
+    for metric in metrics:
+        print(f"{metric:<20}" + "".join(f"{report[mode][metric]:>16.3f}" for mode in modes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение fp32 и квантованной модели TrOCR")
+    parser.add_argument("--model-path", default="models/trocr1-5ep", help="Путь к папке с моделью")
+    parser.add_argument("--images", required=True, help="Папка с изображениями")
+    parser.add_argument("--labels", required=True, help="Файл разметки (имя файла \\t LaTeX)")
+    parser.add_argument("--quantization", default="dynamic_int8", choices=SUPPORTED_QUANTIZATION)
+    parser.add_argument("--limit", type=int, default=None, help="Ограничение количества примеров")
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--num-beams", type=int, default=4)
+    parser.add_argument("--output", default=None, help="Путь для сохранения отчета в JSON")
+    args = parser.parse_args()
+
+    samples = load_samples(args.images, args.labels, limit=args.limit)
+    report = compare_quantization(
+        args.model_path, samples, args.quantization, args.max_length, args.num_beams
+    )
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
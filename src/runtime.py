@@ -0,0 +1,77 @@
+"""
+Загрузка моделей вне Streamlit: для CLI-инструментов и headless-сервисов.
+Не использует st.secrets и st.cache_resource.
+"""
+import argparse
+import json
+from pathlib import Path
+
+
+MODELS_CONFIG_PATH = Path(__file__).parent.parent / "config" / "models.json"
+
+
+def read_models_config(config_path: Path = MODELS_CONFIG_PATH) -> dict:
+    """
+    Читает config/models.json (исключения не перехватываются).
+
+    Returns:
+        dict: Конфигурация моделей
+    """
+    with open(config_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_local_model(model_path: str, quantization: str = None, processor=None) -> tuple:
+    """
+    Загружает процессор и модель из локальной папки.
+
+    Args:
+        model_path: Путь к папке с моделью
+        quantization: Режим квантования ("dynamic_int8") или None
+        processor: Уже загруженный TrOCRProcessor с тем же токенизатором (None - загрузить из model_path)
+
+    Returns:
+        tuple: (processor, model)
+    """
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+
+    if processor is None:
+        processor = TrOCRProcessor.from_pretrained(model_path)
+        # Сокращенный словарь декодера (src/vocab_pruning.py): id переводятся в исходные при декодировании
+        from src.vocab_pruning import attach_vocab_map
+        attach_vocab_map(processor, model_path)
+    model = VisionEncoderDecoderModel.from_pretrained(model_path)
+    if quantization is not None:
+        from src.quantization import apply_quantization
+        model = apply_quantization(model, quantization)
+    model.eval()
+    return processor, model
+
+
+def add_model_arguments(parser: argparse.ArgumentParser):
+    """
+    Добавляет в CLI общие аргументы выбора модели: --model (ключ из models.json)
+    или --model-path (папка с моделью) и --quantization.
+    """
+    parser.add_argument("--model", default=None, help="Ключ модели из config/models.json")
+    parser.add_argument("--model-path", default=None, help="Путь к папке с моделью (вместо --model)")
+    parser.add_argument("--quantization", default=None, help="Режим квантования (например, dynamic_int8)")
+
+
+def resolve_model_args(args: argparse.Namespace) -> tuple:
+    """
+    Определяет путь и режим квантования по аргументам add_model_arguments.
+    Без аргументов используется первая модель из config/models.json.
+
+    Returns:
+        tuple: (model_path, quantization)
+    """
+    if args.model_path:
+        return args.model_path, args.quantization
+
+    config = read_models_config()
+    model_key = args.model or next(iter(config))
+    if model_key not in config:
+        raise SystemExit(f"Модель '{model_key}' не найдена в {MODELS_CONFIG_PATH}")
+    info = config[model_key]
+    return info["path"], args.quantization or info.get("quantization")
@@ -0,0 +1,216 @@
+"""
+Сегментация страницы с несколькими формулами на отдельные выражения.
+
+Модель обучена на одиночных выражениях, и фотография листа с десятком формул,
+сжатая до 384x384, становится нечитаемой. Страница разбивается на выражения:
+1. Маска чернил - порог Otsu (темный фон инвертируется).
+2. Связные компоненты площадью меньше min_component_area (шум, пыль) удаляются;
+   медианная высота оставшихся компонент - масштаб символа.
+3. Горизонтальный профиль проекции делит страницу на строки по пустым полосам
+   высотой не меньше line_gap_ratio * масштаб символа (дробь не разрывается:
+   ее черта заполняет промежуток между числителем и знаменателем).
+4. Вертикальный профиль каждой строки делит ее на выражения по промежуткам
+   шире column_gap_ratio * масштаб символа (пробелы между символами формулы уже).
+
+Фрагменты распознаются все сразу (recognize_page): одним батчевым вызовом generate,
+параллельными запросами к HF API или через планировщик.
+"""
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from src.preprocessing import rgb_to_gray
+from src.tracing import span
+
+
+def ink_mask(image, threshold: int = 0) -> np.ndarray:
+    """
+    Маска пикселей чернил.
+
+    Args:
+        image: PIL Image или uint8 массив (H, W[, C])
+        threshold: Порог бинаризации (0 - Otsu)
+
+    Returns:
+        np.ndarray: bool маска (H, W), True - чернила
+    """
+    import cv2
+
+    array = np.asarray(image.convert("RGB")) if isinstance(image, Image.Image) else np.asarray(image)
+    gray = np.ascontiguousarray(rgb_to_gray(array))
+    if gray.mean() < 128:
+        # Светлые чернила на темном фоне
+        gray = 255 - gray
+
+    if threshold == 0:
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    else:
+        _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY_INV)
+    return binary > 0
+
+
+def remove_specks(mask: np.ndarray, min_component_area: int = 12) -> tuple:
+    """
+    Удаляет мелкие связные компоненты и оценивает высоту символа.
+
+    Args:
+        mask: bool маска чернил
+        min_component_area: Минимальная площадь компоненты в пикселях
+
+    Returns:
+        tuple: (очищенная маска, медианная высота компонент в пикселях или 0)
+    """
+    import cv2
+
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+    # Компонента 0 - фон
+    keep = stats[:, cv2.CC_STAT_AREA] >= min_component_area
+    keep[0] = False
+    if not keep.any():
+        return np.zeros_like(mask), 0
+    symbol_height = float(np.median(stats[keep, cv2.CC_STAT_HEIGHT]))
+    return keep[labels], symbol_height
+
+
+def split_runs(profile: np.ndarray, min_gap: int) -> list:
+    """
+    Делит профиль проекции на непустые отрезки, разделенные не менее чем min_gap нулями.
+
+    Args:
+        profile: Число пикселей чернил в каждой строке или столбце
+        min_gap: Минимальная длина пустого промежутка между отрезками
+
+    Returns:
+        list: Полуинтервалы (start, end)
+    """
+    filled = np.flatnonzero(profile > 0)
+    if not filled.size:
+        return []
+
+    runs = []
+    start = previous = int(filled[0])
+    for index in filled[1:]:
+        index = int(index)
+        if index - previous - 1 >= min_gap:
+            runs.append((start, previous + 1))
+            start = index
+        previous = index
+    runs.append((start, previous + 1))
+    return runs
+
+
+def segment_page(
+    image,
+    min_component_area: int = 12,
+    line_gap_ratio: float = 0.6,
+    column_gap_ratio: float = 1.5,
+    min_gap_px: int = 4,
+    min_segment_size: int = 8,
+    threshold: int = 0
+) -> list:
+    """
+    Находит выражения на странице.
+
+    Args:
+        image: PIL Image или uint8 массив
+        min_component_area: Минимальная площадь связной компоненты (меньшие считаются шумом)
+        line_gap_ratio: Минимальный промежуток между строками в долях высоты символа
+        column_gap_ratio: Минимальный промежуток между выражениями в строке в долях высоты символа
+        min_gap_px: Нижняя граница обоих промежутков в пикселях
+        min_segment_size: Фрагменты меньше этого размера (по обеим сторонам) отбрасываются
+        threshold: Порог бинаризации (0 - Otsu)
+
+    Returns:
+        list: {"bbox": [x0, y0, x1, y1], "line": int, "column": int} в порядке чтения
+    """
+    mask, symbol_height = remove_specks(ink_mask(image, threshold), min_component_area)
+    if symbol_height == 0:
+        return []
+
+    line_gap = max(min_gap_px, round(line_gap_ratio * symbol_height))
+    column_gap = max(min_gap_px, round(column_gap_ratio * symbol_height))
+
+    segments = []
+    for line_index, (y0, y1) in enumerate(split_runs(mask.sum(axis=1), line_gap)):
+        line = mask[y0:y1]
+        column_index = 0
+        for x0, x1 in split_runs(line.sum(axis=0), column_gap):
+            # Вертикальные границы уточняются по самому выражению, а не по всей строке
+            rows = np.flatnonzero(line[:, x0:x1].any(axis=1))
+            top, bottom = y0 + int(rows[0]), y0 + int(rows[-1]) + 1
+            if x1 - x0 < min_segment_size and bottom - top < min_segment_size:
+                continue
+            segments.append({"bbox": [x0, top, x1, bottom], "line": line_index, "column": column_index})
+            column_index += 1
+    return segments
+
+
+def crop_segments(image: Image.Image, segments: list, padding: int = 8) -> list:
+    """
+    Вырезает фрагменты с полями (в пределах изображения).
+
+    Args:
+        image: PIL Image
+        segments: Результат segment_page
+        padding: Поля вокруг фрагмента в пикселях
+
+    Returns:
+        list: PIL Image фрагментов
+    """
+    width, height = image.size
+    crops = []
+    for segment in segments:
+        x0, y0, x1, y1 = segment["bbox"]
+        crops.append(image.crop((
+            max(0, x0 - padding), max(0, y0 - padding), min(width, x1 + padding), min(height, y1 + padding)
+        )))
+    return crops
+
+
+def draw_segments(image: Image.Image, segments: list, color: str = "red") -> Image.Image:
+    """
+    Рисует рамки и номера фрагментов на копии изображения.
+    """
+    annotated = image.convert("RGB").copy()
+    draw = ImageDraw.Draw(annotated)
+    line_width = max(2, min(annotated.size) // 300)
+    for number, segment in enumerate(segments, start=1):
+        x0, y0, x1, y1 = segment["bbox"]
+        draw.rectangle((x0, y0, x1, y1), outline=color, width=line_width)
+        draw.text((x0 + 2, max(0, y0 - 12)), str(number), fill=color)
+    return annotated
+
+
+def recognize_page(image: Image.Image, recognize_crops, padding: int = 8, **segmentation_options) -> dict:
+    """
+    Сегментирует страницу и распознает все фрагменты одним вызовом recognize_crops.
+
+    Args:
+        image: Предобработанное изображение страницы (PIL Image)
+        recognize_crops: Функция list[PIL Image] -> list[dict] с результатами в порядке фрагментов
+                         (батч локальной модели, HF API, планировщик или пул процессов)
+        padding: Поля вокруг фрагментов
+        **segmentation_options: Параметры segment_page
+
+    Returns:
+        dict: {"segments": [{"bbox", "line", "column", "crop", "latex", "confidence", ...}],
+               "timing": {"segmentation_ms", "inference_ms"}}
+    """
+    start = time.perf_counter()
+    with span("segmentation") as segmentation_span:
+        segments = segment_page(image, **segmentation_options)
+        crops = crop_segments(image, segments, padding)
+        segmentation_span.set(segments=len(segments))
+    segmentation_ms = (time.perf_counter() - start) * 1000
+
+    inference_start = time.perf_counter()
+    results = recognize_crops(crops) if crops else []
+    inference_ms = (time.perf_counter() - inference_start) * 1000
+
+    return {
+        "segments": [
+            dict(segment, crop=crop, **result) for segment, crop, result in zip(segments, crops, results)
+        ],
+        "timing": {"segmentation_ms": segmentation_ms, "inference_ms": inference_ms},
+    }
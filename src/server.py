@@ -0,0 +1,329 @@
+"""
+HTTP-сервис распознавания без Streamlit (tornado).
+
+Эндпоинты:
+    POST /recognize        - одно изображение (тело запроса - байты изображения
+                             или multipart-поле "image")
+    POST /recognize/batch  - несколько изображений (multipart-поля "images")
+    GET  /health           - сервис жив (200 всегда)
+    GET  /ready            - модель загружена и прогрета (200/503)
+
+Параметры генерации и предобработки передаются в query string:
+max_length, num_beams, adaptive, confidence_threshold, inversion, binarization.
+Ответ: {"latex", "confidence", "num_beams", "timing": {"preprocess_ms", "inference_ms", "total_ms"}}.
+
+Генерация выполняется вне event loop: в пуле потоков, в планировщике
+микро-батчинга (--batching) или в пуле процессов (--workers N).
+
+Пример:
+    python -m src.server --port 8000 --model trocr1-5ep
+    curl -X POST --data-binary @formula.png "http://localhost:8000/recognize?num_beams=4"
+"""
+import argparse
+import asyncio
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.ioloop
+import tornado.web
+from PIL import Image, UnidentifiedImageError
+
+from src.background_loader import BackgroundModelLoader
+from src.ingestion import ImageTooLarge, load_image_bounded
+from src.preprocessing import preprocess_image
+from src.runtime import add_model_arguments, resolve_model_args
+from src.worker_pool import WorkerPoolBusy
+
+
+class ServiceState:
+    """
+    Общие объекты сервиса: загрузчик модели и исполнитель инференса.
+    """
+
+    def __init__(self, loader: BackgroundModelLoader, threads: int = 2, batching: bool = False,
+                 max_batch_size: int = 8, max_wait_ms: float = 20.0, workers: int = 0,
+                 max_queue_size: int = 32):
+        self.loader = loader
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="recognize")
+        self.batching = batching
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.scheduler = None
+        self.started_at = time.time()
+
+    def build_scheduler(self):
+        """
+        Создает планировщик или пул процессов для загруженной модели (один раз, вне обработки запросов).
+        """
+        processor, model = self.loader.result()
+        if self.workers > 0:
+            from src.worker_pool import InferenceWorkerPool
+            self.scheduler = InferenceWorkerPool(
+                self.loader.model_path, self.loader.quantization, num_workers=self.workers,
+                max_queue_size=self.max_queue_size, shared_model=(processor, model)
+            )
+        elif self.batching:
+            from src.batching import MicroBatchScheduler
+            self.scheduler = MicroBatchScheduler(
+                processor, model, max_batch_size=self.max_batch_size, max_wait_ms=self.max_wait_ms
+            )
+
+    def is_ready(self) -> bool:
+        """
+        Модель загружена и, если включен, создан планировщик или пул процессов.
+        """
+        needs_scheduler = self.workers > 0 or self.batching
+        return self.loader.is_ready() and (self.scheduler is not None or not needs_scheduler)
+
+
+# Допустимые диапазоны параметров генерации (вне диапазона generate завершается ошибкой)
+MAX_LENGTH_RANGE = (1, 512)
+NUM_BEAMS_RANGE = (1, 16)
+
+
+def parse_generation_args(handler: tornado.web.RequestHandler) -> tuple:
+    """
+    Читает параметры генерации и предобработки из query string.
+
+    Returns:
+        tuple: (generation dict, preprocessing dict)
+    """
+    def flag(name: str, default: bool) -> bool:
+        return handler.get_query_argument(name, str(default)).lower() in ("1", "true", "yes")
+
+    try:
+        generation = {
+            "max_length": int(handler.get_query_argument("max_length", "256")),
+            "num_beams": int(handler.get_query_argument("num_beams", "4")),
+            "adaptive": flag("adaptive", False),
+            "confidence_threshold": float(handler.get_query_argument("confidence_threshold", "0.9")),
+        }
+    except ValueError as e:
+        raise tornado.web.HTTPError(400, f"Некорректный параметр генерации: {e}")
+    for name, (low, high) in (("max_length", MAX_LENGTH_RANGE), ("num_beams", NUM_BEAMS_RANGE)):
+        if not low <= generation[name] <= high:
+            raise tornado.web.HTTPError(400, f"{name} должен быть в диапазоне [{low}, {high}]")
+    if not 0.0 <= generation["confidence_threshold"] <= 1.0:
+        raise tornado.web.HTTPError(400, "confidence_threshold должен быть в диапазоне [0, 1]")
+    preprocessing = {
+        "apply_inversion": flag("inversion", False),
+        "apply_binarization": flag("binarization", False),
+    }
+    return generation, preprocessing
+
+
+def decode_image(data: bytes) -> Image.Image:
+    """
+    Декодирует байты изображения (PNG, JPEG, ...) в ограниченном разрешении
+    (см. src.ingestion.load_image_bounded).
+
+    Raises:
+        tornado.web.HTTPError: 400, если данные не являются изображением;
+                               413, если изображение слишком большое
+    """
+    try:
+        image, _ = load_image_bounded(io.BytesIO(data))
+        return image
+    except ImageTooLarge as e:
+        raise tornado.web.HTTPError(413, str(e))
+    except (UnidentifiedImageError, OSError) as e:
+        raise tornado.web.HTTPError(400, f"Не удалось прочитать изображение: {e}")
+
+
+class ServiceUnavailable(tornado.web.HTTPError):
+    """
+    503 с заголовком Retry-After (send_error сбрасывает заголовки, выставленные до исключения).
+    """
+
+    def __init__(self, retry_after: int, message: str):
+        super().__init__(503, message)
+        self.retry_after = retry_after
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, state: ServiceState):
+        self.state = state
+
+    def write_json(self, body, status: int = 200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(body, ensure_ascii=False))
+
+    def write_error(self, status_code: int, **kwargs):
+        # Текст ошибки передается в log_message: статусная строка HTTP допускает только ASCII
+        error = kwargs.get("exc_info", (None, None, None))[1]
+        message = error.log_message if isinstance(error, tornado.web.HTTPError) and error.log_message \
+            else self._reason
+        if isinstance(error, ServiceUnavailable):
+            self.set_header("Retry-After", str(error.retry_after))
+        self.write_json({"error": message}, status=status_code)
+
+    def ensure_ready(self):
+        if not self.state.is_ready():
+            raise ServiceUnavailable(5, f"Модель не готова: {self.state.loader.state}")
+
+    async def recognize(self, blobs: list, generation: dict, preprocessing: dict) -> list:
+        """
+        Декодирование, предобработка и распознавание вне event loop.
+
+        Args:
+            blobs: Байты изображений
+            generation: Параметры генерации
+            preprocessing: Параметры preprocess_image
+
+        Returns:
+            list: Результаты predict_latex_batch(return_details=True) с полем "timing"
+                  (preprocess_ms включает декодирование)
+        """
+        loop = asyncio.get_running_loop()
+        processor, model = self.state.loader.result()
+        start = time.perf_counter()
+
+        processed = await loop.run_in_executor(
+            self.state.executor,
+            lambda: [preprocess_image(decode_image(data), **preprocessing) for data in blobs]
+        )
+        preprocess_ms = (time.perf_counter() - start) * 1000
+
+        inference_start = time.perf_counter()
+        scheduler = self.state.scheduler
+        if scheduler is not None:
+            try:
+                # Все изображения принимаются или отклоняются сразу: event loop не ждет места в очереди
+                futures = scheduler.submit_many(processed, **generation)
+            except WorkerPoolBusy as e:
+                raise ServiceUnavailable(1, str(e))
+            results = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        else:
+            from src.inference import predict_latex_batch
+            results = await loop.run_in_executor(
+                self.state.executor,
+                lambda: predict_latex_batch(processed, processor, model, return_details=True, **generation)
+            )
+        inference_ms = (time.perf_counter() - inference_start) * 1000
+
+        total_ms = (time.perf_counter() - start) * 1000
+        return [
+            dict(
+                result,
+                timing={
+                    "preprocess_ms": preprocess_ms,
+                    "inference_ms": inference_ms,
+                    "total_ms": total_ms,
+                    "batch_size": len(blobs),
+                }
+            )
+            for result in results
+        ]
+
+
+class RecognizeHandler(BaseHandler):
+    async def post(self):
+        self.ensure_ready()
+        generation, preprocessing = parse_generation_args(self)
+
+        files = self.request.files.get("image")
+        data = files[0]["body"] if files else self.request.body
+        if not data:
+            raise tornado.web.HTTPError(400, "Пустое тело запроса: ожидается изображение")
+
+        results = await self.recognize([data], generation, preprocessing)
+        self.write_json(results[0])
+
+
+class RecognizeBatchHandler(BaseHandler):
+    async def post(self):
+        self.ensure_ready()
+        generation, preprocessing = parse_generation_args(self)
+
+        files = self.request.files.get("images", [])
+        if not files:
+            raise tornado.web.HTTPError(400, "Ожидаются multipart-поля images")
+
+        results = await self.recognize([file["body"] for file in files], generation, preprocessing)
+        for file, result in zip(files, results):
+            result["filename"] = file["filename"]
+        self.write_json({"results": results})
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write_json({"status": "ok", "uptime_s": time.time() - self.state.started_at})
+
+
+class ReadyHandler(BaseHandler):
+    def get(self):
+        status = self.state.loader.status()
+        body = {"ready": self.state.is_ready(), "state": status["state"],
+                "error": status["error"], "timings": status["timings"]}
+        scheduler = self.state.scheduler
+        if scheduler is not None and hasattr(scheduler, "health"):
+            body["workers"] = scheduler.health()
+            body["ready"] = body["ready"] and body["workers"]["ready"]
+        self.write_json(body, status=200 if body["ready"] else 503)
+
+
+def make_app(state: ServiceState) -> tornado.web.Application:
+    """
+    Создает tornado-приложение с эндпоинтами сервиса.
+    """
+    return tornado.web.Application([
+        (r"/recognize", RecognizeHandler, {"state": state}),
+        (r"/recognize/batch", RecognizeBatchHandler, {"state": state}),
+        (r"/health", HealthHandler, {"state": state}),
+        (r"/ready", ReadyHandler, {"state": state}),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP-сервис распознавания рукописных формул")
+    add_model_arguments(parser)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--threads", type=int, default=2, help="Потоки предобработки и инференса")
+    parser.add_argument("--batching", action="store_true", help="Микро-батчинг запросов")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=0, help="Процессы инференса (0 - в процессе сервера)")
+    parser.add_argument("--max-queue-size", type=int, default=32, help="Очередь пула процессов")
+    parser.add_argument("--no-warmup", action="store_true", help="Не выполнять прогрев модели")
+    parser.add_argument("--max-body-mb", type=float, default=20.0, help="Максимальный размер запроса")
+    args = parser.parse_args()
+
+    model_path, quantization = resolve_model_args(args)
+    loader = BackgroundModelLoader(model_path, quantization, warmup=not args.no_warmup)
+    state = ServiceState(
+        loader,
+        threads=args.threads,
+        batching=args.batching,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        workers=args.workers,
+        max_queue_size=args.max_queue_size,
+    )
+
+    if args.workers > 0:
+        # Процессы-воркеры создаются fork'ом до запуска event loop и пула потоков,
+        # поэтому сервис начинает принимать запросы после загрузки модели
+        print(f"Загрузка модели {model_path} перед запуском воркеров...")
+        loader.start().wait()
+        if not loader.is_ready():
+            raise SystemExit(f"Не удалось загрузить модель: {loader.error}")
+        state.build_scheduler()
+    else:
+        # Планировщик микро-батчинга (поток, без fork) создается сразу после загрузки модели
+        loader.on_ready = lambda _: state.build_scheduler()
+        loader.start()
+
+    app = make_app(state)
+    app.listen(args.port, args.host, max_body_size=int(args.max_body_mb * 2**20))
+    print(f"Сервис распознавания: http://{args.host}:{args.port} (модель {model_path} загружается в фоне)")
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
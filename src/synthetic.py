@@ -0,0 +1,38 @@
+"""
+Синтетические изображения формул для бенчмарков и проверок без набора данных.
+Не зависит от torch и transformers (используется и в режиме HF API).
+"""
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def synthetic_formula_image(height: int, width: int, seed: int = 0) -> Image.Image:
+    """
+    Генерирует детерминированное изображение, похожее на рукописную формулу:
+    несколько ломаных черных штрихов на белом фоне.
+
+    Args:
+        height: Высота изображения
+        width: Ширина изображения
+        seed: Зерно генератора
+
+    Returns:
+        PIL Image в формате RGB
+    """
+    rng = np.random.default_rng(seed)
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    stroke_width = max(2, min(height, width) // 60)
+
+    symbols = int(rng.integers(4, 12))
+    for i in range(symbols):
+        x = width * (i + 0.5) / symbols
+        y = height / 2
+        points = [(x, y)]
+        for _ in range(int(rng.integers(3, 8))):
+            x += rng.normal(0, width / symbols / 4)
+            y += rng.normal(0, height / 8)
+            points.append((float(np.clip(x, 0, width - 1)), float(np.clip(y, 0, height - 1))))
+        draw.line(points, fill="black", width=stroke_width)
+
+    return image
@@ -0,0 +1,270 @@
+"""
+Легковесная трассировка этапов распознавания.
+
+Спаны - контекстные менеджеры, записывающие wall time, CPU time потока и
+произвольные атрибуты (формы тензоров, число сгенерированных токенов).
+Корневая трасса пишется одной JSON-строкой в лог-файл и может быть показана в UI.
+
+Когда трассировка выключена, trace()/span() возвращают общий no-op объект:
+накладные расходы - одна проверка флага.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+
+logger = logging.getLogger("hmer.trace")
+logger.propagate = False
+
+_enabled = False
+_log_path = None
+_current_trace = contextvars.ContextVar("hmer_current_trace", default=None)
+
+
+def configure_tracing(enabled: bool, log_path: str = "logs/traces.jsonl"):
+    """
+    Включает или выключает трассировку и настраивает файл структурированного лога.
+
+    Args:
+        enabled: Включить трассировку
+        log_path: Путь к JSONL файлу трасс (None - без записи в файл)
+    """
+    global _enabled, _log_path
+    _enabled = enabled
+
+    if not enabled or log_path == _log_path:
+        return
+
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    _log_path = log_path
+    if log_path:
+        Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.FileHandler(log_path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+
+def is_tracing_enabled() -> bool:
+    return _enabled
+
+
+class _NoopSpan:
+    """
+    Заглушка, возвращаемая при выключенной трассировке.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def to_dict(self):
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """
+    Вложенный спан активной трассы.
+    """
+
+    def __init__(self, owner: "Trace", name: str, attributes: dict):
+        self.owner = owner
+        self.name = name
+        self.attributes = attributes
+        self.record = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.record = {
+            "name": self.name,
+            "depth": self.owner.depth,
+            "start_ms": (time.perf_counter() - self.owner.wall_start) * 1000,
+        }
+        self.owner.spans.append(self.record)
+        self.owner.depth += 1
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record["wall_ms"] = (time.perf_counter() - self._wall_start) * 1000
+        self.record["cpu_ms"] = (time.thread_time() - self._cpu_start) * 1000
+        self.record.update(self.attributes)
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        self.owner.depth -= 1
+        return False
+
+
+class Trace:
+    """
+    Корневая трасса: собирает спаны текущего контекста и пишет их в лог при завершении.
+    """
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.spans = []
+        self.depth = 0
+        self.wall_ms = None
+        self.cpu_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_span(self, name: str, wall_ms: float, **attributes):
+        """
+        Добавляет уже измеренный спан (например, из forward-хуков модели).
+        """
+        record = {"name": name, "depth": self.depth, "wall_ms": wall_ms}
+        record.update(attributes)
+        self.spans.append(record)
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_ms = (time.perf_counter() - self.wall_start) * 1000
+        self.cpu_ms = (time.thread_time() - self._cpu_start) * 1000
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        _current_trace.reset(self._token)
+
+        if logger.handlers:
+            logger.info(json.dumps(self.to_dict(), ensure_ascii=False, default=str))
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "wall_ms": self.wall_ms,
+            "cpu_ms": self.cpu_ms,
+            "attributes": self.attributes,
+            "spans": self.spans,
+        }
+
+
+def trace(name: str, **attributes):
+    """
+    Начинает корневую трассу (или вложенный спан, если трасса уже активна).
+
+    Args:
+        name: Имя трассы
+        **attributes: Атрибуты (ключ модели, источник изображения и т.п.)
+
+    Returns:
+        Контекстный менеджер Trace / Span (no-op при выключенной трассировке)
+    """
+    if not _enabled:
+        return _NOOP
+    current = _current_trace.get()
+    if current is not None:
+        return Span(current, name, attributes)
+    return Trace(name, attributes)
+
+
+def span(name: str, **attributes):
+    """
+    Спан этапа внутри активной трассы (no-op, если трассировка выключена или трасса не начата).
+
+    Args:
+        name: Имя этапа
+        **attributes: Атрибуты этапа
+
+    Returns:
+        Контекстный менеджер Span
+    """
+    if not _enabled:
+        return _NOOP
+    current = _current_trace.get()
+    if current is None:
+        return _NOOP
+    return Span(current, name, attributes)
+
+
+class ModuleTimer:
+    """
+    Измеряет суммарное время forward-вызовов модуля через хуки
+    (например, энкодера внутри model.generate) и добавляет спан в трассу.
+    Хуки общие для модуля, поэтому вызовы из других потоков (других сессий) игнорируются.
+    """
+
+    def __init__(self, module, name: str):
+        self.module = module
+        self.name = name
+        self.wall_ms = 0.0
+        self.calls = 0
+        self._handles = []
+
+    def _pre_hook(self, module, inputs):
+        if threading.get_ident() == self._thread_id:
+            self._start = time.perf_counter()
+
+    def _post_hook(self, module, inputs, output):
+        if threading.get_ident() != self._thread_id:
+            return
+        self.wall_ms += (time.perf_counter() - self._start) * 1000
+        self.calls += 1
+        hidden = getattr(output, "last_hidden_state", None)
+        if hidden is not None:
+            self.output_shape = list(hidden.shape)
+
+    def __enter__(self):
+        self._owner = _current_trace.get()
+        self._thread_id = threading.get_ident()
+        self._handles = [
+            self.module.register_forward_pre_hook(self._pre_hook),
+            self.module.register_forward_hook(self._post_hook),
+        ]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        if self.calls:
+            self._owner.add_span(
+                self.name, self.wall_ms, calls=self.calls,
+                output_shape=getattr(self, "output_shape", None)
+            )
+        return False
+
+
+def time_module(module, name: str):
+    """
+    Возвращает ModuleTimer для модуля (no-op, если трассировка выключена или трасса не начата).
+
+    Args:
+        module: torch.nn.Module (например, model.encoder)
+        name: Имя спана
+    """
+    if not _enabled or _current_trace.get() is None:
+        return _NOOP
+    return ModuleTimer(module, name)
+
+
+def current_trace():
+    """
+    Возвращает активную трассу текущего контекста (или None).
+    """
+    return _current_trace.get() if _enabled else None
@@ -0,0 +1,226 @@
+import time
+
+import streamlit as st
+
+from src.export import EXPORT_FORMATS, export_results
+from src.model_loader import get_job_queue, get_secrets_section
+
+
+JOB_STATE_LABELS = {
+    "queued": "в очереди",
+    "running": "обработка",
+    "done": "готово",
+    "cancelled": "отменено",
+    "error": "ошибка",
+}
+
+
+def make_batch_recognizer(processor, model, scheduler=None):
+    """
+    Создает функцию распознавания батча для фонового задания.
+    Функция выполняется в потоке очереди заданий, поэтому не использует st.* вызовы.
+
+    Args:
+        processor: TrOCRProcessor (или None в режиме HF API)
+        model: VisionEncoderDecoderModel (или None в режиме HF API)
+        scheduler: MicroBatchScheduler или InferenceWorkerPool (опционально)
+
+    Returns:
+        callable(images, generation) -> list[dict]; ошибка отдельного изображения
+        возвращается исключением на месте его результата (см. src.jobs)
+    """
+    if model is None:
+        from src.inference_hf import get_configured_client
+
+        # Клиент создается в потоке скрипта (st.secrets и st.cache_resource)
+        client = get_configured_client()
+
+        def recognize_hf(images: list, generation: dict) -> list:
+            # Неудачный запрос - ошибка своего файла, а не всего батча
+            return [
+                latex if isinstance(latex, Exception) else {"latex": latex, "confidence": None, "num_beams": None}
+                for latex in client.predict_many(images, max_workers=4, return_exceptions=True)
+            ]
+
+        return recognize_hf
+
+    if scheduler is not None:
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        from src.worker_pool import WorkerPoolError
+
+        # Как InferenceWorkerPool.predict: зависший воркер не блокирует поток очереди навсегда
+        request_timeout = getattr(scheduler, "request_timeout", None)
+        timeout = request_timeout * 2 if request_timeout else None
+
+        def recognize_scheduled(images: list, generation: dict) -> list:
+            futures = scheduler.submit_many(images, **generation)
+            deadline = time.monotonic() + timeout if timeout else None
+            results = []
+            for future in futures:
+                try:
+                    remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    results.append(future.result(timeout=remaining))
+                except (WorkerPoolError, FutureTimeoutError) as e:
+                    # Еще не начатая задача отменяется, ошибка относится только к своему файлу
+                    future.cancel()
+                    results.append(e)
+            return results
+
+        return recognize_scheduled
+
+    from src.inference import predict_latex_batch
+
+    def recognize_local(images: list, generation: dict) -> list:
+        return predict_latex_batch(
+            images, processor, model, max_batch_size=len(images), return_details=True, **generation
+        )
+
+    return recognize_local
+
+
+def render_bulk_upload(processor, model, generation: dict, preprocessing: dict, scheduler=None):
+    """
+    Пакетный режим: загрузка нескольких файлов и их распознавание фоновым заданием.
+    Идентификатор задания хранится в session state, поэтому уход на другую вкладку
+    не прерывает обработку.
+
+    Args:
+        processor: TrOCRProcessor (или None в режиме HF API)
+        model: VisionEncoderDecoderModel (или None в режиме HF API)
+        generation: Параметры генерации (см. render_generation_settings)
+        preprocessing: Параметры preprocess_bounded (apply_inversion, apply_binarization, crop_to_ink)
+        scheduler: MicroBatchScheduler или InferenceWorkerPool (опционально)
+    """
+    job_queue = get_job_queue()
+    max_files = int(get_secrets_section("jobs").get("max_files", 500))
+
+    uploaded_files = st.file_uploader(
+        "Выберите изображения (PNG, JPEG)",
+        type=["png", "jpg", "jpeg"],
+        accept_multiple_files=True,
+        key="bulk_uploader"
+    )
+    too_many = len(uploaded_files or []) > max_files
+    if too_many:
+        st.warning(f"Слишком много файлов: {len(uploaded_files)} (максимум {max_files})")
+
+    if st.button("Запустить обработку", type="primary", key="bulk_start",
+                 disabled=not uploaded_files or too_many):
+        generation = {key: value for key, value in generation.items() if key != "streaming"}
+        job = job_queue.submit(
+            [(uploaded_file.name, uploaded_file) for uploaded_file in uploaded_files],
+            make_batch_recognizer(processor, model, scheduler),
+            generation,
+            preprocessing
+        )
+        st.session_state.bulk_job_id = job.id
+        st.session_state.bulk_page = 1
+
+    job_id = st.session_state.get("bulk_job_id")
+    if job_id is None:
+        return
+    if job_queue.get(job_id) is None:
+        st.info("Результаты предыдущего задания больше недоступны")
+        return
+
+    render_job(job_queue, job_id)
+
+
+@st.fragment(run_every=1.0)
+def render_job(job_queue, job_id: str):
+    """
+    Прогресс и результаты задания. Фрагмент обновляется раз в секунду,
+    не перерисовывая остальное приложение.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return
+    status = job.status()
+
+    st.markdown("---")
+    label = JOB_STATE_LABELS.get(status["state"], status["state"])
+    progress = status["completed"] / status["total"] if status["total"] else 1.0
+    st.progress(progress, text=f"{label.capitalize()}: {status['completed']} из {status['total']}")
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Скорость", f"{status['throughput_per_s']:.2f} файл/с")
+    with col2:
+        st.metric("Осталось", f"{status['eta_s']:.0f} с" if status["eta_s"] is not None else "-")
+    with col3:
+        st.metric("Ошибки", status["failed"])
+    with col4:
+        if not job.is_finished():
+            if st.button("Отменить", key="bulk_cancel", disabled=job.cancelled, use_container_width=True):
+                job.cancel()
+    if status["error"]:
+        st.error(f"Задание завершилось с ошибкой: {status['error']}")
+
+    render_job_results(job, status)
+
+
+def render_job_results(job, status: dict):
+    """
+    Постраничный просмотр результатов и скачивание (после завершения задания).
+    """
+    page_size = int(get_secrets_section("jobs").get("page_size", 20))
+    pages = max(1, -(-status["completed"] // page_size))
+    if st.session_state.get("bulk_page", 1) > pages:
+        st.session_state.bulk_page = pages
+
+    page = st.number_input("Страница", min_value=1, max_value=pages, key="bulk_page")
+    rows = job.rows(offset=(page - 1) * page_size, limit=page_size)
+    if rows:
+        st.dataframe(
+            [
+                {
+                    "Файл": row["file"],
+                    "LaTeX": row["latex"],
+                    "Уверенность": row["confidence"],
+                    "Ошибка": row["error"],
+                }
+                for row in rows
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+        with st.expander("Рендеринг формул страницы"):
+            for row in rows:
+                if row["latex"] is None:
+                    continue
+                st.caption(row["file"])
+                try:
+                    st.latex(row["latex"])
+                except Exception:
+                    st.text(row["latex"])
+
+    if not job.is_finished() or not status["completed"]:
+        return
+
+    st.markdown("### Экспорт:")
+    columns = st.columns(len(EXPORT_FORMATS))
+    for column, (fmt, (mime, extension)) in zip(columns, EXPORT_FORMATS.items()):
+        with column:
+            st.download_button(
+                label=f"Скачать {fmt.upper()}",
+                data=job_export(job, fmt),
+                file_name=f"recognition_{job.id}{extension}",
+                mime=mime,
+                key=f"bulk_download_{fmt}",
+                use_container_width=True
+            )
+
+
+def job_export(job, fmt: str) -> bytes:
+    """
+    Экспорт завершенного задания; собирается один раз на задание и формат,
+    а не при каждом обновлении фрагмента.
+    """
+    exports = st.session_state.setdefault("bulk_exports", {})
+    key = (job.id, fmt)
+    if key not in exports:
+        # Хранятся только экспорты текущего задания
+        for stale in [item for item in exports if item[0] != job.id]:
+            del exports[stale]
+        exports[key] = export_results(job.rows(), fmt).getvalue()
+    return exports[key]
@@ -40,6 +40,9 @@ def render_sidebar() -> str:
 
         st.sidebar.metric("Avg Edit Distance", f"{model_info['metrics']['avg_edit_distance']:.2f}")
 
+    if model_info and model_info.get("quantization"):
+        st.sidebar.caption(f"Квантование: {model_info['quantization']} (CPU-инференс)")
+
     # Описание приложения
     st.sidebar.markdown("---")
     st.sidebar.markdown("### О приложении")
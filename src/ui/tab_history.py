@@ -0,0 +1,129 @@
+import datetime
+
+import streamlit as st
+
+from src.model_loader import get_history
+
+
+HISTORY_PAGE_SIZES = [20, 50, 100]
+
+
+def reset_history_pages():
+    st.session_state.history_cursors = [None]
+
+
+def history_page(history, before_id, page_size: int, model_key: str = None) -> tuple:
+    """
+    Страница истории и признак того, что за ней есть более старые записи
+    (запрашивается на одну запись больше размера страницы).
+    """
+    rows = history.page(before_id=before_id, limit=page_size + 1, model_key=model_key)
+    return rows[:page_size], len(rows) > page_size
+
+
+def render_history_tab():
+    """
+    Рендерит вкладку с постоянной историей распознаваний (общей для всех сессий).
+    Страницы листаются по курсору (id последней записи), поэтому просмотр
+    не замедляется с ростом истории.
+    """
+    st.header("История распознаваний")
+
+    history = get_history()
+    if history is None:
+        st.info("История распознаваний выключена (секция [history] в secrets)")
+        return
+
+    stats = history.stats()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Записей", stats["records"])
+    with col2:
+        st.metric("Ответов из истории", stats["hits"])
+    with col3:
+        st.metric("Новых распознаваний", stats["misses"])
+
+    # Стек курсоров: первый элемент - самые новые записи, далее id последней записи каждой страницы
+    if "history_cursors" not in st.session_state:
+        reset_history_pages()
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        model_key = st.selectbox(
+            "Модель",
+            [None] + history.model_keys(),
+            format_func=lambda key: "Все модели" if key is None else key,
+            key="history_model",
+            on_change=reset_history_pages
+        )
+    with col2:
+        page_size = st.selectbox("Записей на странице", HISTORY_PAGE_SIZES, key="history_page_size",
+                                 on_change=reset_history_pages)
+
+    cursors = st.session_state.history_cursors
+    rows, has_older = history_page(history, cursors[-1], page_size, model_key)
+    if rows:
+        render_history_table(rows)
+    else:
+        st.info("История пуста")
+
+    # Навигация по страницам (и на пустой странице, чтобы с нее можно было вернуться)
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if st.button("← Новее", key="history_newer", disabled=len(cursors) == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button("Старее →", key="history_older", disabled=not has_older, use_container_width=True):
+            cursors.append(rows[-1]["id"])
+            st.rerun()
+    with col3:
+        st.caption(f"Страница {len(cursors)}")
+
+    if rows:
+        render_history_record(history, rows)
+
+
+def render_history_table(rows: list):
+    st.dataframe(
+        [
+            {
+                "ID": row["id"],
+                "Время": datetime.datetime.fromtimestamp(row["created_at"]).strftime("%Y-%m-%d %H:%M:%S"),
+                "Модель": row["model_key"],
+                "Источник": row["source"],
+                "LaTeX": row["latex"],
+                "Уверенность": row["confidence"],
+                "Время, мс": row["latency_ms"],
+                "Ground truth": row["ground_truth"],
+            }
+            for row in rows
+        ],
+        use_container_width=True,
+        hide_index=True
+    )
+
+
+def render_history_record(history, rows: list):
+    """
+    Просмотр записи текущей страницы и редактирование ее ground truth.
+    """
+    st.markdown("---")
+    records = {row["id"]: row for row in rows}
+    record_id = st.selectbox("Запись", list(records), key="history_record")
+    record = records[record_id]
+
+    st.code(record["latex"], language="latex")
+    try:
+        st.latex(record["latex"])
+    except Exception:
+        st.text(record["latex"])
+
+    ground_truth = st.text_input(
+        "Ground truth",
+        value=record["ground_truth"] or "",
+        key=f"history_gt_{record_id}"
+    )
+    if st.button("Сохранить", key="history_gt_save", type="primary"):
+        history.set_ground_truth(record_id, ground_truth)
+        st.rerun()
@@ -1,15 +1,30 @@
 import streamlit as st
-from streamlit_drawable_canvas import st_canvas
-from PIL import Image
+from PIL import UnidentifiedImageError
 import numpy as np
-
-from src.model_loader import load_model_and_processor, get_model_info
-from src.preprocessing import preprocess_image
-from src.inference import predict_latex_unified
+import logging
+import time
+
+from src.model_loader import (
+    get_model_loader, get_model_pool, get_model_info, get_batch_scheduler, get_recognition_cache,
+    get_encoder_cache, get_history, get_secrets_section, get_worker_pool
+)
+from src.preprocessing import preprocess_array
+from src.cache import image_hash
+from src.ingestion import (
+    DEFAULT_MAX_PIXELS, DEFAULT_MAX_SOURCE_PIXELS, ImageTooLarge, load_image_bounded, preprocess_bounded
+)
+from src.inference import (
+    predict_latex_unified, predict_latex_batch, predict_latex_cached, predict_latex_stream, predict_nbest,
+    get_encoder_states
+)
 #from src.inference import predict_latex
 from src.metrics import compute_metrics
 from src.export import create_download_button_data
+from src.ui.bulk_upload import render_bulk_upload
+from src.tracing import configure_tracing, span, trace
+
 
+logger = logging.getLogger(__name__)
 
 def render_recognition_tab(selected_model_key: str):
     """
@@ -27,23 +42,399 @@ def render_recognition_tab(selected_model_key: str):
         st.error("Не удалось загрузить информацию о модели")
         return
 
-    processor, model = load_model_and_processor(model_info["path"])
+    # Модель загружается и прогревается в фоне, пока интерфейс уже отрисован
+    loader = get_model_loader(selected_model_key, model_info["path"], model_info.get("quantization"))
+    if loader is not None:
+        render_model_pool_status(get_model_pool())
+        if not loader.is_ready():
+            render_model_startup(loader)
+            return
+        render_startup_timings(loader)
+        processor, model = loader.result()
+    else:
+        # HF API режим - локальная модель не нужна
+        processor, model = None, None
+
+    # Инференс в пуле процессов (если включен в secrets) или межсессионный микро-батчинг
+    worker_pool = get_worker_pool(
+        selected_model_key, model_info["path"], model_info.get("quantization"), processor, model
+    )
+    if worker_pool is not None:
+        scheduler = worker_pool
+        render_worker_pool_status(worker_pool)
+    else:
+        scheduler = get_batch_scheduler(selected_model_key, processor, model)
+        if scheduler is not None:
+            render_batching_stats(scheduler)
+
+    # Кеш результатов распознавания
+    cache = get_recognition_cache()
+    if cache is not None:
+        render_cache_stats(cache)
+
+    # Кеш выходов энкодера (повторное декодирование и альтернативы без энкодера)
+    encoder_cache = get_encoder_cache(selected_model_key) if model is not None else None
+    if encoder_cache is not None:
+        render_encoder_cache_stats(encoder_cache)
+
+    # Трассировка этапов (секция [tracing] в secrets)
+    tracing_config = get_secrets_section("tracing")
+    configure_tracing(
+        bool(tracing_config.get("enabled", False)),
+        tracing_config.get("log_path", "logs/traces.jsonl")
+    )
+
+    # Параметры генерации
+    generation = render_generation_settings()
+    if scheduler is not None:
+        # Потоковый вывод использует модель текущего процесса в обход воркеров и микро-батчинга
+        generation["streaming"] = False
 
     # Создание подтабов
     subtab1, subtab2 = st.tabs(["Рисование формулы", "Загрузка изображения"])
 
     with subtab1:
-        render_canvas_subtab(processor, model)
+        render_canvas_subtab(processor, model, selected_model_key, generation, scheduler)
 
     with subtab2:
-        render_upload_subtab(processor, model)
+        render_upload_subtab(processor, model, selected_model_key, generation, scheduler)
+
+
+STARTUP_PHASES = {
+    "ready": "готова",
+    "error": "ошибка",
+    "pending": "ожидание",
+    "download": "загрузка файлов модели",
+    "load": "загрузка весов",
+    "warmup": "прогрев",
+}
+
+
+@st.fragment(run_every=1.0)
+def render_model_startup(loader):
+    """
+    Показывает состояние фоновой загрузки модели и перезапускает страницу, когда модель готова.
+    Фрагмент опрашивает загрузчик раз в секунду, не перерисовывая остальное приложение.
+    """
+    status = loader.status()
+
+    if status["state"] == "ready":
+        st.rerun()
+
+    if status["state"] == "error":
+        st.error(f"Ошибка загрузки модели: {status['error']}")
+        st.info(f"Проверьте, что модель находится в папке: {loader.model_path}")
+        return
+
+    phase = STARTUP_PHASES.get(status["state"], status["state"])
+    elapsed = (status["elapsed_ms"] or 0) / 1000
+    st.info(f"Модель прогревается: {phase}... ({elapsed:.0f} с)")
+
+    finished = [
+        f"{STARTUP_PHASES[key[:-3]]}: {value / 1000:.1f} с"
+        for key, value in status["timings"].items() if key[:-3] in STARTUP_PHASES
+    ]
+    if finished:
+        st.caption("Завершено - " + ", ".join(finished))
+
+
+def render_startup_timings(loader):
+    """
+    Отображает длительность фаз запуска модели в сайдбаре.
+    """
+    timings = loader.status()["timings"]
+    with st.sidebar.expander("Запуск модели"):
+        for key in ("download_ms", "load_ms", "warmup_ms", "total_ms"):
+            if key in timings:
+                label = STARTUP_PHASES.get(key[:-3], "всего").capitalize()
+                st.caption(f"{label}: {timings[key] / 1000:.2f} с")
+
+
+def render_model_pool_status(pool):
+    """
+    Отображает модели, находящиеся в памяти, и занятый объем в сайдбаре.
+    """
+    stats = pool.stats()
+    budget = f" из {stats['budget_mb']:.0f}" if stats["budget_mb"] else ""
+    with st.sidebar.expander(f"Модели в памяти: {stats['models']}"):
+        st.caption(f"Занято: {stats['used_mb']:.0f}{budget} МБ, выгрузок: {stats['evictions']}")
+        for item in pool.resident():
+            size = f"{item['size_mb']:.0f} МБ" + ("" if item["size_measured"] else " (оценка)")
+            shared = ", общий процессор" if item["shared_processor"] else ""
+            st.caption(f"{item['model_key']}: {size}, {STARTUP_PHASES.get(item['state'], item['state'])}{shared}")
+
+
+def render_generation_settings() -> dict:
+    """
+    Рендерит настройки генерации (beam search и адаптивный режим).
+
+    Returns:
+        dict: {"max_length": int, "num_beams": int, "adaptive": bool,
+               "confidence_threshold": float, "streaming": bool}
+    """
+    with st.expander("Настройки генерации"):
+        col1, col2 = st.columns(2)
+        with col1:
+            num_beams = st.slider("Количество лучей (beam search)", 1, 8, 4, key="generation_num_beams")
+            max_length = st.number_input(
+                "Максимальная длина", min_value=16, max_value=512, value=256, step=16,
+                key="generation_max_length"
+            )
+        with col2:
+            adaptive = st.checkbox(
+                "Адаптивный beam search",
+                value=True,
+                key="generation_adaptive",
+                help="Сначала greedy-декодирование; beam search запускается только при низкой уверенности"
+            )
+            confidence_threshold = st.slider(
+                "Порог уверенности", 0.5, 1.0, 0.9, 0.01,
+                key="generation_confidence_threshold",
+                disabled=not adaptive
+            )
+            streaming = st.checkbox(
+                "Потоковый вывод",
+                value=True,
+                key="generation_streaming",
+                help="Показывать LaTeX по мере генерации токенов (greedy-проход адаптивного режима "
+                     "или num_beams = 1; недоступно в режиме HF API, при микро-батчинге и в пуле процессов)"
+            )
+
+    return {
+        "max_length": int(max_length),
+        "num_beams": num_beams,
+        "adaptive": adaptive,
+        "confidence_threshold": confidence_threshold,
+        "streaming": streaming
+    }
+
+
+def render_batching_stats(scheduler):
+    """
+    Рендерит в сайдбаре статистику микро-батчинга для подбора его параметров.
+    """
+    stats = scheduler.stats()
+    with st.sidebar.expander("Микро-батчинг"):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Запросов", stats["total_requests"])
+        with col2:
+            st.metric("Батчей", stats["total_batches"])
+        st.metric("Средний размер батча", f"{stats['avg_batch_size']:.2f}")
+
+        if stats["batch_size_hist"]:
+            st.markdown("Размеры батчей:")
+            st.bar_chart({"Батчей": stats["batch_size_hist"]})
+        if stats["queue_depth_hist"]:
+            st.markdown("Глубина очереди при постановке:")
+            st.bar_chart({"Запросов": stats["queue_depth_hist"]})
+
+
+def render_worker_pool_status(worker_pool):
+    """
+    Рендерит в сайдбаре состояние пула процессов инференса.
+    """
+    health = worker_pool.health()
+    with st.sidebar.expander(f"Воркеры: {health['alive']}/{len(health['workers'])}"):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("В очереди", health["queue_depth"] if health["queue_depth"] is not None else "-")
+        with col2:
+            st.metric("Отклонено", health["rejected"])
+        for worker in health["workers"]:
+            state = "занят" if worker["busy"] else ("готов" if worker["ready"] else "запуск")
+            if not worker["alive"]:
+                state = "перезапуск"
+            cpus = f", ядра {worker['cpus']}" if worker["cpus"] else ""
+            st.caption(
+                f"#{worker['worker_id']} (pid {worker['pid']}): {state}, "
+                f"обработано {worker['processed']}, перезапусков {worker['restarts']}{cpus}"
+            )
+
+
+def render_encoder_cache_stats(encoder_cache):
+    """
+    Рендерит в сайдбаре статистику кеша выходов энкодера.
+    """
+    stats = encoder_cache.stats()
+    with st.sidebar.expander("Кеш энкодера"):
+        st.metric("Hit rate", f"{stats['hit_rate'] * 100:.1f}%")
+        st.caption(
+            f"Изображений: {stats['size']} / {stats['max_size']}, {stats['memory_mb']:.0f} МБ, "
+            f"попаданий {stats['hits']}, промахов {stats['misses']}"
+        )
+
+
+def render_cache_stats(cache):
+    """
+    Рендерит в сайдбаре статистику кеша результатов распознавания.
+    """
+    stats = cache.stats()
+    with st.sidebar.expander("Кеш распознавания"):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Попадания", stats["hits"])
+        with col2:
+            st.metric("Промахи", stats["misses"])
+        st.metric("Hit rate", f"{stats['hit_rate'] * 100:.1f}%")
+        st.caption(f"Записей: {stats['size']} / {stats['max_size']}")
+        if st.button("Очистить кеш", key="recognition_cache_clear"):
+            cache.clear()
+            st.rerun()
+
+
+def recognize_image(processed_image, processor, model, model_key: str,
+                    generation: dict, scheduler=None, placeholder=None,
+                    source: str = None, preprocessing: dict = None) -> tuple:
+    """
+    Распознает предобработанное изображение через кеш результатов и постоянную историю.
+
+    Args:
+        processed_image: Предобработанное изображение (PIL Image или uint8 массив)
+        processor: TrOCRProcessor (или None в режиме HF API)
+        model: VisionEncoderDecoderModel (или None в режиме HF API)
+        model_key: Ключ выбранной модели (входит в ключ кеша)
+        generation: Параметры генерации (см. render_generation_settings)
+        scheduler: MicroBatchScheduler (опционально)
+        placeholder: st.empty() для потокового вывода LaTeX (опционально)
+        source: Источник изображения для истории ("canvas", "upload")
+        preprocessing: Флаги предобработки для истории (apply_inversion, apply_binarization)
+
+    Returns:
+        tuple: (словарь результата {"latex", "confidence", "num_beams", "latency_ms", "history_id", ...},
+                True если результат взят из кеша или истории)
+    """
+    generation = dict(generation)
+    streaming = generation.pop("streaming", False)
+    params = dict(generation, model_key=model_key)
+    # Выход энкодера переиспользуется только при инференсе в текущем процессе
+    encoder_cache = get_encoder_cache(model_key) if model is not None and scheduler is None else None
+    history = get_history()
+
+    def compute():
+        # Повторное изображение (в т.ч. из другой сессии или до перезапуска) - из истории
+        if history is not None:
+            digest = image_hash(processed_image)
+            record = history.lookup(digest, params)
+            if record is not None:
+                return {
+                    "latex": record["latex"],
+                    "confidence": record["confidence"],
+                    "num_beams": record["num_beams"],
+                    "latency_ms": record["latency_ms"],
+                    "history_id": record["id"],
+                    "ground_truth": record["ground_truth"],
+                    "from_history": True,
+                }
+
+        start = time.perf_counter()
+        # Стриминг возможен только для greedy-декодирования локальной модели без планировщика
+        can_stream = (
+            streaming and placeholder is not None and model is not None and scheduler is None
+            and (generation["adaptive"] or generation["num_beams"] == 1)
+        )
+        if can_stream:
+            result = stream_recognition(processed_image, processor, model, generation, placeholder, encoder_cache)
+        elif encoder_cache is not None:
+            result = predict_latex_cached(processed_image, processor, model, encoder_cache, **generation)
+        else:
+            result = predict_latex_unified(
+                processed_image, processor, model,
+                scheduler=scheduler, return_details=True, **generation
+            )
+        result["latency_ms"] = (time.perf_counter() - start) * 1000
+        if history is not None:
+            result["history_id"] = history.record(digest, params, result, source, preprocessing)
+        return result
+
+    cache = get_recognition_cache()
+    if cache is None:
+        result = compute()
+        return result, bool(result.get("from_history"))
+
+    result, from_cache = cache.get_or_compute(processed_image, params, compute)
+    return result, from_cache or bool(result.get("from_history"))
+
+
+def stream_recognition(processed_image, processor, model, generation: dict, placeholder,
+                       encoder_cache=None) -> dict:
+    """
+    Распознает изображение с потоковым выводом LaTeX в placeholder.
+    В адаптивном режиме при низкой уверенности greedy-результат уточняется beam search
+    (по тому же выходу энкодера, если задан encoder_cache).
+
+    Args:
+        processed_image: Предобработанное изображение
+        processor: TrOCRProcessor
+        model: VisionEncoderDecoderModel
+        generation: Параметры генерации (без "streaming")
+        placeholder: st.empty() для промежуточного вывода
+        encoder_cache: EncoderOutputCache модели (опционально)
+
+    Returns:
+        dict: Результат в формате predict_latex_unified(return_details=True) + "ttft_ms"
+    """
+    states = None
+    if encoder_cache is not None:
+        states, _ = get_encoder_states(processed_image, processor, model, encoder_cache)
+
+    details = {}
+    for partial_latex in predict_latex_stream(
+        processed_image, processor, model, generation["max_length"], details=details,
+        encoder_hidden_states=states
+    ):
+        placeholder.code(partial_latex, language="latex")
+
+    needs_beam = (
+        generation["adaptive"] and generation["num_beams"] > 1
+        and details["confidence"] < generation["confidence_threshold"]
+    )
+    if needs_beam:
+        placeholder.caption("Низкая уверенность - уточнение с помощью beam search...")
+        refined = predict_latex_cached(
+            processed_image, processor, model, encoder_cache,
+            max_length=generation["max_length"],
+            num_beams=generation["num_beams"]
+        )
+        refined["ttft_ms"] = details["ttft_ms"]
+        details = refined
+
+    placeholder.empty()
+    return details
+
 
 
+def make_alternatives_provider(processor, model, model_key: str, generation: dict):
+    """
+    Создает функцию поиска альтернативных гипотез для панели результатов
+    (None в режиме HF API: n-best требует локальной модели).
 
-def render_canvas_subtab(processor, model):
+    Returns:
+        callable(image, num_hypotheses, strategy) -> list[dict] (см. predict_nbest) или None
+    """
+    if model is None:
+        return None
+
+    def find_alternatives(image, num_hypotheses: int, strategy: str) -> list:
+        return predict_nbest(
+            image, processor, model,
+            num_hypotheses=num_hypotheses,
+            max_length=generation["max_length"],
+            num_beams=generation["num_beams"],
+            strategy=strategy,
+            encoder_cache=get_encoder_cache(model_key)
+        )
+
+    return find_alternatives
+
+
+def render_canvas_subtab(processor, model, model_key: str, generation: dict, scheduler=None):
     """
     Рендерит подтаб с Canvas для рисования.
     """
+    # Компонент canvas загружается только при открытии подтаба
+    from streamlit_drawable_canvas import st_canvas
+
     st.subheader("Нарисуйте математическое выражение")
 
     # Инициализация session state для ground truth
@@ -86,43 +477,58 @@ def render_canvas_subtab(processor, model):
 
     # Обработка результата
     if recognize_btn:
-        # Автоочистка поля ground truth при новом распознавании
+        # Автоочистка поля ground truth и альтернатив при новом распознавании
         st.session_state.canvas_gt = ""
+        st.session_state.pop("canvas_alternatives", None)
 
         if canvas_result.image_data is None or np.sum(canvas_result.image_data) == 0:
             st.warning("Canvas пустой. Нарисуйте формулу перед распознаванием.")
         else:
-            with st.spinner("Распознавание..."):
-                # Конвертация canvas в PIL Image
+            with st.spinner("Распознавание..."), \
+                    trace("recognition", source="canvas", model_key=model_key) as recognition_trace:
+                # Данные canvas обрабатываются как uint8 массив, без конвертации в PIL
                 img_data = canvas_result.image_data[:, :, 0:3].astype(np.uint8)
-                image = Image.fromarray(img_data, mode="RGB")
 
                 # Предобработка
-                processed_image = preprocess_image(
-                    image,
-                    apply_inversion=apply_inversion,
-                    apply_binarization=apply_binarization
+                with span("preprocess", shape=list(img_data.shape)):
+                    processed_image = preprocess_array(
+                        img_data,
+                        apply_inversion=apply_inversion,
+                        apply_binarization=apply_binarization
+                    )
+
+                # Инференс (с потоковым выводом LaTeX)
+                result, from_cache = recognize_image(
+                    processed_image, processor, model, model_key, generation, scheduler,
+                    placeholder=st.empty(),
+                    source="canvas",
+                    preprocessing={"apply_inversion": apply_inversion, "apply_binarization": apply_binarization}
                 )
 
-                # Инференс
-                latex = predict_latex_unified(processed_image, processor, model)
+                recognition_trace.set(from_cache=from_cache)
 
-                # Сохранение в session state
-                st.session_state.canvas_result = {
-                    "latex": latex,
-                    "image": processed_image
-                }
+            # Ground truth, сохраненный ранее для этого изображения в истории
+            if result.get("ground_truth"):
+                st.session_state.canvas_gt = result["ground_truth"]
+
+            # Сохранение в session state
+            st.session_state.canvas_result = dict(
+                result, image=processed_image, from_cache=from_cache,
+                trace=recognition_trace.to_dict()
+            )
 
     # Отображение результатов
     if "canvas_result" in st.session_state and st.session_state.canvas_result is not None:
         display_recognition_results(
             st.session_state.canvas_result["latex"],
             st.session_state.canvas_result["image"],
-            key_prefix="canvas"
+            key_prefix="canvas",
+            details=st.session_state.canvas_result,
+            alternatives=make_alternatives_provider(processor, model, model_key, generation)
         )
 
 
-def render_upload_subtab(processor, model):
+def render_upload_subtab(processor, model, model_key: str, generation: dict, scheduler=None):
     """
     Рендерит подтаб с загрузкой изображения.
     """
@@ -134,7 +540,7 @@ def render_upload_subtab(processor, model):
 
     # Настройки предобработки
     with st.expander("Настройки предобработки"):
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
             apply_inversion = st.checkbox(
                 "Автоинверсия (темный фон)",
@@ -147,6 +553,28 @@ def render_upload_subtab(processor, model):
                 value=False,
                 key="upload_binarization"
             )
+        with col3:
+            apply_segmentation = st.checkbox(
+                "Несколько формул на странице",
+                value=False,
+                key="upload_segmentation",
+                help="Разбить страницу на отдельные выражения и распознать их одним батчем"
+            )
+
+    # Пакетный режим: много файлов обрабатываются фоновым заданием
+    if st.toggle("Пакетная обработка (несколько файлов)", key="upload_bulk_mode"):
+        render_bulk_upload(
+            processor,
+            model,
+            generation,
+            {
+                "apply_inversion": apply_inversion,
+                "apply_binarization": apply_binarization,
+                "crop_to_ink": bool(get_secrets_section("ingestion").get("crop_to_ink", True)),
+            },
+            scheduler=scheduler
+        )
+        return
 
     # File uploader
     uploaded_file = st.file_uploader(
@@ -156,49 +584,216 @@ def render_upload_subtab(processor, model):
     )
 
     if uploaded_file is not None:
-        # Загрузка изображения
-        image = Image.open(uploaded_file)
+        # Загрузка изображения в ограниченном разрешении (секция [ingestion] в secrets)
+        ingestion = get_secrets_section("ingestion")
+        try:
+            image, image_info = load_image_bounded(
+                uploaded_file,
+                max_pixels=int(ingestion.get("max_pixels", DEFAULT_MAX_PIXELS)),
+                max_source_pixels=int(ingestion.get("max_source_pixels", DEFAULT_MAX_SOURCE_PIXELS))
+            )
+        except ImageTooLarge as e:
+            st.error(str(e))
+            return
+        except (UnidentifiedImageError, OSError) as e:
+            st.error(f"Не удалось прочитать изображение: {e}")
+            return
 
         # Превью оригинального изображения
         col1, col2 = st.columns([2, 3])
         with col1:
             st.image(image, caption="Исходное изображение", use_container_width=True)
+            if image_info["size"] != image_info["original_size"]:
+                st.caption(
+                    "Исходный размер {}x{} уменьшен до {}x{}".format(*image_info["original_size"], *image.size)
+                )
 
         # Кнопка распознавания
         with col2:
             recognize_btn = st.button("Распознать", type="primary", key="upload_recognize")
 
             if recognize_btn:
-                # Автоочистка поля ground truth при новом распознавании
+                # Автоочистка поля ground truth и альтернатив при новом распознавании
                 st.session_state.upload_gt = ""
+                st.session_state.pop("upload_alternatives", None)
+
+                with st.spinner("Распознавание..."), \
+                        trace("recognition", source="upload", model_key=model_key) as recognition_trace:
+                    # Предобработка: статистики по уменьшенной копии, обрезка до области чернил
+                    with span("preprocess", image_size=list(image.size)) as preprocess_span:
+                        processed_image, preprocess_info = preprocess_bounded(
+                            image,
+                            apply_inversion=apply_inversion,
+                            apply_binarization=apply_binarization,
+                            crop_to_ink=bool(ingestion.get("crop_to_ink", True))
+                        )
+                        preprocess_span.set(**preprocess_info)
+
+                    if apply_segmentation:
+                        # Страница с несколькими формулами: фрагменты распознаются одним батчем
+                        page = recognize_segments(processed_image, processor, model, generation, scheduler)
+                        recognition_trace.set(segments=len(page["segments"]))
+                    else:
+                        # Инференс (с потоковым выводом LaTeX)
+                        result, from_cache = recognize_image(
+                            processed_image, processor, model, model_key, generation, scheduler,
+                            placeholder=st.empty(),
+                            source="upload",
+                            preprocessing={
+                                "apply_inversion": apply_inversion,
+                                "apply_binarization": apply_binarization,
+                            }
+                        )
+
+                        recognition_trace.set(from_cache=from_cache)
 
-                with st.spinner("Распознавание..."):
-                    # Предобработка
-                    processed_image = preprocess_image(
-                        image,
-                        apply_inversion=apply_inversion,
-                        apply_binarization=apply_binarization
+                # Сохранение в session state
+                if apply_segmentation:
+                    st.session_state.upload_page_result = dict(page, trace=recognition_trace.to_dict())
+                    st.session_state.upload_result = None
+                else:
+                    # Ground truth, сохраненный ранее для этого изображения в истории
+                    if result.get("ground_truth"):
+                        st.session_state.upload_gt = result["ground_truth"]
+                    st.session_state.upload_result = dict(
+                        result, image=processed_image, from_cache=from_cache,
+                        trace=recognition_trace.to_dict()
                     )
-
-                    # Инференс
-                    latex = predict_latex_unified(processed_image, processor, model)
-
-                    # Сохранение в session state
-                    st.session_state.upload_result = {
-                        "latex": latex,
-                        "image": processed_image
-                    }
+                    st.session_state.upload_page_result = None
 
         # Отображение результатов
-        if "upload_result" in st.session_state and st.session_state.upload_result is not None:
+        if st.session_state.get("upload_page_result") is not None:
+            display_page_results(st.session_state.upload_page_result, key_prefix="upload_page")
+        elif "upload_result" in st.session_state and st.session_state.upload_result is not None:
             display_recognition_results(
                 st.session_state.upload_result["latex"],
                 st.session_state.upload_result["image"],
-                key_prefix="upload"
+                key_prefix="upload",
+                details=st.session_state.upload_result,
+                alternatives=make_alternatives_provider(processor, model, model_key, generation)
             )
 
 
-def display_recognition_results(latex: str, image: Image.Image, key_prefix: str):
+def recognize_segments(processed_image, processor, model, generation: dict, scheduler=None) -> dict:
+    """
+    Сегментирует страницу на выражения и распознает все фрагменты сразу:
+    одним батчем локальной модели, параллельными запросами к HF API
+    или параллельно в планировщике / пуле процессов.
+
+    Args:
+        processed_image: Предобработанное изображение страницы (PIL Image)
+        processor: TrOCRProcessor (или None в режиме HF API)
+        model: VisionEncoderDecoderModel (или None в режиме HF API)
+        generation: Параметры генерации (см. render_generation_settings)
+        scheduler: MicroBatchScheduler или InferenceWorkerPool (опционально)
+
+    Returns:
+        dict: {"segments": [{"bbox", "line", "column", "latex", "confidence", "num_beams", "crop"}],
+               "annotated": PIL Image, "timing": {"segmentation_ms", "inference_ms"}}
+    """
+    from src.segmentation import draw_segments, recognize_page
+
+    generation = {key: value for key, value in generation.items() if key != "streaming"}
+
+    def recognize_local(crops: list) -> list:
+        return predict_latex_batch(
+            crops, processor, model, max_batch_size=len(crops), return_details=True, **generation
+        )
+
+    if model is None:
+        from src.inference_hf import predict_latex_hf_many
+
+        def recognize_crops(crops: list) -> list:
+            with span("hf_api", images=len(crops)):
+                return [
+                    {"latex": latex, "confidence": None, "num_beams": None}
+                    for latex in predict_latex_hf_many(crops)
+                ]
+    elif scheduler is not None:
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        from src.worker_pool import WorkerPoolBusy, WorkerPoolError
+
+        # Как InferenceWorkerPool.predict: зависший воркер не блокирует страницу навсегда
+        request_timeout = getattr(scheduler, "request_timeout", None)
+        timeout = request_timeout * 2 if request_timeout else None
+
+        def recognize_crops(crops: list) -> list:
+            futures = []
+            with span("scheduler", images=len(crops)):
+                try:
+                    futures = scheduler.submit_many(crops, **generation)
+                    return [future.result(timeout=timeout) for future in futures]
+                except WorkerPoolBusy:
+                    st.error("Сервер перегружен: очередь распознавания заполнена. Повторите попытку позже.")
+                    st.stop()
+                except (WorkerPoolError, FutureTimeoutError, RuntimeError) as e:
+                    # Как в predict_latex_unified: воркер упал или не ответил, либо планировщик
+                    # остановлен выгрузкой модели - еще не начатые задачи отменяются,
+                    # фрагменты распознаются в текущем процессе
+                    for future in futures:
+                        future.cancel()
+                    logger.warning("Планировщик недоступен (%s: %s), инференс в текущем процессе",
+                                   type(e).__name__, e)
+            return recognize_local(crops)
+    else:
+        recognize_crops = recognize_local
+
+    page = recognize_page(processed_image, recognize_crops)
+    page["annotated"] = draw_segments(processed_image, page["segments"])
+    return page
+
+
+def display_page_results(page: dict, key_prefix: str):
+    """
+    Отображает результаты распознавания страницы: рамки фрагментов и LaTeX каждого выражения.
+
+    Args:
+        page: Результат recognize_segments
+        key_prefix: Префикс для ключей Streamlit виджетов
+    """
+    segments = page["segments"]
+
+    st.markdown("---")
+    if not segments:
+        st.warning("На изображении не найдено выражений.")
+        return
+    st.success(f"Найдено выражений: {len(segments)}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Сегментация", f"{page['timing']['segmentation_ms']:.0f} мс")
+    with col2:
+        st.metric("Распознавание (все фрагменты)", f"{page['timing']['inference_ms']:.0f} мс")
+
+    st.image(page["annotated"], caption="Найденные выражения", use_container_width=True)
+
+    for number, segment in enumerate(segments, start=1):
+        st.markdown(f"**#{number}** (строка {segment['line'] + 1})")
+        col_crop, col_latex = st.columns([1, 2])
+        with col_crop:
+            st.image(segment["crop"], use_container_width=True)
+        with col_latex:
+            st.code(segment["latex"], language="latex")
+            try:
+                st.latex(segment["latex"])
+            except Exception as e:
+                st.warning(f"Не удалось отрендерить LaTeX: {str(e)}")
+            if segment.get("confidence") is not None:
+                st.caption(f"Уверенность: {segment['confidence'] * 100:.1f}%")
+
+    # Экспорт: одно выражение на строку в порядке чтения
+    st.markdown("### Экспорт:")
+    st.download_button(
+        label="Скачать результаты (.txt)",
+        data=create_download_button_data("\n".join(segment["latex"] for segment in segments)),
+        file_name=f"recognition_result_{key_prefix}.txt",
+        mime="text/plain",
+        key=f"{key_prefix}_download"
+    )
+
+
+def display_recognition_results(latex: str, image, key_prefix: str, details: dict = None,
+                                alternatives=None):
     """
     Отображает результаты распознавания в 3 форматах (код, рендеринг и экспорт .txt) + метрики.
 
@@ -206,9 +801,49 @@ def display_recognition_results(latex: str, image: Image.Image, key_prefix: str)
         latex: Предсказанная LaTeX строка
         image: Предобработанное изображение
         key_prefix: Префикс для ключей Streamlit виджетов
+        details: Дополнительные сведения о распознавании (уверенность, кеш и т.п.)
+        alternatives: Функция поиска альтернативных гипотез (см. make_alternatives_provider)
     """
+    details = details or {}
+
     st.markdown("---")
     st.success("Распознавание завершено!")
+    if details.get("from_history"):
+        st.caption("Результат взят из истории распознаваний (повторное изображение)")
+    elif details.get("from_cache"):
+        st.caption("Результат взят из кеша (повторное изображение)")
+
+    # Уверенность модели
+    if details.get("confidence") is not None:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Уверенность модели", f"{details['confidence'] * 100:.1f}%")
+        with col2:
+            decoding = "greedy" if details.get("num_beams") == 1 else f"beam search ({details.get('num_beams')})"
+            st.metric("Декодирование", decoding)
+
+    # Латентность (для результатов из кеша не показывается)
+    if details.get("latency_ms") is not None and not details.get("from_cache"):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Время распознавания", f"{details['latency_ms']:.0f} мс")
+        with col2:
+            if details.get("ttft_ms") is not None:
+                st.metric("Время до первого токена", f"{details['ttft_ms']:.0f} мс")
+
+    # Трассировка этапов (если включена)
+    if details.get("trace"):
+        with st.expander("Трассировка этапов (debug)"):
+            trace_info = details["trace"]
+            st.caption(f"Всего: {trace_info['wall_ms']:.1f} мс (CPU {trace_info['cpu_ms']:.1f} мс)")
+            st.dataframe(
+                [
+                    dict(item, name="  " * item.get("depth", 0) + item["name"])
+                    for item in trace_info["spans"]
+                ],
+                use_container_width=True,
+                hide_index=True
+            )
 
     # Текст LaTeX (строка)
     st.markdown("### LaTeX код:")
@@ -222,6 +857,10 @@ def display_recognition_results(latex: str, image: Image.Image, key_prefix: str)
         st.warning(f"Не удалось отрендерить LaTeX: {str(e)}")
         st.text(latex)
 
+    # Альтернативные варианты (n-best по закешированному выходу энкодера)
+    if alternatives is not None:
+        render_alternatives(latex, image, key_prefix, alternatives)
+
     # Экспорт в .txt
     st.markdown("### Экспорт:")
     download_data = create_download_button_data(latex)
@@ -261,6 +900,13 @@ def display_recognition_results(latex: str, image: Image.Image, key_prefix: str)
                 st.rerun()
 
 
+    # Ground truth сохраняется в историю распознаваний (для последующей оценки модели)
+    if ground_truth and details.get("history_id") is not None and ground_truth != details.get("ground_truth"):
+        history = get_history()
+        if history is not None:
+            history.set_ground_truth(details["history_id"], ground_truth)
+            details["ground_truth"] = ground_truth
+
     # Отображение метрик при наличии ground truth (после Enter или кнопки Вычислить)
     if ground_truth:
         metrics = compute_metrics(latex, ground_truth)
@@ -275,3 +921,53 @@ def display_recognition_results(latex: str, image: Image.Image, key_prefix: str)
                 st.success("Точное совпадение!")
             else:
                 st.error("Не совпадает")
+
+
+def render_alternatives(latex: str, image, key_prefix: str, alternatives):
+    """
+    Панель альтернативных гипотез: k лучших лучей beam search или сэмплов
+    по одному проходу энкодера. Выбранная гипотеза заменяет основной результат.
+
+    Args:
+        latex: Текущая LaTeX строка
+        image: Предобработанное изображение
+        key_prefix: Префикс ключей виджетов ("canvas" или "upload")
+        alternatives: Функция поиска гипотез (image, num_hypotheses, strategy) -> list[dict]
+    """
+    state_key = f"{key_prefix}_alternatives"
+    with st.expander("Альтернативные варианты", expanded=state_key in st.session_state):
+        col1, col2, col3 = st.columns([2, 2, 1])
+        with col1:
+            num_hypotheses = st.number_input(
+                "Количество вариантов", min_value=2, max_value=10, value=5, key=f"{key_prefix}_nbest_k"
+            )
+        with col2:
+            strategy = st.selectbox(
+                "Способ", ["beam", "sampling"],
+                format_func=lambda name: "Beam search" if name == "beam" else "Сэмплирование (top-p)",
+                key=f"{key_prefix}_nbest_strategy"
+            )
+        with col3:
+            st.markdown("<br>", unsafe_allow_html=True)  # вертикальное выравнивание
+            find_btn = st.button("Найти", key=f"{key_prefix}_nbest_find", use_container_width=True)
+
+        if find_btn:
+            with st.spinner("Поиск альтернатив..."):
+                st.session_state[state_key] = alternatives(image, int(num_hypotheses), strategy)
+
+        for item in st.session_state.get(state_key, []):
+            col_latex, col_select = st.columns([7, 1])
+            with col_latex:
+                current = " (текущий)" if item["latex"] == latex else ""
+                st.caption(
+                    f"#{item['rank']}{current}: уверенность {item['confidence'] * 100:.1f}%, "
+                    f"score {item['score']:.3f}"
+                )
+                st.code(item["latex"], language="latex")
+            with col_select:
+                if st.button("Выбрать", key=f"{key_prefix}_nbest_pick_{item['rank']}",
+                             disabled=item["latex"] == latex):
+                    st.session_state[f"{key_prefix}_result"].update(
+                        latex=item["latex"], confidence=item["confidence"], num_beams=item["num_beams"]
+                    )
+                    st.rerun()
@@ -0,0 +1,286 @@
+"""
+Сокращение словаря декодера TrOCR до токенов, встречающихся в LaTeX-разметке.
+
+Декодер на каждом шаге проецирует скрытое состояние на весь словарь RoBERTa
+(~50k токенов), хотя разметка HME100K использует несколько сотен из них.
+Сокращенная модель хранит только строки output_projection и embed_tokens
+для токенов обучающей разметки и специальных токенов, поэтому проекция
+и softmax на каждом шаге generate становятся в десятки раз дешевле.
+
+Идентификаторы токенов сокращенной модели - позиции в vocab_map.json
+(список исходных id). Перед processor.batch_decode они переводятся обратно
+в исходные id (см. remap_to_original), токенизатор не меняется.
+
+Жадный и beam search результат совпадает с исходной моделью, пока лучшие
+токены лежат в сохраненном словаре; verify проверяет это на наборе данных.
+Уверенность (softmax по сокращенному словарю) может быть немного выше.
+
+Примеры:
+    python -m src.vocab_pruning prune --model-path models/trocr1-5ep \\
+        --labels data/train_caption.txt --output models/trocr1-5ep-pruned
+    python -m src.vocab_pruning verify --original models/trocr1-5ep --pruned models/trocr1-5ep-pruned \\
+        --images data/test --labels data/test_caption.txt --limit 200
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import torch
+
+from src.dataset import load_image, load_labels, load_samples
+from src.preprocessing import preprocess_image
+
+
+VOCAB_MAP_FILE = "vocab_map.json"
+
+# Идентификаторы специальных токенов в конфигурациях модели и генерации
+SPECIAL_TOKEN_FIELDS = (
+    "bos_token_id", "eos_token_id", "pad_token_id", "decoder_start_token_id",
+    "forced_bos_token_id", "forced_eos_token_id",
+)
+
+
+def collect_token_ids(latex_labels: list, tokenizer, configs: list = ()) -> list:
+    """
+    Собирает id токенов разметки и специальных токенов.
+
+    Args:
+        latex_labels: LaTeX строки обучающей разметки
+        tokenizer: Токенизатор процессора
+        configs: Конфигурации модели и генерации (для decoder_start_token_id и т.п.)
+
+    Returns:
+        list: Отсортированные исходные id
+    """
+    keep = set(tokenizer.all_special_ids)
+    for configuration in configs:
+        for field in SPECIAL_TOKEN_FIELDS:
+            value = getattr(configuration, field, None)
+            if isinstance(value, int):
+                keep.add(value)
+            elif isinstance(value, list):
+                keep.update(value)
+
+    for latex in latex_labels:
+        keep.update(tokenizer(latex).input_ids)
+    return sorted(keep)
+
+
+def _remap_special_ids(configuration, old_to_new: dict):
+    for field in SPECIAL_TOKEN_FIELDS:
+        value = getattr(configuration, field, None)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            setattr(configuration, field, [old_to_new[item] for item in value])
+        else:
+            setattr(configuration, field, old_to_new[value])
+
+
+def prune_model(model, keep_ids: list):
+    """
+    Оставляет в embed_tokens и output_projection декодера только строки keep_ids
+    и переводит id специальных токенов в конфигурациях в новую нумерацию.
+
+    Args:
+        model: VisionEncoderDecoderModel с декодером TrOCRForCausalLM (изменяется на месте)
+        keep_ids: Отсортированные исходные id сохраняемых токенов
+
+    Returns:
+        VisionEncoderDecoderModel: Та же модель с сокращенным словарем
+    """
+    index = torch.tensor(keep_ids, dtype=torch.long)
+    old_to_new = {old: new for new, old in enumerate(keep_ids)}
+
+    decoder = model.decoder
+    embed_tokens = decoder.get_input_embeddings()
+    output_projection = decoder.get_output_embeddings()
+
+    # Слои изменяются на месте, чтобы сохранить их классы (например, масштабирование эмбеддингов)
+    embed_tokens.weight = torch.nn.Parameter(embed_tokens.weight.data[index].clone())
+    embed_tokens.num_embeddings = len(keep_ids)
+    if embed_tokens.padding_idx is not None:
+        embed_tokens.padding_idx = old_to_new[embed_tokens.padding_idx]
+
+    output_projection.weight = torch.nn.Parameter(output_projection.weight.data[index].clone())
+    output_projection.out_features = len(keep_ids)
+    if output_projection.bias is not None:
+        output_projection.bias = torch.nn.Parameter(output_projection.bias.data[index].clone())
+
+    decoder.config.vocab_size = len(keep_ids)
+    model.config.decoder.vocab_size = len(keep_ids)
+    model.config.tie_word_embeddings = False
+    model.config.decoder.tie_word_embeddings = False
+    for configuration in (model.config, model.config.decoder, decoder.config, model.generation_config):
+        _remap_special_ids(configuration, old_to_new)
+    return model
+
+
+def save_pruned_model(model_path: str, labels_file: str, output_dir: str) -> dict:
+    """
+    Строит и сохраняет сокращенную модель вместе с процессором и vocab_map.json.
+
+    Args:
+        model_path: Папка исходной модели
+        labels_file: Файл обучающей разметки (имя файла \\t LaTeX)
+        output_dir: Папка для сокращенной модели
+
+    Returns:
+        dict: {"original_vocab_size", "pruned_vocab_size", "output_dir"}
+    """
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+
+    processor = TrOCRProcessor.from_pretrained(model_path)
+    model = VisionEncoderDecoderModel.from_pretrained(model_path)
+    original_vocab_size = model.decoder.config.vocab_size
+
+    labels = [latex for _, latex in load_labels(labels_file)]
+    keep_ids = collect_token_ids(
+        labels, processor.tokenizer, [model.config, model.config.decoder, model.generation_config]
+    )
+    prune_model(model, keep_ids)
+
+    output_dir = Path(output_dir)
+    model.save_pretrained(output_dir)
+    processor.save_pretrained(output_dir)
+    with open(output_dir / VOCAB_MAP_FILE, "w", encoding="utf-8") as f:
+        json.dump({"source_model": str(model_path), "original_ids": keep_ids}, f)
+
+    return {
+        "original_vocab_size": original_vocab_size,
+        "pruned_vocab_size": len(keep_ids),
+        "output_dir": str(output_dir),
+    }
+
+
+def attach_vocab_map(processor, model_path: str):
+    """
+    Если модель сокращенная (есть vocab_map.json), прикрепляет к процессору
+    тензор перевода новых id в исходные (processor.vocab_map).
+
+    Args:
+        processor: TrOCRProcessor
+        model_path: Папка модели
+    """
+    map_path = Path(model_path) / VOCAB_MAP_FILE
+    if not map_path.exists():
+        return
+    with open(map_path, "r", encoding="utf-8") as f:
+        processor.vocab_map = torch.tensor(json.load(f)["original_ids"], dtype=torch.long)
+
+
+def remap_to_original(processor, token_ids):
+    """
+    Переводит id сокращенного словаря в исходные id токенизатора
+    (без изменений, если у процессора нет vocab_map).
+
+    Args:
+        processor: TrOCRProcessor
+        token_ids: Тензор id любой формы
+
+    Returns:
+        Тензор исходных id
+    """
+    vocab_map = getattr(processor, "vocab_map", None)
+    if vocab_map is None:
+        return token_ids
+    return vocab_map[token_ids.to(torch.long)]
+
+
+def make_text_streamer(processor):
+    """
+    TextIteratorStreamer, понимающий id сокращенного словаря.
+    """
+    from transformers import TextIteratorStreamer
+
+    class RemappedTextIteratorStreamer(TextIteratorStreamer):
+        def put(self, value):
+            super().put(remap_to_original(processor, value))
+
+    return RemappedTextIteratorStreamer(processor.tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+
+def verify(original_path: str, pruned_path: str, samples: list, max_length: int = 256,
+           num_beams: int = 4) -> dict:
+    """
+    Сравнивает исходную и сокращенную модели на одних и тех же изображениях.
+
+    Args:
+        original_path: Папка исходной модели
+        pruned_path: Папка сокращенной модели
+        samples: Пары (путь к изображению, LaTeX)
+        max_length: Максимальная длина генерации
+        num_beams: Количество лучей для beam search
+
+    Returns:
+        dict: {"samples", "identical", "mismatches": [...], "original_ms", "pruned_ms", "speedup"}
+    """
+    from src.inference import predict_latex
+    from src.runtime import load_local_model
+
+    images = [preprocess_image(load_image(path)) for path, _ in samples]
+    outputs, timings = {}, {}
+    for name, path in (("original", original_path), ("pruned", pruned_path)):
+        processor, model = load_local_model(path)
+        start = time.perf_counter()
+        outputs[name] = [predict_latex(image, processor, model, max_length, num_beams) for image in images]
+        timings[name] = (time.perf_counter() - start) * 1000 / max(1, len(images))
+        del model
+
+    mismatches = [
+        {"file": path.name, "original": original, "pruned": pruned}
+        for (path, _), original, pruned in zip(samples, outputs["original"], outputs["pruned"])
+        if original != pruned
+    ]
+    return {
+        "samples": len(samples),
+        "identical": len(samples) - len(mismatches),
+        "mismatches": mismatches,
+        "original_ms": timings["original"],
+        "pruned_ms": timings["pruned"],
+        "speedup": timings["original"] / timings["pruned"] if timings["pruned"] else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сокращение словаря декодера TrOCR под LaTeX")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prune_parser = subparsers.add_parser("prune", help="Построить сокращенную модель")
+    prune_parser.add_argument("--model-path", default="models/trocr1-5ep", help="Папка исходной модели")
+    prune_parser.add_argument("--labels", required=True, help="Файл обучающей разметки (имя файла \\t LaTeX)")
+    prune_parser.add_argument("--output", default="models/trocr1-5ep-pruned", help="Папка для сокращенной модели")
+
+    verify_parser = subparsers.add_parser("verify", help="Сравнить выходы исходной и сокращенной моделей")
+    verify_parser.add_argument("--original", default="models/trocr1-5ep")
+    verify_parser.add_argument("--pruned", default="models/trocr1-5ep-pruned")
+    verify_parser.add_argument("--images", required=True, help="Папка с изображениями")
+    verify_parser.add_argument("--labels", required=True, help="Файл разметки")
+    verify_parser.add_argument("--limit", type=int, default=200)
+    verify_parser.add_argument("--max-length", type=int, default=256)
+    verify_parser.add_argument("--num-beams", type=int, default=4)
+
+    args = parser.parse_args()
+    if args.command == "prune":
+        result = save_pruned_model(args.model_path, args.labels, args.output)
+        print(
+            f"Словарь: {result['original_vocab_size']} -> {result['pruned_vocab_size']} токенов, "
+            f"модель сохранена в {result['output_dir']}"
+        )
+    else:
+        samples = load_samples(args.images, args.labels, limit=args.limit)
+        result = verify(args.original, args.pruned, samples, args.max_length, args.num_beams)
+        print(
+            f"Совпадений: {result['identical']}/{result['samples']}, "
+            f"латентность {result['original_ms']:.0f} -> {result['pruned_ms']:.0f} мс "
+            f"(x{result['speedup']:.2f})"
+        )
+        for mismatch in result["mismatches"][:10]:
+            print(f"  {mismatch['file']}: {mismatch['original']!r} != {mismatch['pruned']!r}")
+        if result["mismatches"]:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""
+Пул процессов инференса с закреплением потоков за ядрами.
+
+Все сессии Streamlit используют одну модель в процессе, и intra-op потоки
+PyTorch параллельных вызовов generate конкурируют за одни и те же ядра.
+В этом режиме запросы распределяются между N процессами-воркерами: у каждого
+своя модель (при start_method="fork" веса наследуются от родителя и делятся
+через copy-on-write), свое число потоков torch.set_num_threads и свой набор
+ядер (os.sched_setaffinity). Очередь задач хранится в родительском процессе
+и ограничена: submit и submit_many принимают запросы целиком или сразу
+выбрасывают WorkerPoolBusy, не дожидаясь освобождения места. Воркеру задача
+передается, только когда он свободен, поэтому до этого момента Future остается
+в состоянии PENDING и его можно отменить (отмененные задачи воркеры не получают).
+Фоновый поток родителя следит за heartbeat и зависшими запросами и перезапускает
+упавшие воркеры.
+
+Интерфейс submit/predict совпадает с MicroBatchScheduler, поэтому пул можно
+передать в predict_latex_unified(scheduler=...).
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+
+import numpy as np
+from PIL import Image
+
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolBusy(RuntimeError):
+    """
+    Очередь задач заполнена (backpressure): запрос нужно повторить позже.
+    """
+
+
+class WorkerPoolError(RuntimeError):
+    """
+    Воркер упал, завис или пул остановлен до получения результата.
+    """
+
+
+def _worker_main(worker_id: int, model_path: str, quantization: str, threads: int, cpus: list,
+                 tasks, results, heartbeats, shared_model: tuple):
+    """
+    Цикл процесса-воркера: настройка потоков и ядер, загрузка модели, обработка задач.
+    """
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+    import torch
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Уже задано в родительском процессе до fork
+        pass
+
+    from src.inference import predict_latex_batch
+
+    if shared_model is not None:
+        processor, model = shared_model
+    else:
+        from src.runtime import load_local_model
+        processor, model = load_local_model(model_path, quantization)
+
+    results.put(("ready", worker_id, None, os.getpid()))
+    while True:
+        heartbeats[worker_id] = time.time()
+        try:
+            task = tasks.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        if task is None:
+            break
+
+        request_id, image, params = task
+        results.put(("started", worker_id, request_id, None))
+        try:
+            result = predict_latex_batch([image], processor, model, return_details=True, **params)[0]
+            results.put(("done", worker_id, request_id, result))
+        except Exception as e:
+            results.put(("error", worker_id, request_id, f"{type(e).__name__}: {e}"))
+
+
+class InferenceWorkerPool:
+    """
+    Пул процессов-воркеров с ограниченной очередью, heartbeat и перезапуском.
+    """
+
+    def __init__(self, model_path: str, quantization: str = None, num_workers: int = 2,
+                 threads_per_worker: int = None, pin_cpus: bool = True, max_queue_size: int = 32,
+                 request_timeout: float = 120.0, heartbeat_timeout: float = 30.0,
+                 start_method: str = "fork", shared_model: tuple = None):
+        """
+        Args:
+            model_path: Путь к папке с моделью
+            quantization: Режим квантования ("dynamic_int8") или None
+            num_workers: Количество процессов
+            threads_per_worker: torch.set_num_threads в каждом воркере
+                                (None - доступные ядра поровну между воркерами)
+            pin_cpus: Закрепить каждый воркер за своим набором ядер (Linux)
+            max_queue_size: Максимум задач, ожидающих свободного воркера; при переполнении
+                            submit и submit_many выбрасывают WorkerPoolBusy
+            request_timeout: Максимальное время обработки запроса, после которого воркер перезапускается
+            heartbeat_timeout: Максимальный интервал heartbeat свободного воркера
+            start_method: "fork" (веса модели наследуются через copy-on-write) или "spawn"
+                          (каждый воркер загружает модель сам)
+            shared_model: (processor, model), уже загруженные в родительском процессе
+                          (используются только при start_method="fork")
+        """
+        if num_workers < 1:
+            raise ValueError(f"num_workers должен быть >= 1, получено: {num_workers}")
+
+        self.model_path = model_path
+        self.quantization = quantization
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.request_timeout = request_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.start_method = start_method
+        self.shared_model = shared_model if start_method == "fork" else None
+
+        available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") \
+            else list(range(os.cpu_count() or 1))
+        self.threads_per_worker = threads_per_worker or max(1, len(available) // num_workers)
+        self.cpu_sets = [
+            [available[(i * self.threads_per_worker + j) % len(available)] for j in range(self.threads_per_worker)]
+            if pin_cpus else None
+            for i in range(num_workers)
+        ]
+
+        self._context = multiprocessing.get_context(start_method)
+        # Задачи, переданные воркерам (не больше num_workers одновременно)
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        self._heartbeats = self._context.Array("d", num_workers, lock=False)
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        # request_id -> (Future, время постановки)
+        self._futures = {}
+        # Ожидающие свободного воркера задачи (request_id, массив, параметры) и переданные воркерам request_id
+        self._backlog = deque()
+        self._dispatched = set()
+        self._workers = [None] * num_workers
+        self._state = [
+            {"pid": None, "ready": False, "request_id": None, "started_at": None, "processed": 0, "restarts": 0}
+            for _ in range(num_workers)
+        ]
+        self._rejected = 0
+        self._closed = False
+
+        for worker_id in range(num_workers):
+            self._start_worker(worker_id)
+
+        self._monitor = threading.Thread(target=self._monitor_loop, name="inference-worker-monitor", daemon=True)
+        self._monitor.start()
+
+    def _start_worker(self, worker_id: int):
+        self._heartbeats[worker_id] = time.time()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                worker_id, self.model_path, self.quantization, self.threads_per_worker,
+                self.cpu_sets[worker_id], self._tasks, self._results, self._heartbeats, self.shared_model
+            ),
+            name=f"inference-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._workers[worker_id] = process
+        self._state[worker_id].update(pid=process.pid, ready=False, request_id=None, started_at=None)
+
+    def submit(self, image, max_length: int = 256, num_beams: int = 4,
+               adaptive: bool = False, confidence_threshold: float = 0.9) -> Future:
+        """
+        Ставит изображение в очередь воркеров.
+
+        Args:
+            image: PIL Image в формате RGB или uint8 массив
+            max_length: Максимальная длина последовательности
+            num_beams: Количество beams для beam search
+            adaptive: Адаптивный режим (greedy, beam search при низкой уверенности)
+            confidence_threshold: Порог уверенности для адаптивного режима
+
+        Returns:
+            Future с результатом {"latex", "confidence", "token_confidences", "num_beams"}
+
+        Raises:
+            WorkerPoolBusy: Очередь заполнена
+            WorkerPoolError: Пул остановлен
+        """
+        return self.submit_many([image], max_length, num_beams, adaptive, confidence_threshold)[0]
+
+    def submit_many(self, images: list, max_length: int = 256, num_beams: int = 4,
+                    adaptive: bool = False, confidence_threshold: float = 0.9) -> list:
+        """
+        Ставит изображения в очередь воркеров целиком: либо принимаются все, либо ни одно.
+        Не блокируется: при нехватке места сразу выбрасывает WorkerPoolBusy.
+
+        Args:
+            images: PIL Image в формате RGB или uint8 массивы
+            max_length, num_beams, adaptive, confidence_threshold: Параметры генерации (см. submit)
+
+        Returns:
+            list: Future в порядке изображений (отменяемые, пока задача ждет свободного воркера)
+
+        Raises:
+            WorkerPoolBusy: В очереди нет места для всех изображений
+            WorkerPoolError: Пул остановлен
+        """
+        if self._closed:
+            raise WorkerPoolError("Пул воркеров остановлен")
+
+        # Массив передается между процессами дешевле, чем PIL Image
+        arrays = [
+            np.asarray(image.convert("RGB")) if isinstance(image, Image.Image) else np.asarray(image)
+            for image in images
+        ]
+        params = {
+            "max_length": max_length,
+            "num_beams": num_beams,
+            "adaptive": adaptive,
+            "confidence_threshold": confidence_threshold,
+        }
+
+        futures = []
+        with self._lock:
+            self._prune_backlog()
+            free_workers = self.num_workers - len(self._dispatched)
+            if len(self._backlog) + len(arrays) - free_workers > self.max_queue_size:
+                self._rejected += 1
+                raise WorkerPoolBusy(f"Очередь воркеров заполнена ({self.max_queue_size} задач)")
+            queued_at = time.monotonic()
+            for array in arrays:
+                request_id = next(self._ids)
+                future = Future()
+                self._futures[request_id] = (future, queued_at)
+                self._backlog.append((request_id, array, params))
+                futures.append(future)
+            self._dispatch()
+        return futures
+
+    def _prune_backlog(self):
+        """
+        Убирает из очереди отмененные задачи. Вызывается под self._lock.
+        """
+        backlog = deque()
+        for task in self._backlog:
+            item = self._futures.get(task[0])
+            if item is not None and item[0].cancelled():
+                self._futures.pop(task[0])
+            elif item is not None:
+                backlog.append(task)
+        self._backlog = backlog
+
+    def _dispatch(self):
+        """
+        Передает задачи из очереди свободным воркерам. Вызывается под self._lock.
+        """
+        while self._backlog and len(self._dispatched) < self.num_workers:
+            request_id, array, params = self._backlog.popleft()
+            item = self._futures.get(request_id)
+            # Отмененные и уже завершенные по таймауту задачи воркеру не передаются
+            if item is None or not item[0].set_running_or_notify_cancel():
+                self._futures.pop(request_id, None)
+                continue
+            self._dispatched.add(request_id)
+            self._tasks.put_nowait((request_id, array, params))
+
+    def predict(self, image, max_length: int = 256, num_beams: int = 4,
+                adaptive: bool = False, confidence_threshold: float = 0.9) -> dict:
+        """
+        Синхронная обёртка над submit: блокируется до получения результата.
+        """
+        future = self.submit(image, max_length, num_beams, adaptive, confidence_threshold)
+        return future.result(timeout=self.request_timeout * 2)
+
+    def _resolve(self, request_id, result=None, error: str = None):
+        with self._lock:
+            item = self._futures.pop(request_id, None)
+            self._dispatched.discard(request_id)
+            if not self._closed:
+                self._dispatch()
+        if item is None:
+            return
+        try:
+            if error is None:
+                item[0].set_result(result)
+            else:
+                item[0].set_exception(WorkerPoolError(error))
+        except InvalidStateError:
+            # Задача отменена, пока ждала свободного воркера
+            pass
+
+    def _monitor_loop(self):
+        """
+        Получает результаты воркеров и проверяет их здоровье (выполняется в потоке родителя).
+        """
+        last_check = 0.0
+        while not self._closed:
+            try:
+                kind, worker_id, request_id, payload = self._results.get(timeout=0.5)
+            except queue.Empty:
+                kind = None
+            except (EOFError, OSError):
+                break
+
+            if kind is not None:
+                state = self._state[worker_id]
+                if kind == "ready":
+                    state.update(ready=True, pid=payload)
+                elif kind == "started":
+                    state.update(request_id=request_id, started_at=time.monotonic())
+                else:
+                    state.update(request_id=None, started_at=None)
+                    state["processed"] += 1
+                    self._resolve(request_id, result=payload if kind == "done" else None,
+                                  error=payload if kind == "error" else None)
+
+            if time.monotonic() - last_check >= 1.0:
+                last_check = time.monotonic()
+                self._check_health()
+
+    def _check_health(self):
+        """
+        Перезапускает упавшие и зависшие воркеры, завершает ошибкой просроченные запросы.
+        """
+        now = time.monotonic()
+        for worker_id, process in enumerate(self._workers):
+            state = self._state[worker_id]
+            reason = None
+            if not process.is_alive():
+                reason = f"воркер {worker_id} завершился (код {process.exitcode})"
+            elif state["request_id"] is not None and now - state["started_at"] > self.request_timeout:
+                reason = f"воркер {worker_id} не ответил за {self.request_timeout:.0f} с"
+            elif state["ready"] and state["request_id"] is None \
+                    and time.time() - self._heartbeats[worker_id] > self.heartbeat_timeout:
+                reason = f"воркер {worker_id} не отправляет heartbeat"
+
+            if reason is None:
+                continue
+
+            logger.warning("Перезапуск: %s", reason)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=5)
+            if state["request_id"] is not None:
+                self._resolve(state["request_id"], error=reason)
+            state["restarts"] += 1
+            if not self._closed:
+                self._start_worker(worker_id)
+
+        # Запросы, потерянные вместе с воркером до сообщения "started"
+        with self._lock:
+            expired = [
+                request_id for request_id, (_, queued_at) in self._futures.items()
+                if now - queued_at > self.request_timeout * 2
+            ]
+        for request_id in expired:
+            self._resolve(request_id, error="превышено время ожидания результата")
+
+    def health(self) -> dict:
+        """
+        Состояние пула для проверок готовности.
+
+        Returns:
+            dict: {"ready": bool, "alive": int, "queue_depth": int, "pending": int,
+                   "rejected": int, "workers": list}
+        """
+
+        workers = []
+        for worker_id, process in enumerate(self._workers):
+            state = self._state[worker_id]
+            workers.append({
+                "worker_id": worker_id,
+                "pid": state["pid"],
+                "alive": process.is_alive(),
+                "ready": state["ready"],
+                "busy": state["request_id"] is not None,
+                "cpus": self.cpu_sets[worker_id],
+                "threads": self.threads_per_worker,
+                "processed": state["processed"],
+                "restarts": state["restarts"],
+                "heartbeat_age_s": time.time() - self._heartbeats[worker_id],
+            })
+
+        with self._lock:
+            queue_depth = len(self._backlog)
+            pending = len(self._futures)
+        alive = sum(worker["alive"] and worker["ready"] for worker in workers)
+        return {
+            "ready": not self._closed and alive > 0,
+            "alive": alive,
+            "queue_depth": queue_depth,
+            "pending": pending,
+            "rejected": self._rejected,
+            "workers": workers,
+        }
+
+    def close(self, timeout: float = 10.0):
+        """
+        Останавливает воркеры; незавершенные запросы завершаются WorkerPoolError.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._tasks.put(None)
+
+        deadline = time.monotonic() + timeout
+        for process in self._workers:
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+
+        with self._lock:
+            pending = list(self._futures)
+            self._backlog.clear()
+        for request_id in pending:
+            self._resolve(request_id, error="пул воркеров остановлен")
+        self.shared_model = None
@@ -0,0 +1,40 @@
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+pytest.importorskip("torch")
+from PIL import Image
+
+import src.batching
+from src.batching import MicroBatchScheduler
+
+
+def test_predict_times_out_and_cancels_queued_request(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    batches = []
+
+    def blocking_predict(images, processor, model, **kwargs):
+        batches.append(len(images))
+        started.set()
+        release.wait(5)
+        return ["x" for _ in images]
+
+    monkeypatch.setattr(src.batching, "predict_latex_batch", blocking_predict)
+    scheduler = MicroBatchScheduler(object(), object(), max_batch_size=1, max_wait_ms=1.0, request_timeout=0.1)
+    image = Image.new("RGB", (32, 32), "white")
+    try:
+        first = scheduler.submit(image, num_beams=1)
+        assert started.wait(5)
+
+        # Рабочий поток занят первым батчем: второй запрос не дождется результата
+        with pytest.raises(FutureTimeoutError):
+            scheduler.predict(image, num_beams=1)
+
+        release.set()
+        assert first.result(timeout=5) == "x"
+    finally:
+        release.set()
+        scheduler.close()
+        scheduler._worker.join(5)
+    assert batches == [1]
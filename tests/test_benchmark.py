@@ -0,0 +1,26 @@
+import sys
+
+import pytest
+
+pytest.importorskip("torch")
+
+from src.benchmark import compare_results, measure_memory, reset_peak_rss, summarize
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux") or not reset_peak_rss(), reason="нужен /proc/self/clear_refs")
+def test_peak_rss_is_measured_per_call():
+    large = measure_memory(lambda: bytearray(200 * 2**20))
+    small = measure_memory(lambda: bytearray(2**20))
+    assert large["peak_rss_delta_mb"] > 150
+    # Пик не накапливается между конфигурациями
+    assert small["peak_rss_delta_mb"] < 50
+    assert small["peak_rss_mb"] < large["peak_rss_mb"]
+
+
+def test_compare_results_flags_regressions():
+    baseline = {"results": [summarize("predict_latex", {"num_beams": 1}, [100.0] * 10, 1)]}
+    current = {"results": [summarize("predict_latex", {"num_beams": 1}, [130.0] * 10, 1)]}
+    rows = compare_results(baseline, current, threshold_percent=10.0)
+    assert {row["metric"] for row in rows} == {"p50_ms", "p95_ms", "throughput_items_per_s"}
+    assert all(row["regression"] for row in rows)
+    assert not any(row["regression"] for row in compare_results(baseline, baseline))
@@ -0,0 +1,70 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+from src.cache import RecognitionCache, image_hash, perceptual_hash
+
+
+def canvas_formula(sign: str, offset: int = 0) -> "Image.Image":
+    """
+    Маленькая формула "x?1" на почти белом холсте 800x200, как в подтабе Canvas.
+    """
+    image = Image.new("RGB", (800, 200), "white")
+    draw = ImageDraw.Draw(image)
+    x = 40 + offset
+    # x
+    draw.line((x, 80, x + 30, 120), fill="black", width=3)
+    draw.line((x, 120, x + 30, 80), fill="black", width=3)
+    # + или -
+    draw.line((x + 45, 100, x + 75, 100), fill="black", width=3)
+    if sign == "+":
+        draw.line((x + 60, 85, x + 60, 115), fill="black", width=3)
+    # 1
+    draw.line((x + 95, 80, x + 95, 120), fill="black", width=3)
+    return image
+
+
+def test_image_hash_distinguishes_pixels():
+    a = canvas_formula("+")
+    b = canvas_formula("-")
+    assert image_hash(a) == image_hash(a.copy())
+    assert image_hash(a) != image_hash(b)
+
+
+def test_lru_eviction():
+    cache = RecognitionCache(max_size=2)
+    images = [canvas_formula("+", offset) for offset in (0, 100, 200)]
+    for index, image in enumerate(images):
+        cache.put(image, {"num_beams": 1}, index)
+    assert cache.get(images[0], {"num_beams": 1}) is None
+    assert cache.get(images[2], {"num_beams": 1}) == 2
+    assert cache.stats()["size"] == 2
+
+
+def test_params_are_part_of_key():
+    cache = RecognitionCache()
+    image = canvas_formula("+")
+    cache.put(image, {"num_beams": 1}, "greedy")
+    assert cache.get(image, {"num_beams": 4}) is None
+
+
+def test_perceptual_hash_ignores_position_on_canvas():
+    # Хеш считается по области чернил, поэтому сдвиг формулы по холсту его не меняет
+    assert perceptual_hash(canvas_formula("+", 0)) == perceptual_hash(canvas_formula("+", 300))
+
+
+def test_perceptual_cache_does_not_confuse_one_stroke_difference():
+    cache = RecognitionCache(perceptual=True)
+    cache.put(canvas_formula("+"), {"num_beams": 1}, "x+1")
+    assert cache.get(canvas_formula("-"), {"num_beams": 1}) is None
+    assert cache.get(canvas_formula("+", 300), {"num_beams": 1}) == "x+1"
+
+
+def test_perceptual_eviction_updates_index():
+    cache = RecognitionCache(max_size=1, perceptual=True)
+    cache.put(canvas_formula("+"), {"num_beams": 1}, "x+1")
+    cache.put(canvas_formula("-"), {"num_beams": 1}, "x-1")
+    assert cache.get(canvas_formula("+"), {"num_beams": 1}) is None
+    assert cache.stats()["size"] == 1
@@ -0,0 +1,48 @@
+import csv
+import io
+import json
+import zipfile
+
+import pytest
+
+from src.export import RESULT_FIELDS, export_results
+
+ROWS = [
+    {"file": "a.png", "latex": r"\frac{1}{2}", "confidence": 0.9, "num_beams": 4, "latency_ms": 12.5, "error": None},
+    {"file": "dir/a.png", "latex": "x^2", "confidence": 0.8, "num_beams": 4, "latency_ms": 10.0, "error": None},
+    {"file": "ошибка.png", "latex": None, "confidence": None, "num_beams": None, "latency_ms": None,
+     "error": "ValueError: bad"},
+]
+
+
+def test_csv_has_bom_header_and_rows():
+    data = export_results(ROWS, "csv").getvalue()
+    assert data.startswith("\ufeff".encode("utf-8"))
+    rows = list(csv.DictReader(io.StringIO(data.decode("utf-8-sig"))))
+    assert tuple(rows[0]) == RESULT_FIELDS
+    assert [row["file"] for row in rows] == ["a.png", "dir/a.png", "ошибка.png"]
+    assert rows[0]["latex"] == r"\frac{1}{2}"
+
+
+def test_jsonl_roundtrip():
+    lines = export_results(ROWS, "jsonl").getvalue().decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == ROWS
+
+
+def test_zip_contains_tables_and_unique_tex_files():
+    with zipfile.ZipFile(export_results(ROWS, "zip")) as archive:
+        names = archive.namelist()
+        assert names[:2] == ["results.csv", "results.jsonl"]
+        # Одинаковые имена файлов не перезаписывают друг друга, ошибки без .tex
+        assert names[2:] == ["latex/0001_a.tex", "latex/0002_a.tex"]
+        assert archive.read("latex/0001_a.tex").decode("utf-8") == "\\frac{1}{2}\n"
+
+
+def test_export_to_file_object_and_unknown_format(tmp_path):
+    path = tmp_path / "results.jsonl"
+    with open(path, "wb") as f:
+        export_results(ROWS, "jsonl", f)
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 3
+
+    with pytest.raises(ValueError):
+        export_results(ROWS, "xlsx")
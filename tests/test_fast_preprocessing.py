@@ -0,0 +1,62 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+from PIL import Image
+
+from src.fast_preprocessing import (
+    DEFAULT_TOLERANCE, arrays_to_pixel_values, get_pixel_config, max_abs_difference, random_images
+)
+
+
+class ReferenceProcessor:
+    """
+    Часть TrOCRProcessor, отвечающая за изображения (ViTImageProcessor с параметрами TrOCR),
+    без токенизатора и чекпоинта модели.
+    """
+
+    def __init__(self):
+        self.image_processor = transformers.ViTImageProcessor(
+            size={"height": 384, "width": 384},
+            resample=Image.BILINEAR,
+            image_mean=[0.5, 0.5, 0.5],
+            image_std=[0.5, 0.5, 0.5]
+        )
+
+    def __call__(self, images, return_tensors=None):
+        return self.image_processor(images=images, return_tensors=return_tensors)
+
+
+@pytest.fixture(scope="module")
+def processor():
+    return ReferenceProcessor()
+
+
+def test_matches_reference_on_random_images(processor):
+    assert max_abs_difference(random_images(8), processor) <= DEFAULT_TOLERANCE
+
+
+def test_matches_reference_on_formula_like_images(processor):
+    # Белый фон с темными штрихами - типичный вход после предобработки
+    images = []
+    for height, width in [(200, 800), (60, 300), (900, 1200)]:
+        array = np.full((height, width, 3), 255, dtype=np.uint8)
+        array[height // 3: height // 3 + 3, width // 10: width - width // 10] = 0
+        array[height // 5: height - height // 5, width // 2: width // 2 + 3] = 20
+        images.append(Image.fromarray(array))
+    assert max_abs_difference(images, processor) <= DEFAULT_TOLERANCE
+
+
+def test_accepts_grayscale_and_rgba(processor):
+    config = get_pixel_config(processor)
+    gray = np.full((50, 80), 128, dtype=np.uint8)
+    rgba = np.dstack([np.full((50, 80, 3), 128, dtype=np.uint8), np.zeros((50, 80), dtype=np.uint8)])
+    pixel_values = arrays_to_pixel_values([gray, rgba], config=config)
+    assert pixel_values.shape == (2, 3, 384, 384)
+    assert torch.allclose(pixel_values[0], pixel_values[1])
+
+
+def test_rejects_non_uint8(processor):
+    with pytest.raises(ValueError):
+        arrays_to_pixel_values([np.zeros((10, 10, 3), dtype=np.float32)], processor)
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+from PIL import Image
+
+from src.hf_client import HFInferenceClient, HFInferenceError
+from src.hf_stub_server import start_stub_server
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**state_options):
+        server = start_stub_server(latency_ms=0, **state_options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def make_client(server, **options) -> HFInferenceClient:
+    options.setdefault("backoff_base", 0.001)
+    options.setdefault("timeout", 5.0)
+    return HFInferenceClient("stub/model", api_url=server.api_url, **options)
+
+
+def image():
+    return Image.new("L", (32, 16), 255)
+
+
+def test_loading_503_is_retried_after_estimated_time(stub):
+    server = stub(loading_requests=2, estimated_time=0.1)
+    with make_client(server) as client:
+        start = time.monotonic()
+        assert client.predict(image()) == "x^{2}+y^{2}=z^{2}"
+        elapsed = time.monotonic() - start
+        stats = client.stats()
+    assert elapsed >= 0.2
+    assert stats["retries"] == 2 and stats["errors"] == 0
+    assert server.state.requests == 3
+
+
+def test_429_honours_retry_after(stub):
+    server = stub(rate_limited_requests=1, retry_after=0.3)
+    with make_client(server) as client:
+        start = time.monotonic()
+        assert client.predict(image()) == "x^{2}+y^{2}=z^{2}"
+        assert time.monotonic() - start >= 0.3
+        assert client.stats()["retries"] == 1
+
+
+def test_exhausted_retries_raise(stub):
+    server = stub(loading_requests=100, estimated_time=0.01)
+    with make_client(server, max_retries=2) as client:
+        with pytest.raises(HFInferenceError) as error:
+            client.predict(image())
+        stats = client.stats()
+    assert error.value.status_code == 503
+    assert server.state.requests == 3
+    assert stats["retries"] == 2 and stats["errors"] == 1
+
+
+@pytest.mark.parametrize("body", ["<html><body>Bad Gateway</body></html>", "", "[1, 2]"])
+def test_non_json_200_is_inference_error(stub, body):
+    server = stub(raw_response=body)
+    with make_client(server) as client:
+        with pytest.raises(HFInferenceError) as error:
+            client.predict(image())
+        assert client.stats()["errors"] == 1
+    assert error.value.status_code == 200
+
+
+def test_predict_many_returns_exceptions(stub):
+    server = stub(raw_response="<html></html>")
+    with make_client(server) as client:
+        results = client.predict_many([image(), image()], max_workers=2, return_exceptions=True)
+    assert all(isinstance(result, HFInferenceError) for result in results)
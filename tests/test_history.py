@@ -0,0 +1,94 @@
+import sqlite3
+import threading
+
+import pytest
+
+from src.history import RecognitionHistory
+
+PARAMS = {"model_key": "base", "max_length": 256, "num_beams": 4}
+
+
+def make_result(latex: str) -> dict:
+    return {"latex": latex, "confidence": 0.9, "num_beams": 4, "latency_ms": 10.0}
+
+
+def test_lookup_by_hash_and_params(tmp_path):
+    history = RecognitionHistory(str(tmp_path / "db" / "history.sqlite3"))
+    assert history.lookup("hash-a", PARAMS) is None
+
+    history.record("hash-a", PARAMS, make_result("x"), source="canvas",
+                   preprocessing={"apply_inversion": True, "apply_binarization": False})
+    record_id = history.record("hash-a", PARAMS, make_result("y"))
+
+    record = history.lookup("hash-a", dict(reversed(list(PARAMS.items()))))
+    assert record["id"] == record_id and record["latex"] == "y"
+    assert history.lookup("hash-a", dict(PARAMS, num_beams=1)) is None
+    assert history.lookup("hash-b", PARAMS) is None
+    assert history.stats() == {"records": 2, "hits": 1, "misses": 3}
+
+
+def test_ground_truth_and_wal(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    history = RecognitionHistory(path)
+    record_id = history.record("hash", PARAMS, make_result("x"))
+
+    history.set_ground_truth(record_id, "x^2")
+    assert history.lookup("hash", PARAMS)["ground_truth"] == "x^2"
+    history.set_ground_truth(record_id, "")
+    assert history.lookup("hash", PARAMS)["ground_truth"] is None
+
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_keyset_pages_and_model_keys(tmp_path):
+    history = RecognitionHistory(str(tmp_path / "history.sqlite3"))
+    for number in range(7):
+        model_key = "base" if number % 2 == 0 else "small"
+        history.record(f"hash-{number}", dict(PARAMS, model_key=model_key), make_result(str(number)))
+
+    pages, cursor = [], None
+    while True:
+        rows = history.page(before_id=cursor, limit=3)
+        if not rows:
+            break
+        pages.append([row["latex"] for row in rows])
+        cursor = rows[-1]["id"]
+    assert pages == [["6", "5", "4"], ["3", "2", "1"], ["0"]]
+
+    assert [row["latex"] for row in history.page(limit=10, model_key="small")] == ["5", "3", "1"]
+    assert history.model_keys() == ["base", "small"]
+
+
+def test_concurrent_writers(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    RecognitionHistory(path)
+
+    def write(worker: int):
+        # Отдельный экземпляр имитирует другую сессию или процесс
+        history = RecognitionHistory(path)
+        for number in range(25):
+            history.record(f"{worker}-{number}", PARAMS, make_result("x"))
+        history.close()
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert RecognitionHistory(path).stats()["records"] == 100
+
+
+def test_history_page_detects_last_full_page(tmp_path):
+    pytest.importorskip("streamlit")
+    from src.ui.tab_history import history_page
+
+    history = RecognitionHistory(str(tmp_path / "history.sqlite3"))
+    for i in range(4):
+        history.record(f"hash-{i}", PARAMS, make_result(str(i)))
+
+    rows, has_older = history_page(history, None, 2)
+    assert [row["latex"] for row in rows] == ["3", "2"] and has_older
+    rows, has_older = history_page(history, rows[-1]["id"], 2)
+    assert [row["latex"] for row in rows] == ["1", "0"] and not has_older
+    assert history_page(history, rows[-1]["id"], 2) == ([], False)
@@ -0,0 +1,150 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("watchdog")
+from PIL import Image
+
+from src.hot_folder import HotFolderService, is_candidate
+
+
+def write_png(path, size=(80, 40)):
+    image = Image.new("RGB", size, "white")
+    image.paste("black", (10, 15, size[0] - 10, 25))
+    image.save(path, format="PNG")
+    return path
+
+
+def age(path, seconds: float = 60.0):
+    # Файл "дописан давно": mtime старше settle_s
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+class FakeRecognizer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, images):
+        self.calls.append(len(images))
+        return [{"latex": f"{image.size[0]}x{image.size[1]}", "confidence": 1.0, "num_beams": 1}
+                for image in images]
+
+
+def make_service(directory, recognizer, **options):
+    options.setdefault("settle_s", 0.05)
+    return HotFolderService(str(directory), recognizer, **options)
+
+
+def read_jsonl(path) -> list:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_is_candidate():
+    assert is_candidate(Path("scan.PNG"))
+    assert not is_candidate(Path("scan.png.part"))
+    assert not is_candidate(Path(".scan.png"))
+    assert not is_candidate(Path("notes.txt"))
+    assert not is_candidate(Path(".hot_folder") / "scan.png")
+
+
+def test_scan_process_and_checkpoint_restart(tmp_path):
+    for name in ("a.png", "b.png"):
+        age(write_png(tmp_path / name))
+    (tmp_path / "c.png.part").write_bytes(b"partial")
+
+    recognizer = FakeRecognizer()
+    service = make_service(tmp_path, recognizer)
+    assert service.scan() == 2
+    ready = service.ready_files()
+    assert sorted(path.name for path, _ in ready) == ["a.png", "b.png"]
+    service.process_batch(ready)
+    assert recognizer.calls == [2]
+
+    records = read_jsonl(service.sink_path)
+    assert sorted(record["file"] for record in records) == ["a.png", "b.png"]
+    assert all(record["latex"] and record["error"] is None for record in records)
+    assert service.backlog() == 0
+
+    # После перезапуска обработанные файлы пропускаются, замененный файл распознается заново
+    age(write_png(tmp_path / "a.png", size=(120, 40)), seconds=30)
+    restarted = make_service(tmp_path, recognizer)
+    assert restarted.scan() == 1
+    assert [path.name for path, _ in restarted.ready_files()] == ["a.png"]
+
+
+def test_debounce_waits_for_stable_size(tmp_path):
+    service = make_service(tmp_path, FakeRecognizer(), settle_s=0.2)
+    path = tmp_path / "scan.png"
+    write_png(path)
+    service.notify(str(path))
+    # Первая проверка фиксирует размер, новые события и дозапись перезапускают отсчет
+    assert service.ready_files() == []
+    with open(path, "ab") as f:
+        f.write(b"\0" * 16)
+    service.notify(str(path))
+    assert service.ready_files() == []
+
+    time.sleep(0.3)
+    assert [item[0] for item in service.ready_files()] == [path]
+
+    path.unlink()
+    assert service.ready_files() == [] and service.backlog() == 0
+
+
+def test_sidecar_output_records_errors(tmp_path):
+    age(write_png(tmp_path / "good.png"))
+    (tmp_path / "broken.png").write_bytes(b"not an image")
+    age(tmp_path / "broken.png")
+
+    service = make_service(tmp_path, FakeRecognizer(), output="sidecar")
+    service.scan()
+    service.process_batch(service.ready_files())
+
+    good = json.loads((tmp_path / "good.png.json").read_text(encoding="utf-8"))
+    broken = json.loads((tmp_path / "broken.png.json").read_text(encoding="utf-8"))
+    assert good["latex"] and good["error"] is None
+    assert broken["latex"] is None and broken["error"]
+    assert service.status()["processed"] == 2 and service.status()["failed"] == 1
+
+
+def test_batch_error_is_retried_with_backoff(tmp_path):
+    age(write_png(tmp_path / "a.png"))
+    (tmp_path / "broken.png").write_bytes(b"not an image")
+    age(tmp_path / "broken.png")
+
+    failures = [RuntimeError("out of memory")]
+    recognizer = FakeRecognizer()
+
+    def flaky(images):
+        if failures:
+            raise failures.pop()
+        return recognizer(images)
+
+    service = make_service(tmp_path, flaky, retry_base_s=0.2)
+    service.scan()
+    service.process_batch(service.ready_files())
+
+    # Ошибка чтения записана сразу, файл из упавшего батча ждет повтора и не в checkpoint
+    assert [record["file"] for record in read_jsonl(service.sink_path)] == ["broken.png"]
+    assert service.status()["retrying"] == 1 and service.backlog() == 1
+    assert service.ready_files() == []
+    assert make_service(tmp_path, flaky).scan() == 1
+
+    time.sleep(0.25)
+    service.process_batch(service.ready_files())
+    records = read_jsonl(service.sink_path)
+    assert [record["file"] for record in records] == ["broken.png", "a.png"]
+    assert records[1]["latex"] and records[1]["error"] is None
+    assert service.status()["retrying"] == 0 and service.backlog() == 0
+    assert make_service(tmp_path, flaky).scan() == 0
+
+
+def test_invalid_options(tmp_path):
+    with pytest.raises(ValueError):
+        make_service(tmp_path, FakeRecognizer(), output="csv")
+    with pytest.raises(ValueError):
+        make_service(tmp_path, FakeRecognizer(), batch_size=0)
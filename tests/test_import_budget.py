@@ -0,0 +1,18 @@
+from src.import_budget import APP_MODULES, app_modules
+
+
+def test_app_modules_follow_app_imports(tmp_path):
+    path = tmp_path / "app.py"
+    path.write_text(
+        "import streamlit as st\n"
+        "from src.ui.sidebar import render_sidebar\n"
+        "try:\n"
+        "    from src.ui.tab_about import render_about_tab\n"
+        "except ImportError:\n"
+        "    pass\n"
+        "def later():\n"
+        "    from src.inference import load_model\n",
+        encoding="utf-8"
+    )
+    assert app_modules(path, extra=("src.ui.sidebar",)) == ("src.ui.sidebar", "src.ui.tab_about")
+    assert "src.ui.tab_history" in APP_MODULES
@@ -0,0 +1,83 @@
+import io
+import struct
+import zlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from PIL import Image, ImageDraw
+
+from src.ingestion import DEFAULT_MAX_PIXELS, DEFAULT_MAX_SOURCE_PIXELS, ImageTooLarge, load_image_bounded, preprocess_bounded
+
+
+def encode(image: Image.Image, image_format: str = "PNG") -> io.BytesIO:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    buffer.seek(0)
+    return buffer
+
+
+def png_header(width: int, height: int) -> io.BytesIO:
+    """
+    PNG только с заголовком (IHDR): размер известен без декодирования пикселей.
+    """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return io.BytesIO(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", b"") + chunk(b"IEND", b""))
+
+
+def formula_page(size=(3000, 2000)) -> Image.Image:
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    draw.line((size[0] // 4, size[1] // 2, 3 * size[0] // 4, size[1] // 2), fill="black", width=20)
+    return image
+
+
+def test_large_palette_png_is_reduced():
+    source = formula_page().convert("P", palette=Image.ADAPTIVE, colors=4)
+    image, info = load_image_bounded(encode(source))
+    assert image.mode == "RGB"
+    assert info["original_size"] == [3000, 2000]
+    assert image.size[0] * image.size[1] <= DEFAULT_MAX_PIXELS
+    # Линия сохраняется после уменьшения
+    assert np.asarray(image.convert("L")).min() < 64
+
+
+@pytest.mark.parametrize("mode", ["1", "I;16", "LA", "RGBA"])
+def test_other_modes_are_reduced(mode):
+    source = formula_page((1000, 800)).convert("L").convert(mode)
+    image, info = load_image_bounded(encode(source), max_pixels=100_000)
+    assert image.mode == "RGB"
+    assert image.size[0] * image.size[1] <= 100_000
+
+
+def test_small_image_keeps_size():
+    image, info = load_image_bounded(encode(formula_page((400, 200))))
+    assert info["size"] == info["original_size"] == [400, 200]
+
+
+def test_too_large_source_is_rejected():
+    with pytest.raises(ImageTooLarge):
+        load_image_bounded(encode(formula_page((1000, 1000))), max_source_pixels=500_000)
+
+
+def test_preprocess_bounded_crops_to_ink():
+    image, _ = load_image_bounded(encode(formula_page((1200, 800))))
+    processed, info = preprocess_bounded(image)
+    assert processed.mode == "RGB"
+    assert processed.size[0] < 1200 and processed.size[1] < 800
+    assert info["ink_bbox"] is not None
+
+
+@pytest.mark.filterwarnings("ignore::PIL.Image.DecompressionBombWarning")
+@pytest.mark.parametrize("size", [(20_000, 8_000), (19_000, 10_000), (20_000, 12_000)])
+def test_oversized_header_is_rejected_before_decoding(size):
+    # 160 Мп - проверка max_source_pixels; 190 и 240 Мп - защита Pillow от decompression bomb
+    with pytest.raises(ImageTooLarge):
+        load_image_bounded(png_header(*size))
+
+
+def test_default_source_budget_is_below_pillow_limit():
+    assert DEFAULT_MAX_SOURCE_PIXELS < 2 * Image.MAX_IMAGE_PIXELS
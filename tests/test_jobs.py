@@ -0,0 +1,145 @@
+import io
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import pytest
+
+pytest.importorskip("numpy")
+from PIL import Image
+
+from src.jobs import JobQueue
+
+
+def png_bytes(color: str = "white") -> bytes:
+    image = Image.new("RGB", (120, 60), color)
+    image.paste("black", (20, 25, 100, 35))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def recognize_sizes(images: list, generation: dict) -> list:
+    return [{"latex": f"{image.size[0]}x{image.size[1]}", "confidence": 1.0, "num_beams": generation["num_beams"]}
+            for image in images]
+
+
+def wait_finished(job, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if job.is_finished():
+            return
+        time.sleep(0.02)
+    pytest.fail(f"Задание не завершилось: {job.status()}")
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    job_queue = JobQueue(workers=1, batch_size=2, spool_dir=str(tmp_path))
+    yield job_queue
+    job_queue.close()
+
+
+def test_job_results_in_file_order_with_errors(job_queue):
+    files = [("a.png", png_bytes()), ("broken.png", b"not an image"), ("c.png", io.BytesIO(png_bytes()))]
+    job = job_queue.submit(files, recognize_sizes, {"num_beams": 1})
+    wait_finished(job)
+
+    status = job.status()
+    assert status["state"] == "done"
+    assert status["completed"] == 3 and status["failed"] == 1
+    rows = job.rows()
+    assert [row["file"] for row in rows] == ["a.png", "broken.png", "c.png"]
+    assert rows[0]["latex"] is not None and rows[0]["num_beams"] == 1
+    assert rows[1]["latex"] is None and rows[1]["error"]
+    assert job.rows(offset=1, limit=1) == rows[1:2]
+    assert not job.spool_dir.exists()
+
+
+def test_batch_error_is_recorded_per_file(job_queue):
+    def failing(images, generation):
+        raise RuntimeError("boom")
+
+    job = job_queue.submit([("a.png", png_bytes()), ("b.png", png_bytes())], failing, {})
+    wait_finished(job)
+    assert job.state == "done"
+    assert [row["error"] for row in job.rows()] == ["RuntimeError: boom"] * 2
+
+
+def test_close_cancels_queued_jobs_and_removes_spool(tmp_path):
+    job_queue = JobQueue(workers=1, batch_size=1, spool_dir=str(tmp_path))
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(images, generation):
+        started.set()
+        release.wait(5)
+        return recognize_sizes(images, generation)
+
+    running = job_queue.submit([("a.png", png_bytes()), ("b.png", png_bytes())], blocking, {"num_beams": 1})
+    queued = job_queue.submit([("c.png", png_bytes())], blocking, {"num_beams": 1})
+    assert started.wait(5)
+
+    closer = threading.Thread(target=job_queue.close)
+    closer.start()
+    release.set()
+    closer.join(10)
+
+    assert running.state == "cancelled" and running.completed == 1
+    assert queued.state == "cancelled" and queued.finished_at is not None
+    assert not queued.spool_dir.exists() and not running.spool_dir.exists()
+    with pytest.raises(RuntimeError):
+        job_queue.submit([("d.png", png_bytes())], blocking, {})
+
+
+def test_short_or_failed_results_become_file_errors(job_queue):
+    def partial(images, generation):
+        # Ошибка отдельного запроса на месте первого результата, второго результата нет
+        return [ValueError("bad request")]
+
+    # batch_size=2: один батч [a, b]
+    job = job_queue.submit([("a.png", png_bytes()), ("b.png", png_bytes())], partial, {"num_beams": 1})
+    wait_finished(job)
+
+    rows = job.rows()
+    assert [row["file"] for row in rows] == ["a.png", "b.png"]
+    assert rows[0]["latex"] is None and rows[0]["error"] == "ValueError: bad request"
+    assert rows[1]["latex"] is None and rows[1]["error"].startswith("RuntimeError")
+    assert job.status()["state"] == "done" and job.status()["failed"] == 2
+
+
+def test_hf_recognizer_reports_errors_per_file(monkeypatch):
+    pytest.importorskip("streamlit")
+    import src.inference_hf
+    from src.hf_client import HFInferenceError
+    from src.ui.bulk_upload import make_batch_recognizer
+
+    class FakeClient:
+        def predict_many(self, images, max_workers=4, return_exceptions=False):
+            assert return_exceptions
+            return ["x", HFInferenceError("503", status_code=503), "y"]
+
+    monkeypatch.setattr(src.inference_hf, "get_configured_client", lambda: FakeClient())
+    results = make_batch_recognizer(None, None)([None] * 3, {})
+    assert [result["latex"] for result in (results[0], results[2])] == ["x", "y"]
+    assert isinstance(results[1], HFInferenceError)
+
+
+def test_scheduled_recognizer_times_out():
+    pytest.importorskip("streamlit")
+    from src.ui.bulk_upload import make_batch_recognizer
+
+    class StuckPool:
+        request_timeout = 0.05
+
+        def __init__(self):
+            self.futures = []
+
+        def submit_many(self, images, **generation):
+            self.futures = [Future() for _ in images]
+            return self.futures
+
+    pool = StuckPool()
+    results = make_batch_recognizer(object(), object(), pool)([None, None], {"num_beams": 1})
+    assert all(isinstance(result, FutureTimeoutError) for result in results)
+    # Не начатые задачи отменены
+    assert all(future.cancelled() for future in pool.futures)
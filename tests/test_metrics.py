@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+from src.metrics import (
+    aggregate_metrics, compute_cer, compute_metrics, compute_metrics_batch, exp_rate_within,
+    levenshtein_distance, levenshtein_within
+)
+
+
+def reference_distance(s1: str, s2: str) -> int:
+    """
+    Классическое DP O(n*m) для сверки.
+    """
+    prev = list(range(len(s2) + 1))
+    for i, a in enumerate(s1, 1):
+        cur = [i]
+        for j, b in enumerate(s2, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (a != b)))
+        prev = cur
+    return prev[-1]
+
+
+def random_pairs(count: int, max_length: int, alphabet: str = "x+1^_{}\\frac", seed: int = 0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        s1 = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length)))
+        # Вторая строка - мутация первой (близкие пары) или независимая строка
+        if rng.random() < 0.5:
+            chars = list(s1)
+            for _ in range(rng.randint(0, 4)):
+                position = rng.randint(0, len(chars))
+                operation = rng.choice(("insert", "delete", "replace"))
+                if operation == "insert" or not chars:
+                    chars.insert(position, rng.choice(alphabet))
+                elif operation == "delete":
+                    del chars[min(position, len(chars) - 1)]
+                else:
+                    chars[min(position, len(chars) - 1)] = rng.choice(alphabet)
+            s2 = "".join(chars)
+        else:
+            s2 = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length)))
+        yield s1, s2
+
+
+@pytest.mark.parametrize("s1, s2, expected", [
+    ("", "", 0),
+    ("", "abc", 3),
+    ("kitten", "sitting", 3),
+    ("x+1", "x-1", 1),
+    ("\\frac{a}{b}", "\\frac{a}{b}", 0),
+    ("abc", "cba", 2),
+])
+def test_levenshtein_known_values(s1, s2, expected):
+    assert levenshtein_distance(s1, s2) == expected
+    assert levenshtein_distance(s2, s1) == expected
+
+
+def test_levenshtein_matches_reference_dp():
+    for s1, s2 in random_pairs(300, 30):
+        assert levenshtein_distance(s1, s2) == reference_distance(s1, s2), (s1, s2)
+
+
+def test_levenshtein_long_strings_span_several_words():
+    # Битовые векторы длиннее 64 бит
+    for s1, s2 in random_pairs(30, 300, seed=1):
+        assert levenshtein_distance(s1, s2) == reference_distance(s1, s2)
+
+
+@pytest.mark.parametrize("k", [0, 1, 2, 3])
+def test_levenshtein_within_matches_distance(k):
+    for s1, s2 in random_pairs(300, 20, seed=k):
+        assert levenshtein_within(s1, s2, k) == (reference_distance(s1, s2) <= k), (s1, s2, k)
+
+
+def test_compute_metrics_and_cer():
+    metrics = compute_metrics("x-1", "x+1")
+    assert metrics == {"cer": pytest.approx(1 / 3), "edit_distance": 1, "exact_match": False}
+    assert compute_cer("", "") == 0.0
+    assert compute_cer("a", "") == 1.0
+
+
+def test_exp_rate_within():
+    assert exp_rate_within(["x+1", "x-1", "abc"], ["x+1", "x+1", "xyz"], 1) == pytest.approx(200 / 3)
+    assert exp_rate_within([], [], 1) == 0.0
+
+
+def test_aggregate_metrics_in_models_json_units():
+    # CER и ExpRate в процентах, как в config/models.json
+    summary = compute_metrics_batch(["x+1", "x-1", "ab"], ["x+1", "x+1", "abcd"])
+    assert summary["samples"] == 3
+    assert summary["cer"] == pytest.approx(100 * (0 + 1 / 3 + 2 / 4) / 3)
+    assert summary["exp_rate"] == pytest.approx(100 / 3)
+    assert summary["exp_rate_1"] == pytest.approx(200 / 3)
+    assert summary["exp_rate_2"] == pytest.approx(100.0)
+    assert summary["avg_edit_distance"] == pytest.approx(1.0)
+
+
+def test_aggregate_metrics_empty_dataset():
+    with pytest.raises(ValueError):
+        aggregate_metrics([])
+    with pytest.raises(ValueError):
+        compute_metrics_batch([], [])
@@ -0,0 +1,80 @@
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip("numpy")
+from PIL import Image, ImageDraw
+
+from src.segmentation import recognize_page
+from src.worker_pool import WorkerPoolError
+
+
+def page_image() -> Image.Image:
+    # Две строки по два выражения
+    image = Image.new("RGB", (600, 300), "white")
+    draw = ImageDraw.Draw(image)
+    for y in (40, 180):
+        for x in (40, 380):
+            draw.rectangle((x, y, x + 150, y + 60), outline="black", width=4)
+            draw.line((x + 20, y + 30, x + 130, y + 30), fill="black", width=4)
+    return image
+
+
+def test_recognize_page_uses_recognizer_once_in_reading_order():
+    calls = []
+
+    def recognize_crops(crops):
+        calls.append(len(crops))
+        return [{"latex": str(number), "confidence": 1.0} for number in range(len(crops))]
+
+    page = recognize_page(page_image(), recognize_crops)
+    assert calls == [4]
+    assert [segment["latex"] for segment in page["segments"]] == ["0", "1", "2", "3"]
+    assert [(segment["line"], segment["column"]) for segment in page["segments"]] == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    assert all(isinstance(segment["crop"], Image.Image) for segment in page["segments"])
+    assert set(page["timing"]) == {"segmentation_ms", "inference_ms"}
+
+
+def test_recognize_page_empty_page_skips_recognizer():
+    page = recognize_page(Image.new("RGB", (200, 100), "white"), lambda crops: pytest.fail("не должен вызываться"))
+    assert page["segments"] == []
+
+
+class FailingScheduler:
+    """
+    Пул, у которого воркер упал (error) или завис (Future не завершается).
+    """
+
+    request_timeout = 0.05
+
+    def __init__(self, error=None):
+        self.error = error
+        self.futures = []
+
+    def submit_many(self, images, **generation):
+        for _ in images:
+            future = Future()
+            if self.error is not None:
+                future.set_running_or_notify_cancel()
+                future.set_exception(self.error)
+            self.futures.append(future)
+        return self.futures
+
+
+@pytest.mark.parametrize("error", [WorkerPoolError("воркер 0 завершился"), None])
+def test_recognize_segments_falls_back_to_local_inference(monkeypatch, error):
+    pytest.importorskip("streamlit")
+    import src.ui.tab_recognition as tab_recognition
+
+    monkeypatch.setattr(
+        tab_recognition, "predict_latex_batch",
+        lambda crops, processor, model, **kwargs: [{"latex": "local", "confidence": 1.0, "num_beams": 1}] * len(crops)
+    )
+    scheduler = FailingScheduler(error)
+    page = tab_recognition.recognize_segments(
+        page_image(), object(), object(), {"num_beams": 1, "streaming": False}, scheduler
+    )
+    assert [segment["latex"] for segment in page["segments"]] == ["local"] * 4
+    if error is None:
+        # Зависшие задачи отменены
+        assert all(future.cancelled() for future in scheduler.futures)
@@ -0,0 +1,153 @@
+import io
+import json
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import Future
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("tornado")
+from PIL import Image
+from tornado.testing import AsyncHTTPTestCase
+
+from src.server import ServiceState, make_app
+
+
+class FakeLoader:
+    state = "ready"
+
+    def is_ready(self):
+        return True
+
+    def result(self):
+        return None, None
+
+    def status(self):
+        return {"state": self.state, "error": None, "timings": {}}
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, image, **generation):
+        self.submitted.append((image, generation))
+        future = Future()
+        future.set_result({"latex": "x", "confidence": 1.0, "num_beams": generation["num_beams"]})
+        return future
+
+    def submit_many(self, images, **generation):
+        return [self.submit(image, **generation) for image in images]
+
+
+def png_bytes(size=(64, 32)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class ServerTest(AsyncHTTPTestCase):
+    def get_app(self):
+        self.state = ServiceState(FakeLoader(), batching=True)
+        return make_app(self.state)
+
+    def post_image(self, body: bytes, query: str = ""):
+        return self.fetch(f"/recognize{query}", method="POST", body=body)
+
+    def test_not_ready_until_scheduler_built(self):
+        assert self.fetch("/ready").code == 503
+        response = self.post_image(png_bytes())
+        assert response.code == 503 and response.headers["Retry-After"] == "5"
+
+        self.state.scheduler = FakeScheduler()
+        assert self.fetch("/ready").code == 200
+
+    def test_recognize_uses_prebuilt_scheduler(self):
+        self.state.scheduler = FakeScheduler()
+        response = self.post_image(png_bytes(), "?num_beams=2")
+        assert response.code == 200
+        body = json.loads(response.body)
+        assert body["latex"] == "x" and body["num_beams"] == 2
+        assert body["timing"]["batch_size"] == 1
+
+    def test_invalid_generation_args(self):
+        self.state.scheduler = FakeScheduler()
+        for query in ("?num_beams=0", "?num_beams=-1", "?num_beams=17", "?max_length=0",
+                      "?confidence_threshold=1.5", "?num_beams=abc"):
+            assert self.post_image(png_bytes(), query).code == 400, query
+        assert not self.state.scheduler.submitted
+
+    def test_invalid_image_is_400(self):
+        self.state.scheduler = FakeScheduler()
+        assert self.post_image(b"not an image").code == 400
+        assert not self.state.scheduler.submitted
+
+    def test_oversized_image_is_413(self):
+        from tests.test_ingestion import png_header
+
+        self.state.scheduler = FakeScheduler()
+        assert self.post_image(png_header(20_000, 12_000).getvalue()).code == 413
+        assert not self.state.scheduler.submitted
+
+
+def multipart(files: list) -> tuple:
+    boundary = uuid.uuid4().hex
+    body = b""
+    for name, data in files:
+        body += (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"images\"; filename=\"{name}\"\r\n"
+            f"Content-Type: image/png\r\n\r\n"
+        ).encode() + data + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+TASK_S = 0.5
+
+
+def slow_predict(images, processor, model, return_details=False, **params):
+    time.sleep(TASK_S)
+    return [{"latex": "x", "confidence": 1.0, "num_beams": params["num_beams"]} for _ in images]
+
+
+class WorkerPoolServerTest(AsyncHTTPTestCase):
+    """
+    Сервис с настоящим InferenceWorkerPool (модель в воркерах подменена).
+    """
+
+    def get_app(self):
+        pytest.importorskip("torch")
+        if "fork" not in multiprocessing.get_all_start_methods():
+            pytest.skip("нужен start_method fork")
+        import src.inference
+        from src.worker_pool import InferenceWorkerPool
+
+        patcher = mock.patch.object(src.inference, "predict_latex_batch", slow_predict)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        pool = InferenceWorkerPool("unused", num_workers=1, pin_cpus=False, max_queue_size=3,
+                                   request_timeout=10.0, shared_model=(None, None))
+        self.addCleanup(pool.close)
+        deadline = time.monotonic() + 30
+        while not pool.health()["ready"] and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+        state = ServiceState(FakeLoader(), workers=1)
+        state.scheduler = pool
+        return make_app(state)
+
+    def test_overflow_is_rejected_without_blocking(self):
+        body, headers = multipart([(f"{i}.png", png_bytes()) for i in range(50)])
+        start = time.monotonic()
+        response = self.fetch("/recognize/batch", method="POST", body=body, headers=headers)
+        assert response.code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert time.monotonic() - start < TASK_S
+
+        body, headers = multipart([(f"{i}.png", png_bytes()) for i in range(2)])
+        response = self.fetch("/recognize/batch", method="POST", body=body, headers=headers)
+        assert response.code == 200
+        assert len(json.loads(response.body)["results"]) == 2
+        assert self.fetch("/ready").code == 200
@@ -0,0 +1,32 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+pytest.importorskip("requests")
+
+from src.synthetic import synthetic_formula_image
+
+
+def test_synthetic_image_is_deterministic():
+    a = synthetic_formula_image(200, 800, seed=3)
+    assert a.size == (800, 200) and a.mode == "RGB"
+    assert a.tobytes() == synthetic_formula_image(200, 800, seed=3).tobytes()
+    assert a.tobytes() != synthetic_formula_image(200, 800, seed=4).tobytes()
+
+
+def test_hf_bench_path_does_not_import_ml_stack():
+    # Бенчмарк HF-клиента (src.hf_stub_server bench) должен работать без torch и transformers
+    code = (
+        "import sys\n"
+        "import src.hf_stub_server, src.synthetic, src.preprocessing\n"
+        "print(','.join(m for m in ('torch', 'transformers') if m in sys.modules))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+        cwd=Path(__file__).resolve().parent.parent
+    ).stdout.strip()
+    assert output == ""
@@ -0,0 +1,69 @@
+import multiprocessing
+import time
+
+import pytest
+
+pytest.importorskip("torch")
+if "fork" not in multiprocessing.get_all_start_methods():
+    pytest.skip("нужен start_method fork", allow_module_level=True)
+
+from PIL import Image
+
+import src.inference
+from src.worker_pool import InferenceWorkerPool, WorkerPoolBusy
+
+TASK_S = 0.3
+
+
+def slow_predict(images, processor, model, return_details=False, **params):
+    # Подменяет модель в воркерах (наследуется при fork)
+    time.sleep(TASK_S)
+    return [{"latex": f"beams={params['num_beams']}", "confidence": 1.0, "num_beams": params["num_beams"]}
+            for _ in images]
+
+
+def wait_until(condition, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return
+        time.sleep(0.02)
+    pytest.fail("условие не выполнено")
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(src.inference, "predict_latex_batch", slow_predict)
+    pool = InferenceWorkerPool("unused", num_workers=1, pin_cpus=False, max_queue_size=3,
+                               request_timeout=10.0, shared_model=(None, None))
+    wait_until(lambda: pool.health()["ready"])
+    yield pool
+    pool.close()
+
+
+IMAGE = Image.new("RGB", (32, 32), "white")
+
+
+def test_overflow_is_rejected_immediately_and_atomically(pool):
+    start = time.monotonic()
+    with pytest.raises(WorkerPoolBusy):
+        pool.submit_many([IMAGE] * 50, num_beams=1)
+    assert time.monotonic() - start < TASK_S
+    health = pool.health()
+    assert health["pending"] == 0 and health["queue_depth"] == 0 and health["rejected"] == 1
+
+    # Один воркер и очередь из трех задач вмещают четыре изображения
+    futures = pool.submit_many([IMAGE] * 4, num_beams=2)
+    assert [future.result(timeout=10)["latex"] for future in futures] == ["beams=2"] * 4
+
+
+def test_queued_tasks_are_cancellable_and_skipped(pool):
+    futures = pool.submit_many([IMAGE] * 4, num_beams=1)
+    # Первая задача уже у воркера, остальные ждут в очереди
+    assert not futures[0].cancel()
+    assert all(future.cancel() for future in futures[2:])
+
+    assert futures[1].result(timeout=10)["latex"] == "beams=1"
+    wait_until(lambda: pool.health()["pending"] == 0)
+    assert pool.health()["workers"][0]["processed"] == 2
+    assert pool.health()["queue_depth"] == 0